@@ -0,0 +1,490 @@
+import asyncio
+import json
+import os
+import time
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlencode
+
+from okx_client import OKXClient
+from http_transport import AsyncPooledHTTPTransport
+from rate_limiter import RequestScheduler, PRIORITY_HIGH, PRIORITY_LOW
+from single_flight import AsyncSingleFlight
+from circuit_breaker import CircuitBreakerRegistry
+from metrics import MetricsRegistry
+from ticker_table import TickerTable, inst_type_of
+
+# 同时查询的产品数达到该值时改用 /market/tickers 一次获取
+BULK_TICKER_THRESHOLD = 3
+
+
+class AsyncOKXClient(OKXClient):
+    """
+    基于 aiohttp 的异步OKX客户端
+
+    方法与 OKXClient 同名，但全部为协程，在事件循环中调用时不会阻塞。
+    重试按接口类别的策略指数退避 + 随机抖动，并通过 asyncio.sleep 等待；接口熔断时直接失败。
+    每个请求先经过 RequestScheduler 取得限速令牌，下单撤单走高优先级通道。
+    签名、缓存等逻辑复用 OKXClient。
+    """
+
+    def __init__(self, scheduler: Optional[RequestScheduler] = None,
+                 breakers: Optional[CircuitBreakerRegistry] = None,
+                 metrics: Optional[MetricsRegistry] = None):
+        super().__init__(scheduler=scheduler, breakers=breakers, metrics=metrics)
+
+    def _create_transport(self):
+        """创建异步HTTP传输层"""
+        return AsyncPooledHTTPTransport(
+            pool_maxsize=int(os.environ.get("OKX_POOL_MAXSIZE", "10")),
+            timeout=30
+        )
+
+    def _create_single_flight(self):
+        """创建异步请求合并器"""
+        return AsyncSingleFlight()
+
+    async def _send_request(self, method: str, request_path: str, body: Optional[Dict] = None,
+                            priority: Optional[int] = None) -> Dict[str, Any]:
+        """
+        发送请求
+        :param priority: 调度优先级，默认交易类接口为高优先级，其余为普通优先级
+        """
+        family = self.scheduler.get_family(request_path)
+        policy = self.breakers.retry_policy(family)
+        if not self.breakers.allow(family):
+            return self._circuit_open_response(family)
+
+        attempt = 0
+        while True:
+            # 每次重试重新签名，保证时间戳有效
+            url, headers, body_str = self._build_request(method, request_path, body)
+
+            if self.debug:
+                print(f"请求URL: {url}")
+                print(f"请求头: {headers}")
+                print(f"请求体: {body_str}")
+
+            status = None
+            queued_at = time.perf_counter()
+            try:
+                async with self.scheduler.slot(request_path, priority):
+                    sent_at = time.perf_counter()
+                    try:
+                        status, text = await self.transport.request(method, url, headers=headers, data=body_str)
+                    finally:
+                        self._observe_request(family, queued_at, sent_at, status)
+
+                if self.debug:
+                    print(f"请求耗时: {self.transport.last_timing}")
+
+                if status == 200:
+                    result = self._parse_response(json.loads(text))
+                    self.breakers.record_success(family)
+                    return result
+
+                if status == 429:
+                    self.scheduler.on_rate_limited(request_path)
+                error = f"HTTP Error: {status}"
+            except Exception as e:
+                error = str(e)
+
+            attempt += 1
+            if not policy.should_retry(attempt, status):
+                self._record_outcome(family, status)
+                return {"success": False, "data": [], "msg": error}
+
+            self.breakers.record_retry(family)
+            delay = policy.delay(attempt - 1)
+            print(f"请求失败 ({error})，将在 {delay:.2f} 秒后重试...")
+            await asyncio.sleep(delay)
+
+    async def _cached_fetch(self, cache_key: str, endpoint: str, fetch):
+        """合并同一缓存键的并发请求，接口熔断时回退到过期的缓存数据"""
+        return self._with_stale_fallback(cache_key, await self._single_flight.do(cache_key, endpoint, fetch))
+
+    async def close(self):
+        """关闭底层连接池"""
+        await self.transport.close()
+
+    async def get_account_balance(self):
+        cache_key = 'account_balance'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        async def fetch():
+            try:
+                result = await self._send_request("GET", "/account/balance")
+                if result["success"] and result["data"]:
+                    balance_data = result["data"][0] if isinstance(result["data"], list) and result["data"] else {}
+                    response = {
+                        "success": True,
+                        "data": balance_data,
+                        "msg": "success"
+                    }
+                    self._set_cache(cache_key, response)
+                    return response
+                return result
+            except Exception as e:
+                print(f"获取账户余额错误: {e}")
+                return {"success": False, "data": {}, "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return await self._cached_fetch(cache_key, "/account/balance", fetch)
+
+    async def get_positions(self):
+        cache_key = 'positions'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        async def fetch():
+            try:
+                params = {
+                    "instType": "SWAP",
+                }
+                result = await self._send_request("GET", "/account/positions", body=params)
+                if result["success"]:
+                    self._set_cache(cache_key, result)
+                return result
+            except Exception as e:
+                print(f"获取持仓信息错误: {e}")
+                return {"success": False, "data": [], "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return await self._cached_fetch(cache_key, "/account/positions", fetch)
+
+    async def place_order(self, instId: str, tdMode: str, side: str,
+                          ordType: str, sz: str, px: str = None):
+        """
+        下单交易
+        :param instId: 产品ID，如"BTC-USDT-SWAP"
+        :param tdMode: 交易模式，如"cross"(全仓),"isolated"(逐仓)
+        :param side: 订单方向，"buy"或"sell"
+        :param ordType: 订单类型，如"market"(市价单),"limit"(限价单)
+        :param sz: 委托数量
+        :param px: 委托价格，市价单可不传
+        """
+        try:
+            params = {
+                "instId": instId,
+                "tdMode": tdMode,
+                "side": side,
+                "ordType": ordType,
+                "sz": sz
+            }
+
+            if px and ordType == "limit":
+                params["px"] = px
+
+            # 下单走高优先级通道，优先于行情轮询
+            return await self._send_request("POST", "/trade/order", params, priority=PRIORITY_HIGH)
+        except Exception as e:
+            print(f"下单错误: {e}")
+            return {"success": False, "data": {}, "msg": str(e)}
+
+    async def cancel_order(self, instId: str, ordId: str = None, clOrdId: str = None):
+        """
+        撤销订单
+        :param instId: 产品ID
+        :param ordId: 订单ID
+        :param clOrdId: 客户自定义订单ID
+        """
+        try:
+            params = {"instId": instId}
+
+            if ordId:
+                params["ordId"] = ordId
+            elif clOrdId:
+                params["clOrdId"] = clOrdId
+            else:
+                return {"success": False, "data": {}, "msg": "ordId和clOrdId不能同时为空"}
+
+            return await self._send_request("POST", "/trade/cancel-order", params, priority=PRIORITY_HIGH)
+        except Exception as e:
+            print(f"撤单错误: {e}")
+            return {"success": False, "data": {}, "msg": str(e)}
+
+    async def place_orders(self, orders: List[Dict[str, Any]]):
+        """
+        批量下单，每批最多20个订单，各批并发提交
+        :param orders: 订单参数列表，字段与 /trade/order 相同
+        """
+        try:
+            chunks = self._chunk_orders(orders)
+            results = await asyncio.gather(*[
+                self._send_request("POST", "/trade/batch-orders", chunk, priority=PRIORITY_HIGH)
+                for chunk in chunks
+            ])
+            return self._merge_batch_results(chunks, results)
+        except Exception as e:
+            print(f"批量下单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    async def cancel_orders(self, orders: List[Dict[str, Any]]):
+        """
+        批量撤单，每批最多20个订单，各批并发提交
+        :param orders: [{"instId": ..., "ordId": ...} 或 {"instId": ..., "clOrdId": ...}]
+        """
+        try:
+            chunks = self._chunk_orders(orders)
+            results = await asyncio.gather(*[
+                self._send_request("POST", "/trade/cancel-batch-orders", chunk, priority=PRIORITY_HIGH)
+                for chunk in chunks
+            ])
+            return self._merge_batch_results(chunks, results)
+        except Exception as e:
+            print(f"批量撤单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    async def get_order(self, inst_id: str, ord_id: str = None, cl_ord_id: str = None):
+        """查询单个订单（含已完成的订单），ordId 和 clOrdId 二选一"""
+        try:
+            params = {"instId": inst_id}
+            if ord_id:
+                params["ordId"] = ord_id
+            elif cl_ord_id:
+                params["clOrdId"] = cl_ord_id
+            else:
+                return {"success": False, "data": [], "msg": "ordId和clOrdId不能同时为空"}
+            return await self._send_request("GET", f"/trade/order?{urlencode(params)}")
+        except Exception as e:
+            print(f"查询订单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    async def get_pending_orders(self, inst_type: str = None, inst_id: str = None):
+        """获取全部未成交订单，按 ordId 游标翻页"""
+        try:
+            orders = []
+            after = None
+            while True:
+                params = {"limit": "100"}
+                if inst_type:
+                    params["instType"] = inst_type
+                if inst_id:
+                    params["instId"] = inst_id
+                if after:
+                    params["after"] = after
+                result = await self._send_request("GET", f"/trade/orders-pending?{urlencode(params)}")
+                if not result["success"]:
+                    return result
+                orders.extend(result["data"])
+                if len(result["data"]) < 100:
+                    return {"success": True, "data": orders, "msg": "success"}
+                after = result["data"][-1]["ordId"]
+        except Exception as e:
+            print(f"获取未成交订单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    async def get_tickers_snapshot(self, inst_type: str = "SWAP"):
+        """
+        一次获取某一产品类型全部产品的行情（/market/tickers）
+        :param inst_type: SPOT/SWAP/FUTURES
+        :return: data 为 TickerTable
+        """
+        cache_key = f'tickers_{inst_type}'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        async def fetch():
+            try:
+                result = await self._send_request("GET", f"/market/tickers?instType={inst_type}")
+                if result["success"]:
+                    response = {"success": True, "data": TickerTable(inst_type, result.get("data", [])), "msg": "success"}
+                    self._set_cache(cache_key, response)
+                    return response
+                return result
+            except Exception as e:
+                print(f"获取行情快照错误: {str(e)}")
+                return {"success": False, "data": None, "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return await self._cached_fetch(cache_key, "/market/tickers", fetch)
+
+    async def get_ticker(self, symbol):
+        """获取单个产品的行情数据"""
+        cache_key = f'ticker_{symbol}'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        # 行情快照已缓存时直接从快照中查询
+        snapshot_data = self._ticker_from_snapshot(symbol)
+        if snapshot_data:
+            return snapshot_data
+
+        async def fetch():
+            try:
+                result = await self._send_request("GET", f"/market/ticker?instId={symbol}")
+                if result["success"]:
+                    self._set_cache(cache_key, result)
+                return result
+            except Exception as e:
+                print(f"获取行情数据错误: {str(e)}")
+                return {"success": False, "data": {}, "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return await self._cached_fetch(cache_key, "/market/ticker", fetch)
+
+    async def get_kline_data(self, symbol, bar="1m", limit=100):
+        """获取K线数据"""
+        cache_key = f'kline_{symbol}_{bar}_{limit}'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        async def fetch():
+            try:
+                result = await self._send_request("GET", f"/market/candles?instId={symbol}&bar={bar}&limit={limit}")
+                if result["success"]:
+                    self._set_cache(cache_key, result)
+                return result
+            except Exception as e:
+                print(f"获取K线数据错误: {str(e)}")
+                return {"success": False, "data": [], "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return await self._cached_fetch(cache_key, "/market/candles", fetch)
+
+    async def get_kline(self, symbol, bar="1m", limit=100):
+        """获取K线数据"""
+        return await self.get_kline_data(symbol, bar, limit)
+
+    async def get_instruments(self, inst_types=None):
+        """获取所有可交易品种，多个产品类型并发请求"""
+        try:
+            if not inst_types:
+                inst_types = ["SWAP"]  # 默认只获取永续合约
+
+            async def fetch(inst_type):
+                # 产品列表变化很少，按类型长时间缓存
+                cache_key = f"instruments_{inst_type}"
+                cached_data = self._get_cached_data(cache_key)
+                if cached_data:
+                    return cached_data
+                response = await self._send_request("GET", f"/public/instruments?instType={inst_type}")
+                if response["success"]:
+                    self._set_cache(cache_key, response)
+                return response
+
+            responses = await asyncio.gather(*[fetch(inst_type) for inst_type in inst_types])
+
+            all_instruments = []
+            for inst_type, response in zip(inst_types, responses):
+                if response["success"]:
+                    all_instruments.extend(response["data"])
+                else:
+                    print(f"获取 {inst_type} 交易品种错误: {response['msg']}")
+
+            return {"success": True, "data": all_instruments}
+        except Exception as e:
+            print(f"获取交易品种错误: {str(e)}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    async def get_market_data(self, symbol):
+        """获取市场数据，包括最新价格、24小时涨跌幅等"""
+        try:
+            ticker_data = await self.get_ticker(symbol)
+
+            if not ticker_data["success"]:
+                return ticker_data
+
+            return {"success": True, "data": self._format_market_data(symbol, ticker_data)}
+        except Exception as e:
+            print(f"获取市场数据错误: {str(e)}")
+            return {"success": False, "data": {}, "msg": str(e)}
+
+    async def get_assets(self):
+        """获取资产数据（与账户数据相同，但格式可能不同）"""
+        try:
+            account_data = await self.get_account_balance()
+
+            if not account_data["success"]:
+                return account_data
+
+            return {"success": True, "data": account_data.get("data", {})}
+        except Exception as e:
+            print(f"获取资产数据错误: {str(e)}")
+            return {"success": False, "data": {}, "msg": str(e)}
+
+    async def get_historical_candles(self, symbol, bar="1m", limit=300):
+        """
+        获取历史K线数据用于回测
+
+        Args:
+            symbol: 交易对，如 BTC-USDT-SWAP
+            bar: K线周期，如 1m, 5m, 15m, 1H, 4H, 1D
+            limit: 获取数量，最大300条
+
+        Returns:
+            包含K线数据的字典
+        """
+        cache_key = f'historical_candles_{symbol}_{bar}_{limit}'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        async def fetch():
+            try:
+                result = await self._send_request("GET", f"/market/candles?instId={symbol}&bar={bar}&limit={limit}")
+
+                if result["success"]:
+                    response = {
+                        "success": True,
+                        "data": self._format_candles(result.get("data", [])),
+                        "msg": "success"
+                    }
+                    self._set_cache(cache_key, response)
+                    return response
+
+                return result
+            except Exception as e:
+                print(f"获取历史K线数据错误: {str(e)}")
+                return {"success": False, "data": [], "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return await self._cached_fetch(cache_key, "/market/candles", fetch)
+
+    async def get_history_candles_page(self, symbol, bar="1m", after: Optional[int] = None,
+                                       before: Optional[int] = None, limit: int = 100):
+        """
+        获取一页历史K线（/market/history-candles），不缓存
+
+        :param after: 返回时间戳早于 after 的K线（毫秒）
+        :param before: 返回时间戳晚于 before 的K线（毫秒）
+        :param limit: 每页数量，最大100
+        :return: data 为按时间升序排列的K线字典列表
+        """
+        try:
+            endpoint = f"/market/history-candles?instId={symbol}&bar={bar}&limit={limit}"
+            if after is not None:
+                endpoint += f"&after={after}"
+            if before is not None:
+                endpoint += f"&before={before}"
+            # 历史数据下载使用低优先级，不影响实时行情和下单
+            result = await self._send_request("GET", endpoint, priority=PRIORITY_LOW)
+            if result["success"]:
+                return {"success": True, "data": self._format_candles(result.get("data", [])), "msg": "success"}
+            return result
+        except Exception as e:
+            print(f"获取历史K线分页错误: {str(e)}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    async def get_tickers(self, symbols: List[str]) -> Dict[str, Dict]:
+        """
+        获取多个产品的行情，返回 {symbol: 响应}
+
+        产品数不少于 BULK_TICKER_THRESHOLD 时每种产品类型只请求一次 /market/tickers，
+        之后逐个产品的 get_ticker 也从快照中查询；否则逐个并发请求。
+        """
+        if len(symbols) >= BULK_TICKER_THRESHOLD:
+            inst_types = sorted({inst_type_of(symbol) for symbol in symbols} - {"OPTION"})
+            await asyncio.gather(*[self.get_tickers_snapshot(inst_type) for inst_type in inst_types])
+        results = await asyncio.gather(*[self.get_ticker(symbol) for symbol in symbols])
+        return dict(zip(symbols, results))
+
+    async def get_kline_data_many(self, symbols: List[str], bar="1m", limit=100) -> Dict[str, Dict]:
+        """并发获取多个产品的K线，返回 {symbol: 响应}"""
+        results = await asyncio.gather(*[self.get_kline_data(symbol, bar, limit) for symbol in symbols])
+        return dict(zip(symbols, results))
@@ -1,24 +1,65 @@
+import asyncio
 import time
 import datetime
 import pandas as pd
 import numpy as np
 from copy import deepcopy
+from bar_utils import bar_to_ms
 
 class BacktestEngine:
     """
     回测引擎：用于对策略进行历史数据回测
     """
     
-    def __init__(self, okx_client):
+    def __init__(self, okx_client, candle_store=None, history_fetcher=None, candle_archive=None):
         """
         初始化回测引擎
         
         Args:
             okx_client: OKX API客户端实例
+            candle_store: 本地K线存储（CandleStore），为空时每次回测都从交易所获取
+            history_fetcher: 深度历史K线下载器（HistoryCandleFetcher），用于补齐本地缺失的K线
+            candle_archive: 列式K线归档（CandleArchive），配置后回测数据通过 memmap 读取
         """
         self.okx_client = okx_client
+        self.candle_store = candle_store
+        self.history_fetcher = history_fetcher
+        self.candle_archive = candle_archive
         
-    def run_backtest(self, strategy, symbol, bar="1m", initial_capital=10000):
+    async def load_candles(self, symbol, bar="1m", start_time=None, end_time=None, default_bars=300):
+        """
+        通过本地K线存储读取回测数据，只下载本地缺失的时间段
+        
+        Args:
+            symbol: 交易对
+            bar: K线周期
+            start_time: 开始时间（毫秒），为空时取最近 default_bars 根已收盘K线
+            end_time: 结束时间（毫秒），为空时到最近一根已收盘K线
+            default_bars: 未指定开始时间时的K线数量
+        
+        Returns:
+            按时间升序排列的K线列表，配置了列式归档时返回 CandleColumns 视图；未配置本地存储时返回 None
+        """
+        if self.candle_store is None:
+            if start_time is not None and self.history_fetcher is not None:
+                return await self.history_fetcher.fetch_range(symbol, bar, start_time, end_time)
+            return None
+        
+        if start_time is None:
+            end = end_time or self.candle_store.last_closed_end(bar)
+            start_time = end - default_bars * bar_to_ms(bar)
+        
+        if self.candle_archive is not None:
+            start_time, end_time = await self.candle_store.fill_gaps(
+                symbol, bar, start_time, end_time, fetcher=self.history_fetcher
+            )
+            return await asyncio.to_thread(
+                self.candle_archive.sync_from_store, self.candle_store, symbol, bar, start_time, end_time
+            )
+        
+        return await self.candle_store.get_range(symbol, bar, start_time, end_time, fetcher=self.history_fetcher)
+        
+    def run_backtest(self, strategy, symbol, bar="1m", initial_capital=10000, candles=None):
         """
         运行回测
         
@@ -27,6 +68,7 @@ class BacktestEngine:
             symbol: 交易对
             bar: K线周期
             initial_capital: 初始资金
+            candles: 预先下载的K线数据（按时间升序，K线字典列表或 CandleColumns），为空时获取最近的K线
         
         Returns:
             回测结果
@@ -35,13 +77,14 @@ class BacktestEngine:
             print(f"开始回测: 策略={strategy.name}, 交易对={symbol}, 周期={bar}, 初始资金={initial_capital}")
             
             # 获取历史K线数据
-            candles_result = self.okx_client.get_historical_candles(symbol, bar)
-            
-            if not candles_result["success"]:
-                print(f"获取历史K线数据失败: {candles_result['msg']}")
-                return {"success": False, "msg": f"获取历史K线数据失败: {candles_result['msg']}"}
-            
-            candles = candles_result["data"]
+            if candles is None:
+                candles_result = self.okx_client.get_historical_candles(symbol, bar)
+                
+                if not candles_result["success"]:
+                    print(f"获取历史K线数据失败: {candles_result['msg']}")
+                    return {"success": False, "msg": f"获取历史K线数据失败: {candles_result['msg']}"}
+                
+                candles = candles_result["data"]
             
             if not candles:
                 print("没有获取到历史K线数据")
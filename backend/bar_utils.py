@@ -0,0 +1,74 @@
+"""
+K线周期相关的工具函数
+
+OKX 的K线周期：1m/3m/5m/15m/30m、1H/2H/4H 按UTC对齐；
+6H/12H/1D/2D/3D/1W/1M 默认按香港时间(UTC+8)对齐，带 utc 后缀的版本（如 1Dutc）按UTC对齐。
+"""
+import time
+from typing import Optional
+
+# 各周期对应的秒数，1M 按30天近似
+BAR_SECONDS = {
+    "1s": 1,
+    "1m": 60,
+    "3m": 180,
+    "5m": 300,
+    "15m": 900,
+    "30m": 1800,
+    "1H": 3600,
+    "2H": 7200,
+    "4H": 14400,
+    "6H": 21600,
+    "12H": 43200,
+    "1D": 86400,
+    "2D": 172800,
+    "3D": 259200,
+    "1W": 604800,
+    "1M": 2592000,
+}
+
+# 按香港时间对齐的周期
+_HK_ALIGNED = {"6H", "12H", "1D", "2D", "3D", "1W", "1M"}
+_HK_OFFSET = 8 * 3600
+
+
+def bar_to_seconds(bar: str) -> int:
+    """返回K线周期的秒数，不支持的周期抛出 ValueError"""
+    key = bar[:-3] if bar.endswith("utc") else bar
+    if key not in BAR_SECONDS:
+        raise ValueError(f"不支持的K线周期: {bar}")
+    return BAR_SECONDS[key]
+
+
+def bar_to_ms(bar: str) -> int:
+    """返回K线周期的毫秒数"""
+    return bar_to_seconds(bar) * 1000
+
+
+def _bar_offset(bar: str) -> int:
+    """K线起点相对UTC整点的偏移秒数"""
+    if bar.endswith("utc") or bar not in _HK_ALIGNED:
+        return 0
+    # 按香港时间零点对齐，即UTC 16:00
+    return _HK_OFFSET
+
+
+def bar_open_time(bar: str, timestamp: Optional[float] = None) -> float:
+    """
+    返回 timestamp（秒）所在K线的开盘时间（秒）
+
+    1W 周期OKX以周一为起点，1970-01-01是周四，这里额外偏移4天；
+    1M 周期按30天近似，并非自然月
+    """
+    if timestamp is None:
+        timestamp = time.time()
+    period = bar_to_seconds(bar)
+    offset = _bar_offset(bar)
+    if bar.startswith("1W"):
+        offset -= 4 * 86400
+    return ((timestamp + offset) // period) * period - offset
+
+
+def next_bar_close(bar: str, timestamp: Optional[float] = None) -> float:
+    """返回 timestamp（秒）所在K线的收盘时间（秒），即下一根K线的开盘时间"""
+    return bar_open_time(bar, timestamp) + bar_to_seconds(bar)
@@ -0,0 +1,225 @@
+import os
+import struct
+import threading
+from typing import Optional, Dict, Any, List, Union
+
+import numpy as np
+
+from bar_utils import bar_to_ms
+
+DEFAULT_ARCHIVE_DIR = os.path.join(os.path.dirname(__file__), "data", "candles")
+
+# 每个字段一个文件：64字节文件头 + 连续的数组数据
+# 文件头: 魔数(8) 版本(uint32) 类型码(1) 填充(3) 行数(uint64) 周期毫秒(uint64)
+_MAGIC = b"ZZCNDL01"
+_VERSION = 1
+_HEADER_FORMAT = "<8sIc3xQQ"
+_HEADER_SIZE = 64
+_COUNT_OFFSET = struct.calcsize("<8sIc3x")
+
+FIELDS = {
+    "timestamp": np.int64,
+    "open": np.float64,
+    "high": np.float64,
+    "low": np.float64,
+    "close": np.float64,
+    "volume": np.float64,
+    "volume_currency": np.float64,
+}
+
+
+class CandleColumns:
+    """
+    按列存放的K线，每列为只读 numpy 数组（通常是 memmap 视图）
+
+    可像 K线字典列表一样迭代，每次只生成当前一根K线的字典，不会一次性物化全部数据。
+    """
+
+    def __init__(self, symbol: str, bar: str, columns: Dict[str, np.ndarray]):
+        self.symbol = symbol
+        self.bar = bar
+        self.columns = columns
+        for name, array in columns.items():
+            setattr(self, name, array)
+
+    def __len__(self):
+        return len(self.columns["timestamp"])
+
+    def __iter__(self):
+        names = list(FIELDS)
+        arrays = [self.columns[name] for name in names]
+        for values in zip(*arrays):
+            candle = dict(zip(names, (value.item() for value in values)))
+            yield candle
+
+    def __getitem__(self, index: int) -> Dict[str, Any]:
+        return {name: self.columns[name][index].item() for name in FIELDS}
+
+    def slice_time(self, start: Optional[int] = None, end: Optional[int] = None) -> "CandleColumns":
+        """返回 [start, end) 时间范围内的视图，不复制数据"""
+        timestamps = self.columns["timestamp"]
+        lo = 0 if start is None else int(np.searchsorted(timestamps, start, side="left"))
+        hi = len(timestamps) if end is None else int(np.searchsorted(timestamps, end, side="left"))
+        return CandleColumns(self.symbol, self.bar, {name: array[lo:hi] for name, array in self.columns.items()})
+
+
+class CandleArchive:
+    """
+    基于 numpy.memmap 的列式K线归档
+
+    每个 (symbol, bar) 一个目录，每个字段一个文件，数据按时间升序连续存放。
+    打开时直接映射文件，不做解析和类型转换，多进程打开同一归档时共享操作系统页缓存。
+    只支持在末尾追加新K线；需要补充更早的数据时整体重写。
+    """
+
+    def __init__(self, root_dir: str = DEFAULT_ARCHIVE_DIR):
+        self.root_dir = root_dir
+        self._lock = threading.Lock()
+
+    def _dir(self, symbol: str, bar: str) -> str:
+        return os.path.join(self.root_dir, symbol, bar)
+
+    def _path(self, symbol: str, bar: str, field: str) -> str:
+        return os.path.join(self._dir(symbol, bar), f"{field}.bin")
+
+    @staticmethod
+    def _read_header(path: str):
+        with open(path, "rb") as f:
+            header = f.read(_HEADER_SIZE)
+        magic, version, type_code, count, bar_ms = struct.unpack_from(_HEADER_FORMAT, header)
+        if magic != _MAGIC or version != _VERSION:
+            raise ValueError(f"无效的K线归档文件: {path}")
+        return type_code, count, bar_ms
+
+    @staticmethod
+    def _header_bytes(dtype, count: int, bar_ms: int) -> bytes:
+        header = struct.pack(_HEADER_FORMAT, _MAGIC, _VERSION, np.dtype(dtype).char.encode(), count, bar_ms)
+        return header.ljust(_HEADER_SIZE, b"\0")
+
+    def exists(self, symbol: str, bar: str) -> bool:
+        return os.path.exists(self._path(symbol, bar, "timestamp"))
+
+    def _count(self, symbol: str, bar: str) -> int:
+        # 以时间戳列的行数为准，追加时它最后更新
+        return self._read_header(self._path(symbol, bar, "timestamp"))[1]
+
+    def open(self, symbol: str, bar: str) -> Optional[CandleColumns]:
+        """
+        以只读 memmap 打开归档，不存在时返回 None
+
+        返回的列直接映射归档文件，调用方不要在 write / append / sync_from_store 重写同一归档期间持有它：
+        Windows 上文件被映射时无法截断或替换，其他平台上旧视图也可能读到截断前的数据
+        """
+        if not self.exists(symbol, bar):
+            return None
+        count = self._count(symbol, bar)
+        columns = {}
+        for field, dtype in FIELDS.items():
+            if count == 0:
+                columns[field] = np.empty(0, dtype=dtype)
+                continue
+            columns[field] = np.memmap(self._path(symbol, bar, field), dtype=dtype, mode="r",
+                                       offset=_HEADER_SIZE, shape=(count,))
+        return CandleColumns(symbol, bar, columns)
+
+    def time_range(self, symbol: str, bar: str):
+        """返回归档中第一根和最后一根K线的时间戳，空归档返回 None"""
+        columns = self.open(symbol, bar)
+        if columns is None or len(columns) == 0:
+            return None
+        return int(columns.timestamp[0]), int(columns.timestamp[-1])
+
+    @staticmethod
+    def _to_columns(candles: Union[List[Dict[str, Any]], Dict[str, np.ndarray]]) -> Dict[str, np.ndarray]:
+        if isinstance(candles, dict):
+            return {field: np.asarray(candles[field], dtype=dtype) for field, dtype in FIELDS.items()}
+        return {
+            field: np.fromiter((c.get(field, 0) for c in candles), dtype=dtype, count=len(candles))
+            for field, dtype in FIELDS.items()
+        }
+
+    def write(self, symbol: str, bar: str, candles):
+        """整体重写归档，candles 为K线字典列表或 {字段: 数组}，需按时间升序"""
+        columns = self._to_columns(candles)
+        count = len(columns["timestamp"])
+        bar_ms = bar_to_ms(bar)
+        directory = self._dir(symbol, bar)
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            # 时间戳列最后写入，读者以它的行数为准
+            for field in [f for f in FIELDS if f != "timestamp"] + ["timestamp"]:
+                path = self._path(symbol, bar, field)
+                tmp_path = f"{path}.tmp"
+                with open(tmp_path, "wb") as f:
+                    f.write(self._header_bytes(FIELDS[field], count, bar_ms))
+                    f.write(np.ascontiguousarray(columns[field]).tobytes())
+                os.replace(tmp_path, path)
+
+    def append(self, symbol: str, bar: str, candles) -> int:
+        """
+        在末尾追加K线，只写入晚于归档最后一根K线的部分
+
+        :return: 实际追加的条数
+        """
+        columns = self._to_columns(candles)
+        if not self.exists(symbol, bar):
+            self.write(symbol, bar, columns)
+            return len(columns["timestamp"])
+
+        with self._lock:
+            count = self._count(symbol, bar)
+            if count:
+                last_ts = int(np.memmap(self._path(symbol, bar, "timestamp"), dtype=np.int64, mode="r",
+                                        offset=_HEADER_SIZE + (count - 1) * 8, shape=(1,))[0])
+                mask = columns["timestamp"] > last_ts
+                columns = {field: array[mask] for field, array in columns.items()}
+            added = len(columns["timestamp"])
+            if added == 0:
+                return 0
+
+            new_count = count + added
+            # 先追加数据并更新各字段文件头，最后更新时间戳列，读者不会看到未写完的行
+            for field in [f for f in FIELDS if f != "timestamp"] + ["timestamp"]:
+                path = self._path(symbol, bar, field)
+                with open(path, "r+b") as f:
+                    f.seek(_HEADER_SIZE + count * np.dtype(FIELDS[field]).itemsize)
+                    f.truncate()
+                    f.write(np.ascontiguousarray(columns[field]).tobytes())
+                    f.flush()
+                    f.seek(_COUNT_OFFSET)
+                    f.write(struct.pack("<Q", new_count))
+            return added
+
+    def sync_from_store(self, candle_store, symbol: str, bar: str, start: int, end: int) -> CandleColumns:
+        """
+        用本地K线存储中 [start, end) 的数据更新归档，返回该范围的视图
+
+        存储中该范围的K线都已在归档中时直接返回；全部晚于归档终点时只追加；
+        否则（范围早于归档起点、或存储补齐了归档中间的缺口）与归档合并后整体重写，同一时间戳以存储为准。
+        """
+        columns = candle_store.get_columns(symbol, bar, start, end)
+        archived = self.open(symbol, bar)
+        if archived is None or len(archived) == 0:
+            del archived
+            self.write(symbol, bar, columns)
+            return self.open(symbol, bar).slice_time(start, end)
+
+        current = archived.slice_time(start, end)
+        missing = ~np.isin(columns["timestamp"], current.timestamp)
+        if not missing.any():
+            return current
+
+        # 复制出需要的数据并释放 memmap 后再追加或重写：
+        # append 会截断、write 会替换这些文件，Windows 上文件仍被映射时这两个操作都会失败
+        timestamps = np.array(archived.timestamp, copy=True)
+        if columns["timestamp"][missing][0] > timestamps[-1]:
+            del archived, current
+            self.append(symbol, bar, columns)
+        else:
+            keep = ~np.isin(timestamps, columns["timestamp"])
+            existing = {field: np.array(archived.columns[field][keep], copy=True) for field in FIELDS}
+            del archived, current
+            merged = {field: np.concatenate([existing[field], columns[field]]) for field in FIELDS}
+            order = np.argsort(merged["timestamp"], kind="stable")
+            self.write(symbol, bar, {field: array[order] for field, array in merged.items()})
+        return self.open(symbol, bar).slice_time(start, end)
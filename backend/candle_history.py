@@ -0,0 +1,159 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from typing import Optional, Dict, Any, List, AsyncIterator
+
+from bar_utils import bar_to_ms
+
+logger = logging.getLogger("CandleHistory")
+
+# /market/history-candles 每页最多返回100条
+HISTORY_PAGE_LIMIT = 100
+
+
+class HistoryCandleFetcher:
+    """
+    深度历史K线下载器
+
+    通过 /market/history-candles 的 after/before 游标向前翻页，突破单次300条的限制：
+    - 将 [start, end) 切分为多个时间窗口，各窗口并发翻页，请求速率由客户端的调度器控制
+    - 每页数据到达后立即输出，不在内存中缓存全部结果
+    - 可选的断点文件记录每个窗口的翻页进度，中断后使用相同参数重新调用即可继续
+    """
+
+    def __init__(self, okx_client, concurrency: int = 4, max_retries: int = 3):
+        """
+        :param okx_client: AsyncOKXClient 实例
+        :param concurrency: 并发下载的时间窗口数
+        :param max_retries: 单页请求失败时的重试次数
+        """
+        self.okx_client = okx_client
+        self.concurrency = max(1, concurrency)
+        self.max_retries = max_retries
+
+    def _split_windows(self, bar: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """按K线周期对齐切分时间窗口，cursor 为该窗口下一页的 after 参数"""
+        bar_ms = bar_to_ms(bar)
+        total_bars = max(1, (end - start) // bar_ms)
+        # 每个窗口至少一页，避免窗口过碎
+        windows_count = min(self.concurrency, max(1, total_bars // HISTORY_PAGE_LIMIT))
+        step = -(-total_bars // windows_count) * bar_ms
+        windows = []
+        window_start = start
+        while window_start < end:
+            window_end = min(end, window_start + step)
+            windows.append({"start": window_start, "end": window_end, "cursor": window_end, "done": False})
+            window_start = window_end
+        return windows
+
+    @staticmethod
+    def _load_checkpoint(path: str, params: Dict[str, Any]) -> Optional[List[Dict[str, Any]]]:
+        if not path or not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                checkpoint = json.load(f)
+            if checkpoint.get("params") != params:
+                logger.warning(f"断点文件参数不匹配，重新下载: {path}")
+                return None
+            return checkpoint["windows"]
+        except Exception as e:
+            logger.warning(f"读取断点文件失败，重新下载: {str(e)}")
+            return None
+
+    @staticmethod
+    def _save_checkpoint(path: str, params: Dict[str, Any], windows: List[Dict[str, Any]]):
+        if not path:
+            return
+        # 先写临时文件再替换，避免中断时留下损坏的断点文件
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"params": params, "windows": windows, "updated": int(time.time() * 1000)}, f)
+        os.replace(tmp_path, path)
+
+    async def _fetch_page(self, symbol: str, bar: str, start: int, cursor: int):
+        for retry in range(self.max_retries):
+            result = await self.okx_client.get_history_candles_page(
+                symbol, bar, after=cursor, before=start - 1, limit=HISTORY_PAGE_LIMIT
+            )
+            if result["success"]:
+                return result["data"]
+            logger.warning(f"下载历史K线失败 {symbol} {bar} after={cursor}: {result.get('msg')}")
+            await asyncio.sleep(min(8, 0.5 * (2 ** retry)))
+        raise RuntimeError(f"下载历史K线失败: {symbol} {bar} after={cursor}")
+
+    async def _run_window(self, symbol: str, bar: str, window: Dict[str, Any], queue: asyncio.Queue):
+        """从窗口的 cursor 向 start 翻页，每页放入队列；队列有上限，下载速度受消费速度约束"""
+        cursor = window["cursor"]
+        while True:
+            candles = await self._fetch_page(symbol, bar, window["start"], cursor)
+            candles = [c for c in candles if window["start"] <= c["timestamp"] < cursor]
+            if not candles:
+                # 没有更早的数据（到达上市时间或窗口起点）
+                await queue.put((window, [], window["start"]))
+                return
+            oldest = candles[0]["timestamp"]
+            await queue.put((window, candles, oldest))
+            if oldest <= window["start"]:
+                return
+            cursor = oldest
+
+    async def iter_pages(self, symbol: str, bar: str, start: int, end: Optional[int] = None,
+                         checkpoint_path: Optional[str] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        """
+        按页异步输出 [start, end) 范围内的K线（毫秒时间戳）
+
+        各窗口的页按到达顺序输出，页内按时间升序；全局顺序不保证。
+        断点在消费者处理完一页（请求下一页）后才推进，中断后重新调用不会丢页。
+        """
+        if end is None:
+            end = int(time.time() * 1000)
+        params = {"symbol": symbol, "bar": bar, "start": start, "end": end}
+        windows = self._load_checkpoint(checkpoint_path, params) or self._split_windows(bar, start, end)
+
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        tasks = [
+            asyncio.create_task(self._run_window(symbol, bar, window, queue))
+            for window in windows if not window["done"]
+        ]
+        pending = len(tasks)
+        try:
+            while pending:
+                getter = asyncio.create_task(queue.get())
+                done, _ = await asyncio.wait([getter, *tasks], return_when=asyncio.FIRST_COMPLETED)
+                if getter not in done:
+                    getter.cancel()
+                    # 某个窗口任务异常结束
+                    for task in done:
+                        if task.exception():
+                            raise task.exception()
+                    tasks = [t for t in tasks if not t.done()]
+                    continue
+
+                window, candles, oldest = getter.result()
+                if candles:
+                    yield candles
+                # 消费者处理完这一页后才记录进度
+                if oldest <= window["start"]:
+                    window["done"] = True
+                    pending -= 1
+                else:
+                    window["cursor"] = oldest
+                self._save_checkpoint(checkpoint_path, params, windows)
+        finally:
+            for task in tasks:
+                task.cancel()
+
+        if checkpoint_path and os.path.exists(checkpoint_path):
+            os.remove(checkpoint_path)
+
+    async def fetch_range(self, symbol: str, bar: str, start: int, end: Optional[int] = None,
+                          checkpoint_path: Optional[str] = None) -> List[Dict[str, Any]]:
+        """下载 [start, end) 范围内的全部K线，去重并按时间升序返回"""
+        candles_by_ts = {}
+        async for page in self.iter_pages(symbol, bar, start, end, checkpoint_path):
+            for candle in page:
+                candles_by_ts[candle["timestamp"]] = candle
+        return [candles_by_ts[ts] for ts in sorted(candles_by_ts)]
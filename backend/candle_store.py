@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple
+
+import numpy as np
+
+from bar_utils import bar_to_ms, bar_open_time
+
+logger = logging.getLogger("CandleStore")
+
+DEFAULT_DB_PATH = os.path.join(os.path.dirname(__file__), "market_data.db")
+
+
+class CandleStore:
+    """
+    本地K线存储（market_data.db）
+
+    - kline_data 以 (symbol, bar, timestamp) 为主键的 WITHOUT ROWID 表，主键即覆盖索引，
+      按 (symbol, bar, start, end) 的范围查询只扫描一段连续的B树
+    - kline_coverage 记录已从交易所完整下载过的时间段，区间内缺失的K线视为交易所本身没有数据，
+      不会重复请求
+    - WAL 模式，写入使用 executemany 批量 upsert
+    - 只保存已收盘的K线
+    """
+
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._init_schema()
+
+    def _init_schema(self):
+        with self._lock, self._conn:
+            columns = [row[1] for row in self._conn.execute("PRAGMA table_info(kline_data)")]
+            if columns and "bar" not in columns:
+                # 旧表没有周期字段，旧数据按1m迁移到新表
+                logger.info("迁移 kline_data 表，增加 bar 字段")
+                self._conn.execute("ALTER TABLE kline_data RENAME TO kline_data_old")
+                self._create_kline_table()
+                self._conn.execute("""
+                    INSERT OR IGNORE INTO kline_data (symbol, bar, timestamp, open, high, low, close, volume)
+                    SELECT symbol, '1m', timestamp, open, high, low, close, volume FROM kline_data_old
+                """)
+                self._conn.execute("DROP TABLE kline_data_old")
+            else:
+                self._create_kline_table()
+
+            self._conn.execute("""
+                CREATE TABLE IF NOT EXISTS kline_coverage (
+                    symbol TEXT,
+                    bar TEXT,
+                    start INTEGER,
+                    end INTEGER,
+                    PRIMARY KEY (symbol, bar, start)
+                ) WITHOUT ROWID
+            """)
+
+    def _create_kline_table(self):
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS kline_data (
+                symbol TEXT,
+                bar TEXT,
+                timestamp INTEGER,
+                open REAL,
+                high REAL,
+                low REAL,
+                close REAL,
+                volume REAL,
+                volume_currency REAL,
+                PRIMARY KEY (symbol, bar, timestamp)
+            ) WITHOUT ROWID
+        """)
+
+    @staticmethod
+    def last_closed_end(bar: str, now: Optional[float] = None) -> int:
+        """当前未收盘K线的开盘时间（毫秒），早于该时间的K线均已收盘"""
+        return int(bar_open_time(bar, now if now is not None else time.time()) * 1000)
+
+    def upsert_candles(self, symbol: str, bar: str, candles: List[Dict[str, Any]], mark_coverage: bool = False) -> int:
+        """
+        批量写入K线，未收盘的K线会被忽略
+
+        :param candles: _format_candles 格式的K线列表
+        :param mark_coverage: 是否将这批K线覆盖的时间段标记为已下载，要求K线来自一次连续的查询
+        :return: 写入的条数
+        """
+        closed_end = self.last_closed_end(bar)
+        rows = [
+            (symbol, bar, c["timestamp"], c["open"], c["high"], c["low"], c["close"],
+             c["volume"], c.get("volume_currency", 0.0))
+            for c in candles if c["timestamp"] < closed_end
+        ]
+        if not rows:
+            return 0
+        with self._lock, self._conn:
+            self._conn.executemany("""
+                INSERT INTO kline_data (symbol, bar, timestamp, open, high, low, close, volume, volume_currency)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (symbol, bar, timestamp) DO UPDATE SET
+                    open = excluded.open, high = excluded.high, low = excluded.low,
+                    close = excluded.close, volume = excluded.volume, volume_currency = excluded.volume_currency
+            """, rows)
+        if mark_coverage:
+            timestamps = [row[2] for row in rows]
+            self.mark_coverage(symbol, bar, min(timestamps), max(timestamps) + bar_to_ms(bar))
+        return len(rows)
+
+    def mark_coverage(self, symbol: str, bar: str, start: int, end: int):
+        """将 [start, end) 标记为已下载，并与相邻或重叠的区间合并"""
+        if end <= start:
+            return
+        with self._lock, self._conn:
+            overlapping = self._conn.execute("""
+                SELECT start, end FROM kline_coverage
+                WHERE symbol = ? AND bar = ? AND start <= ? AND end >= ?
+            """, (symbol, bar, end, start)).fetchall()
+            for old_start, old_end in overlapping:
+                start = min(start, old_start)
+                end = max(end, old_end)
+            self._conn.execute("""
+                DELETE FROM kline_coverage WHERE symbol = ? AND bar = ? AND start <= ? AND end >= ?
+            """, (symbol, bar, end, start))
+            self._conn.execute("INSERT INTO kline_coverage (symbol, bar, start, end) VALUES (?, ?, ?, ?)",
+                               (symbol, bar, start, end))
+
+    def find_missing_ranges(self, symbol: str, bar: str, start: int, end: int) -> List[Tuple[int, int]]:
+        """返回 [start, end) 中尚未下载过的时间段列表"""
+        with self._lock:
+            covered = self._conn.execute("""
+                SELECT start, end FROM kline_coverage
+                WHERE symbol = ? AND bar = ? AND start < ? AND end > ?
+                ORDER BY start
+            """, (symbol, bar, end, start)).fetchall()
+
+        missing = []
+        cursor = start
+        for covered_start, covered_end in covered:
+            if covered_start > cursor:
+                missing.append((cursor, min(covered_start, end)))
+            cursor = max(cursor, covered_end)
+            if cursor >= end:
+                break
+        if cursor < end:
+            missing.append((cursor, end))
+        return missing
+
+    def get_candles(self, symbol: str, bar: str, start: int, end: int) -> List[Dict[str, Any]]:
+        """读取 [start, end) 范围内的K线，按时间升序"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT timestamp, open, high, low, close, volume, volume_currency FROM kline_data
+                WHERE symbol = ? AND bar = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp
+            """, (symbol, bar, start, end)).fetchall()
+        return [
+            {
+                "timestamp": row[0],
+                "open": row[1],
+                "high": row[2],
+                "low": row[3],
+                "close": row[4],
+                "volume": row[5],
+                "volume_currency": row[6]
+            }
+            for row in rows
+        ]
+
+    def get_columns(self, symbol: str, bar: str, start: int, end: int) -> Dict[str, np.ndarray]:
+        """按列读取 [start, end) 范围内的K线，返回 {字段: numpy数组}，供列式归档使用"""
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT timestamp, open, high, low, close, volume, volume_currency FROM kline_data
+                WHERE symbol = ? AND bar = ? AND timestamp >= ? AND timestamp < ?
+                ORDER BY timestamp
+            """, (symbol, bar, start, end)).fetchall()
+        values = np.array(rows, dtype=np.float64).reshape(-1, 7)
+        columns = {"timestamp": values[:, 0].astype(np.int64)}
+        for i, name in enumerate(["open", "high", "low", "close", "volume", "volume_currency"], start=1):
+            columns[name] = np.ascontiguousarray(values[:, i])
+        return columns
+
+    async def fill_gaps(self, symbol: str, bar: str, start: int, end: Optional[int] = None,
+                        fetcher=None) -> Tuple[int, int]:
+        """
+        从交易所下载 [start, end) 中本地缺失的时间段
+
+        :param fetcher: HistoryCandleFetcher 实例，为空时不下载
+        :return: 截断到最近已收盘K线后的 (start, end)
+        """
+        closed_end = self.last_closed_end(bar)
+        end = closed_end if end is None else min(end, closed_end)
+        if end <= start or fetcher is None:
+            return start, end
+
+        missing = await asyncio.to_thread(self.find_missing_ranges, symbol, bar, start, end)
+        for gap_start, gap_end in missing:
+            logger.info(f"下载缺失K线 {symbol} {bar} [{gap_start}, {gap_end})")
+            async for page in fetcher.iter_pages(symbol, bar, gap_start, gap_end):
+                await asyncio.to_thread(self.upsert_candles, symbol, bar, page)
+            # 整段下载完成后再标记，中途失败的区间下次会重新下载
+            await asyncio.to_thread(self.mark_coverage, symbol, bar, gap_start, gap_end)
+        return start, end
+
+    async def get_range(self, symbol: str, bar: str, start: int, end: Optional[int] = None,
+                        fetcher=None) -> List[Dict[str, Any]]:
+        """
+        读取 [start, end) 范围内的K线，只从交易所下载本地缺失的时间段
+
+        :param fetcher: HistoryCandleFetcher 实例，为空时只读本地数据
+        """
+        start, end = await self.fill_gaps(symbol, bar, start, end, fetcher)
+        if end <= start:
+            return []
+        return await asyncio.to_thread(self.get_candles, symbol, bar, start, end)
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
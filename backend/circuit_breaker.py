@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+from typing import Optional, Dict, Any
+
+# 熔断器状态
+STATE_CLOSED = "closed"
+STATE_OPEN = "open"
+STATE_HALF_OPEN = "half_open"
+
+
+class RetryPolicy:
+    """
+    重试策略：指数退避 + 全抖动
+
+    第 n 次重试前等待 uniform(0, min(max_delay, base_delay * 2^n)) 秒
+    """
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 0.5, max_delay: float = 8,
+                 retry_on_error: bool = True):
+        """
+        :param max_attempts: 最多请求次数（含首次）
+        :param retry_on_error: 网络异常和5xx是否重试；下单类接口请求可能已到达交易所，不应重试
+        """
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retry_on_error = retry_on_error
+
+    def delay(self, retry: int) -> float:
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** retry)))
+
+    def should_retry(self, attempt: int, status: Optional[int] = None) -> bool:
+        """
+        :param attempt: 已完成的请求次数
+        :param status: HTTP状态码，网络异常时为 None
+        """
+        if attempt >= self.max_attempts:
+            return False
+        if status == 429:
+            # 被限速的请求没有被交易所处理，总是可以重试
+            return True
+        return self.retry_on_error
+
+
+# 各接口类别的重试和熔断参数
+DEFAULT_POLICIES = {
+    "market": {"retry": RetryPolicy(max_attempts=3, base_delay=0.2, max_delay=2),
+               "failure_threshold": 5, "reset_timeout": 10},
+    "account": {"retry": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=4),
+                "failure_threshold": 5, "reset_timeout": 15},
+    "trade": {"retry": RetryPolicy(max_attempts=2, base_delay=0.2, max_delay=1, retry_on_error=False),
+              "failure_threshold": 3, "reset_timeout": 5},
+    "default": {"retry": RetryPolicy(max_attempts=3, base_delay=0.5, max_delay=8),
+                "failure_threshold": 5, "reset_timeout": 10},
+}
+
+
+def endpoint_class(family: str) -> str:
+    """按接口族划分类别：/market/* 和 /public/* 为 market，/account/* 为 account，/trade/* 为 trade"""
+    if family.startswith("/market/") or family.startswith("/public/"):
+        return "market"
+    if family.startswith("/account/"):
+        return "account"
+    if family.startswith("/trade/"):
+        return "trade"
+    return "default"
+
+
+class CircuitBreaker:
+    """
+    单个接口族的熔断器
+
+    连续失败 failure_threshold 次后打开，reset_timeout 秒内的请求直接失败；
+    之后进入半开状态，只放行一个探测请求，成功则关闭，失败则重新打开。
+    """
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 10):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = STATE_CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._probe_in_flight = False
+        self._probe_started = 0.0
+        self.stats = {"requests": 0, "failures": 0, "retries": 0, "short_circuited": 0, "opened": 0}
+
+    def allow(self, now: float) -> bool:
+        if self.state == STATE_OPEN and now - self.opened_at >= self.reset_timeout:
+            self.state = STATE_HALF_OPEN
+            self._probe_in_flight = False
+        if self.state == STATE_CLOSED:
+            return True
+        # 探测请求被取消时不会回报结果，超时后允许新的探测
+        probe_expired = now - self._probe_started >= self.reset_timeout
+        if self.state == STATE_HALF_OPEN and (not self._probe_in_flight or probe_expired):
+            self._probe_in_flight = True
+            self._probe_started = now
+            return True
+        self.stats["short_circuited"] += 1
+        return False
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.state = STATE_CLOSED
+        self._probe_in_flight = False
+
+    def record_failure(self, now: float):
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        self._probe_in_flight = False
+        if self.state == STATE_HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            if self.state != STATE_OPEN:
+                self.stats["opened"] += 1
+            self.state = STATE_OPEN
+            self.opened_at = now
+
+
+class CircuitBreakerRegistry:
+    """
+    按接口族管理熔断器和重试策略，同步和异步客户端共享同一个实例
+
+    只有网络异常和5xx计为失败；429由限速调度器处理，业务错误码（code != "0"）不计入。
+    """
+
+    def __init__(self, policies: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.policies = dict(DEFAULT_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def _policy(self, family: str) -> Dict[str, Any]:
+        return self.policies.get(endpoint_class(family), self.policies["default"])
+
+    def retry_policy(self, family: str) -> RetryPolicy:
+        return self._policy(family)["retry"]
+
+    def _breaker(self, family: str) -> CircuitBreaker:
+        breaker = self._breakers.get(family)
+        if breaker is None:
+            policy = self._policy(family)
+            breaker = CircuitBreaker(policy["failure_threshold"], policy["reset_timeout"])
+            self._breakers[family] = breaker
+        return breaker
+
+    def allow(self, family: str) -> bool:
+        """熔断器打开时返回 False，调用方应直接失败"""
+        with self._lock:
+            breaker = self._breaker(family)
+            breaker.stats["requests"] += 1
+            return breaker.allow(time.monotonic())
+
+    def record_success(self, family: str):
+        with self._lock:
+            self._breaker(family).record_success()
+
+    def record_failure(self, family: str):
+        with self._lock:
+            self._breaker(family).record_failure(time.monotonic())
+
+    def record_retry(self, family: str):
+        with self._lock:
+            self._breaker(family).stats["retries"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """各接口族的熔断状态、连续失败次数和重试次数"""
+        with self._lock:
+            now = time.monotonic()
+            return {
+                family: {
+                    "class": endpoint_class(family),
+                    "state": breaker.state,
+                    "consecutive_failures": breaker.consecutive_failures,
+                    "open_remaining": round(max(0.0, breaker.reset_timeout - (now - breaker.opened_at)), 3)
+                    if breaker.state == STATE_OPEN else 0,
+                    **breaker.stats
+                }
+                for family, breaker in self._breakers.items()
+            }
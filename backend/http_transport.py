@@ -0,0 +1,321 @@
+import threading
+import time
+from collections import deque
+from typing import Optional, Dict, Any
+
+import aiohttp
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+
+# 每个线程记录当前请求的连接耗时，由连接类在建立连接时写入
+_timing_local = threading.local()
+
+
+def _current_timing() -> Optional[Dict[str, Any]]:
+    return getattr(_timing_local, "current", None)
+
+
+class _TimedHTTPConnection(HTTPConnection):
+    """记录TCP建连耗时的HTTP连接"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        conn = super()._new_conn()
+        timing = _current_timing()
+        if timing is not None:
+            timing["connect"] += time.perf_counter() - start
+            timing["new_connection"] = True
+        return conn
+
+
+class _TimedHTTPSConnection(HTTPSConnection):
+    """记录TCP建连和TLS握手耗时的HTTPS连接"""
+
+    def _new_conn(self):
+        start = time.perf_counter()
+        conn = super()._new_conn()
+        timing = _current_timing()
+        if timing is not None:
+            timing["connect"] += time.perf_counter() - start
+            timing["new_connection"] = True
+        return conn
+
+    def connect(self):
+        timing = _current_timing()
+        connect_before = timing["connect"] if timing is not None else 0.0
+        start = time.perf_counter()
+        super().connect()
+        if timing is not None:
+            # connect() = TCP建连 + TLS握手，减去TCP部分即为TLS耗时
+            tcp_time = timing["connect"] - connect_before
+            timing["tls"] += max(0.0, time.perf_counter() - start - tcp_time)
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class _TimedHTTPAdapter(HTTPAdapter):
+    """使用带计时连接类的连接池适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            "http": _TimedHTTPConnectionPool,
+            "https": _TimedHTTPSConnectionPool,
+        }
+
+
+class PooledHTTPTransport:
+    """
+    基于 requests.Session 的连接池传输层
+
+    - 同一主机的连接保持长连接并复用，避免每次请求都重新进行TCP+TLS握手
+    - pool_maxsize 为每个主机保留的最大连接数
+    - 统计连接复用次数，并记录每个请求的建连、TLS握手和首字节耗时
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10,
+                 timeout: float = 30, max_recent: int = 200):
+        """
+        :param pool_connections: 缓存的主机连接池数量
+        :param pool_maxsize: 每个主机连接池的最大连接数
+        :param timeout: 默认请求超时时间（秒）
+        :param max_recent: 保留最近请求耗时记录的条数
+        """
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = _TimedHTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self._lock = threading.Lock()
+        self._recent = deque(maxlen=max_recent)
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "connect_ms_total": 0.0,
+            "tls_ms_total": 0.0,
+            "ttfb_ms_total": 0.0,
+            "total_ms_total": 0.0,
+        }
+        self.last_timing: Optional[Dict[str, Any]] = None
+
+    def request(self, method: str, url: str, **kwargs) -> requests.Response:
+        """发送请求并记录耗时，参数与 requests.Session.request 相同"""
+        kwargs.setdefault("timeout", self.timeout)
+        timing = {"connect": 0.0, "tls": 0.0, "new_connection": False}
+        _timing_local.current = timing
+        start = time.perf_counter()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except Exception:
+            with self._lock:
+                self._stats["requests"] += 1
+                self._stats["errors"] += 1
+                if timing["new_connection"]:
+                    self._stats["new_connections"] += 1
+            raise
+        finally:
+            _timing_local.current = None
+        total = time.perf_counter() - start
+
+        # response.elapsed 为发送请求到收到响应头的时间，包含建连和握手
+        elapsed = response.elapsed.total_seconds()
+        ttfb = max(0.0, elapsed - timing["connect"] - timing["tls"])
+        record = {
+            "method": method.upper(),
+            "url": url,
+            "status": response.status_code,
+            "reused": not timing["new_connection"],
+            "connect_ms": round(timing["connect"] * 1000, 3),
+            "tls_ms": round(timing["tls"] * 1000, 3),
+            "ttfb_ms": round(ttfb * 1000, 3),
+            "total_ms": round(total * 1000, 3),
+            "time": time.time(),
+        }
+
+        with self._lock:
+            self._stats["requests"] += 1
+            if timing["new_connection"]:
+                self._stats["new_connections"] += 1
+            else:
+                self._stats["reused_connections"] += 1
+            self._stats["connect_ms_total"] += record["connect_ms"]
+            self._stats["tls_ms_total"] += record["tls_ms"]
+            self._stats["ttfb_ms_total"] += record["ttfb_ms"]
+            self._stats["total_ms_total"] += record["total_ms"]
+            self._recent.append(record)
+            self.last_timing = record
+
+        return response
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接复用和耗时统计"""
+        with self._lock:
+            stats = dict(self._stats)
+            recent = list(self._recent)
+
+        completed = stats["requests"] - stats["errors"]
+        stats["reuse_ratio"] = round(stats["reused_connections"] / completed, 4) if completed else 0
+        for name in ("connect", "tls", "ttfb", "total"):
+            total = stats.pop(f"{name}_ms_total")
+            stats[f"avg_{name}_ms"] = round(total / completed, 3) if completed else 0
+        stats["pool_connections"] = self.pool_connections
+        stats["pool_maxsize"] = self.pool_maxsize
+        stats["recent"] = recent[-20:]
+        return stats
+
+    def close(self):
+        """关闭所有连接"""
+        self.session.close()
+
+
+class AsyncPooledHTTPTransport:
+    """
+    基于 aiohttp.ClientSession 的异步连接池传输层
+
+    与 PooledHTTPTransport 提供相同的统计信息。aiohttp 的连接建立事件
+    包含TCP和TLS两个阶段，因此 tls_ms 计入 connect_ms，单独字段恒为0。
+    """
+
+    def __init__(self, pool_maxsize: int = 10, pool_limit: int = 100,
+                 timeout: float = 30, max_recent: int = 200):
+        """
+        :param pool_maxsize: 每个主机的最大连接数
+        :param pool_limit: 所有主机的最大连接总数
+        :param timeout: 默认请求超时时间（秒）
+        :param max_recent: 保留最近请求耗时记录的条数
+        """
+        self.pool_maxsize = pool_maxsize
+        self.pool_limit = pool_limit
+        self.timeout = timeout
+        self._session: Optional[aiohttp.ClientSession] = None
+
+        self._recent = deque(maxlen=max_recent)
+        self._stats = {
+            "requests": 0,
+            "errors": 0,
+            "new_connections": 0,
+            "reused_connections": 0,
+            "connect_ms_total": 0.0,
+            "ttfb_ms_total": 0.0,
+            "total_ms_total": 0.0,
+        }
+        self.last_timing: Optional[Dict[str, Any]] = None
+
+    def _create_trace_config(self) -> aiohttp.TraceConfig:
+        trace_config = aiohttp.TraceConfig()
+
+        async def on_request_start(session, ctx, params):
+            ctx.trace_request_ctx["start"] = time.perf_counter()
+
+        async def on_connection_create_start(session, ctx, params):
+            ctx.trace_request_ctx["connect_start"] = time.perf_counter()
+
+        async def on_connection_create_end(session, ctx, params):
+            timing = ctx.trace_request_ctx
+            timing["connect"] += time.perf_counter() - timing.pop("connect_start", time.perf_counter())
+            timing["new_connection"] = True
+
+        async def on_request_end(session, ctx, params):
+            # 收到响应头时触发，减去建连耗时即为首字节时间
+            timing = ctx.trace_request_ctx
+            timing["headers"] = time.perf_counter() - timing.get("start", time.perf_counter())
+
+        trace_config.on_request_start.append(on_request_start)
+        trace_config.on_connection_create_start.append(on_connection_create_start)
+        trace_config.on_connection_create_end.append(on_connection_create_end)
+        trace_config.on_request_end.append(on_request_end)
+        return trace_config
+
+    def _get_session(self) -> aiohttp.ClientSession:
+        # ClientSession 必须在事件循环中创建，因此延迟到首次请求时初始化
+        if self._session is None or self._session.closed:
+            connector = aiohttp.TCPConnector(limit=self.pool_limit, limit_per_host=self.pool_maxsize)
+            self._session = aiohttp.ClientSession(
+                connector=connector,
+                timeout=aiohttp.ClientTimeout(total=self.timeout),
+                trace_configs=[self._create_trace_config()]
+            )
+        return self._session
+
+    async def request(self, method: str, url: str, **kwargs):
+        """
+        发送请求并记录耗时
+
+        :return: (HTTP状态码, 响应文本)
+        """
+        timing = {"connect": 0.0, "new_connection": False, "headers": 0.0}
+        start = time.perf_counter()
+        try:
+            session = self._get_session()
+            async with session.request(method, url, trace_request_ctx=timing, **kwargs) as response:
+                status = response.status
+                text = await response.text()
+        except Exception:
+            self._stats["requests"] += 1
+            self._stats["errors"] += 1
+            if timing["new_connection"]:
+                self._stats["new_connections"] += 1
+            raise
+        total = time.perf_counter() - start
+
+        ttfb = max(0.0, timing["headers"] - timing["connect"])
+        record = {
+            "method": method.upper(),
+            "url": url,
+            "status": status,
+            "reused": not timing["new_connection"],
+            "connect_ms": round(timing["connect"] * 1000, 3),
+            "tls_ms": 0.0,
+            "ttfb_ms": round(ttfb * 1000, 3),
+            "total_ms": round(total * 1000, 3),
+            "time": time.time(),
+        }
+
+        # 所有协程运行在同一事件循环线程中，无需加锁
+        self._stats["requests"] += 1
+        if timing["new_connection"]:
+            self._stats["new_connections"] += 1
+        else:
+            self._stats["reused_connections"] += 1
+        self._stats["connect_ms_total"] += record["connect_ms"]
+        self._stats["ttfb_ms_total"] += record["ttfb_ms"]
+        self._stats["total_ms_total"] += record["total_ms"]
+        self._recent.append(record)
+        self.last_timing = record
+
+        return status, text
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取连接复用和耗时统计"""
+        stats = dict(self._stats)
+        recent = list(self._recent)
+
+        completed = stats["requests"] - stats["errors"]
+        stats["reuse_ratio"] = round(stats["reused_connections"] / completed, 4) if completed else 0
+        for name in ("connect", "ttfb", "total"):
+            total = stats.pop(f"{name}_ms_total")
+            stats[f"avg_{name}_ms"] = round(total / completed, 3) if completed else 0
+        stats["avg_tls_ms"] = 0
+        stats["pool_limit"] = self.pool_limit
+        stats["pool_maxsize"] = self.pool_maxsize
+        stats["recent"] = recent[-20:]
+        return stats
+
+    async def close(self):
+        """关闭会话及所有连接"""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
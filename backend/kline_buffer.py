@@ -0,0 +1,189 @@
+import collections.abc
+from typing import Optional, Dict, Any, List, Tuple, Sequence
+
+import numpy as np
+
+from bar_utils import bar_to_ms
+
+# OKX K线的9个字段：时间戳 开 高 低 收 成交量 成交额(币) 成交额(计价货币) 是否收盘
+KLINE_COLUMNS = ("ts", "open", "high", "low", "close", "volume", "volume_currency", "volume_quote", "confirm")
+TS, OPEN, HIGH, LOW, CLOSE, VOLUME, VOLUME_CURRENCY, VOLUME_QUOTE, CONFIRM = range(len(KLINE_COLUMNS))
+
+# OKX /market/candles 单次最多返回300条
+DEFAULT_CAPACITY = 300
+
+
+def parse_kline_rows(rows: Sequence[Sequence]) -> np.ndarray:
+    """OKX原始K线（字符串数组，按时间倒序）转换为 float64 数组，行顺序不变"""
+    data = np.zeros((len(rows), len(KLINE_COLUMNS)), dtype=np.float64)
+    for index, row in enumerate(rows):
+        values = [float(value) if value not in (None, "") else 0.0 for value in row[:len(KLINE_COLUMNS)]]
+        data[index, :len(values)] = values
+    return data
+
+
+def format_kline_row(values: Sequence[float]) -> List[str]:
+    """float64 K线行还原为OKX原始格式（字符串数组）"""
+    return [str(int(values[TS]))] + [repr(float(value)) for value in values[OPEN:CONFIRM]] + [str(int(values[CONFIRM]))]
+
+
+class KlineRows(collections.abc.Sequence):
+    """
+    numpy K线数组（按时间倒序）的OKX原始格式视图
+
+    兼容 market_data["kline"][0][4] 这类按行取值的写法，只在访问某一行时才转换该行，不会一次性生成全部字符串。
+    """
+
+    __slots__ = ("array",)
+
+    def __init__(self, array: np.ndarray):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [format_kline_row(values) for values in self.array[index].tolist()]
+        return format_kline_row(self.array[index].tolist())
+
+    def __iter__(self):
+        for values in self.array.tolist():
+            yield format_kline_row(values)
+
+
+class KlineRingBuffer:
+    """
+    单个 (symbol, bar) 的定长K线环形缓冲区
+
+    数据存放在 2*capacity 行的数组中，每根K线同时写入 i 和 i+capacity 两个位置（镜像），
+    因此最近 count 根K线总是一段连续内存，view() 直接返回只读视图而不复制。
+    初始化（seed）一次之后只需合并未收盘K线和新收盘的K线；出现缺口时 needs_seed 置为 True，由调用方重新初始化。
+    """
+
+    def __init__(self, bar: Optional[str] = None, capacity: int = DEFAULT_CAPACITY):
+        self.bar = bar
+        # 1M 等按自然月计的周期长度不固定，间隔超过1.5个周期才视为缺口
+        self._gap_ms = bar_to_ms(bar) * 1.5 if bar else None
+        self.capacity = capacity
+        self._data = np.zeros((2 * capacity, len(KLINE_COLUMNS)), dtype=np.float64)
+        self._next = 0  # 下一根K线写入的位置（0 ~ capacity-1）
+        self.count = 0
+        self.needs_seed = True
+        self.stats = {"seeds": 0, "updates": 0, "appended": 0}
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def newest_ts(self) -> Optional[int]:
+        return int(self._data[(self._next - 1) % self.capacity, TS]) if self.count else None
+
+    def _write(self, position: int, values: np.ndarray):
+        self._data[position] = values
+        self._data[position + self.capacity] = values
+
+    def _append(self, values: np.ndarray):
+        self._write(self._next, values)
+        self._next = (self._next + 1) % self.capacity
+        self.count = min(self.capacity, self.count + 1)
+
+    def seed(self, rows: Sequence[Sequence]):
+        """用REST获取的完整K线（OKX原始格式，按时间倒序）初始化"""
+        self.seed_array(parse_kline_rows(rows))
+
+    def seed_array(self, data: np.ndarray):
+        count = min(len(data), self.capacity)
+        ascending = data[:count][::-1]
+        self._data[:count] = ascending
+        self._data[self.capacity:self.capacity + count] = ascending
+        self._next = count % self.capacity
+        self.count = count
+        self.needs_seed = False
+        self.stats["seeds"] += 1
+
+    def update(self, rows: Sequence[Sequence]) -> int:
+        """合并新的K线（OKX原始格式，任意顺序），返回新增的K线根数"""
+        return self.update_array(parse_kline_rows(rows))
+
+    def update_array(self, data: np.ndarray) -> int:
+        appended = 0
+        for values in data[np.argsort(data[:, TS], kind="stable")]:
+            ts = values[TS]
+            if not self.count:
+                self._append(values)
+                appended += 1
+                continue
+            newest_position = (self._next - 1) % self.capacity
+            newest = self._data[newest_position, TS]
+            if ts == newest:
+                # 未收盘K线原地更新
+                self._write(newest_position, values)
+            elif ts > newest:
+                if self._gap_ms is not None and ts - newest > self._gap_ms:
+                    self.needs_seed = True
+                self._append(values)
+                appended += 1
+            elif self._gap_ms is not None:
+                # 较早的K线（例如刚收盘的K线的最终值），仍在缓冲区内时原地更新
+                offset = int(round((newest - ts) / (self._gap_ms / 1.5)))
+                if offset < self.count:
+                    position = (self._next - 1 - offset) % self.capacity
+                    if self._data[position, TS] == ts:
+                        self._write(position, values)
+        self.stats["updates"] += 1
+        self.stats["appended"] += appended
+        return appended
+
+    def view(self, limit: Optional[int] = None) -> np.ndarray:
+        """
+        最近的K线，按时间倒序（与OKX返回顺序一致）的只读视图，列见 KLINE_COLUMNS
+
+        视图与缓冲区共享内存，之后的更新会反映到视图中；需要跨轮保存时请复制。
+        """
+        start = (self._next - self.count) % self.capacity
+        view = self._data[start:start + self.count][::-1]
+        if limit is not None:
+            view = view[:limit]
+        view.flags.writeable = False
+        return view
+
+
+class KlineBufferStore:
+    """按 (symbol, bar) 管理K线环形缓冲区"""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY):
+        self.capacity = capacity
+        self._buffers: Dict[Tuple[str, str], KlineRingBuffer] = {}
+
+    def get(self, symbol: str, bar: str) -> Optional[KlineRingBuffer]:
+        return self._buffers.get((symbol, bar))
+
+    def buffer(self, symbol: str, bar: str) -> KlineRingBuffer:
+        key = (symbol, bar)
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = KlineRingBuffer(bar, self.capacity)
+            self._buffers[key] = buffer
+        return buffer
+
+    def needs_seed(self, symbol: str, bar: str) -> bool:
+        buffer = self._buffers.get((symbol, bar))
+        return buffer is None or buffer.needs_seed
+
+    def seed(self, symbol: str, bar: str, rows: Sequence[Sequence]):
+        self.buffer(symbol, bar).seed(rows)
+
+    def update(self, symbol: str, bar: str, rows: Sequence[Sequence]) -> int:
+        return self.buffer(symbol, bar).update(rows)
+
+    def remove(self, symbol: str):
+        for key in [key for key in self._buffers if key[0] == symbol]:
+            del self._buffers[key]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            f"{symbol}:{bar}": {"count": buffer.count, "newest_ts": buffer.newest_ts,
+                                "needs_seed": buffer.needs_seed, **buffer.stats}
+            for (symbol, bar), buffer in self._buffers.items()
+        }
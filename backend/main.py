@@ -1,7 +1,15 @@
 from fastapi import FastAPI, BackgroundTasks, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import Response
 from okx_client import OKXClient
+from async_okx_client import AsyncOKXClient
+from rate_limiter import RequestScheduler
+from circuit_breaker import CircuitBreakerRegistry, STATE_OPEN
+from metrics import MetricsRegistry, PROMETHEUS_CONTENT_TYPE
+from strategy_executor import executor_from_env
+from sharded_engine import ShardedStrategyEngine
 from strategy_engine import StrategyEngine
+from strategy_snapshot import StrategySnapshotStore, DEFAULT_SNAPSHOT_PATH
 from strategies.strategy_factory import StrategyFactory
 import asyncio
 import json
@@ -11,6 +19,10 @@ import os
 from typing import List, Dict
 from dotenv import load_dotenv
 from backtest_engine import BacktestEngine
+from candle_history import HistoryCandleFetcher
+from candle_store import CandleStore
+from candle_archive import CandleArchive
+from okx_websocket import OKXMarketFeed, OKXAccountFeed
 from pydantic import BaseModel
 from typing import Optional, Dict, Any, List
 
@@ -18,11 +30,66 @@ from typing import Optional, Dict, Any, List
 load_dotenv()
 
 app = FastAPI()
-okx_client = OKXClient()
-strategy_engine = StrategyEngine(okx_client)
-
-# 初始化回测引擎 - 移到顶部
-backtest_engine = BacktestEngine(okx_client)
+# 同步和异步客户端共享同一个限速调度器，共同遵守OKX的接口限速
+request_scheduler = RequestScheduler(max_concurrency=int(os.environ.get("OKX_POOL_MAXSIZE", "10")))
+# 熔断器同样共享，任一客户端发现接口故障后另一个客户端也会快速失败
+circuit_breakers = CircuitBreakerRegistry()
+# 延迟直方图和计数器，由 /api/metrics 以 Prometheus 格式导出
+metrics = MetricsRegistry()
+# 以下对象在 init_services 中于应用启动时创建，而不是导入时：
+# 导入 main 不会迁移K线数据库，多进程 spawn 的子进程重新导入 main 时也不会再创建客户端、推送连接和策略引擎
+okx_client = None
+async_okx_client = None
+candle_store = None
+market_feed = None
+account_feed = None
+strategy_engine = None
+history_fetcher = None
+candle_archive = None
+backtest_engine = None
+
+
+def init_services():
+    """创建客户端、K线存储、行情推送、策略引擎和回测引擎，重复调用时不做处理"""
+    global okx_client, async_okx_client, candle_store, market_feed, account_feed
+    global strategy_engine, history_fetcher, candle_archive, backtest_engine
+    if strategy_engine is not None:
+        return
+    okx_client = OKXClient(scheduler=request_scheduler, breakers=circuit_breakers, metrics=metrics)
+    # 事件循环中的请求统一使用异步客户端，避免阻塞
+    async_okx_client = AsyncOKXClient(scheduler=request_scheduler, breakers=circuit_breakers, metrics=metrics)
+    # 本地K线存储，实时K线写入后可直接用于回测
+    candle_store = CandleStore()
+    # WebSocket行情推送，替代策略引擎对K线和行情的REST轮询；设置 OKX_WS_ENABLED=False 时回退为轮询
+    ws_enabled = os.environ.get("OKX_WS_ENABLED", "True").lower() == "true"
+    market_feed = OKXMarketFeed() if ws_enabled else None
+    # 私有频道推送账户、持仓和订单，替代账户数据的REST轮询
+    account_feed = OKXAccountFeed(async_okx_client) if ws_enabled else None
+    if account_feed is not None:
+        account_feed.add_listener(on_account_update)
+    # 策略执行方式和超时，见 strategy_executor.executor_from_env
+    # KLINE_BUFFER_CAPACITY 为每个交易对保留的K线根数，超过300根时初始化后随新K线逐渐填满
+    engine_options = dict(candle_store=candle_store, market_feed=market_feed, account_feed=account_feed,
+                          metrics=metrics, executor=executor_from_env(),
+                          kline_capacity=int(os.environ.get("KLINE_BUFFER_CAPACITY", "300")))
+    # 策略运行时状态快照，重启后恢复策略及其价格历史；STRATEGY_SNAPSHOT_PATH 设为空时不保存
+    snapshot_path = os.environ.get("STRATEGY_SNAPSHOT_PATH", DEFAULT_SNAPSHOT_PATH)
+    if snapshot_path:
+        engine_options["snapshot_store"] = StrategySnapshotStore(
+            snapshot_path, interval=float(os.environ.get("STRATEGY_SNAPSHOT_INTERVAL", "30")))
+    # STRATEGY_SHARDS 大于1时策略按交易对分配到多个进程执行，行情通过共享内存分发
+    strategy_shards = int(os.environ.get("STRATEGY_SHARDS", "1"))
+    if strategy_shards > 1:
+        strategy_engine = ShardedStrategyEngine(async_okx_client, shards=strategy_shards, **engine_options)
+    else:
+        strategy_engine = StrategyEngine(async_okx_client, **engine_options)
+
+    # 深度历史K线下载器，补齐本地缺失的K线
+    history_fetcher = HistoryCandleFetcher(async_okx_client)
+    # 列式K线归档，回测时通过 memmap 直接读取
+    candle_archive = CandleArchive()
+    backtest_engine = BacktestEngine(okx_client, candle_store=candle_store, history_fetcher=history_fetcher,
+                                     candle_archive=candle_archive)
 
 # 回测请求模型 - 移到顶部
 from pydantic import BaseModel
@@ -33,6 +100,8 @@ class BacktestRequest(BaseModel):
     symbol: str
     bar: str = "1m"
     initial_capital: float = 10000
+    start_time: Optional[int] = None  # 回测开始时间（毫秒），为空时使用最近300根K线
+    end_time: Optional[int] = None    # 回测结束时间（毫秒），为空时到当前时间
 
 # 确保这个端点定义在 if __name__ == "__main__": 之前
 @app.post("/api/backtest")
@@ -44,15 +113,27 @@ async def run_backtest(request: BacktestRequest):
         if request.strategy_id not in strategy_engine.strategies:
             return {"success": False, "msg": f"未找到ID为 {request.strategy_id} 的策略"}
         
-        # 获取策略实例
-        strategy = strategy_engine.strategies[request.strategy_id]["instance"]
+        # 按运行中策略的类型和参数新建实例：回测在线程中执行，不能与策略引擎共用同一实例的状态
+        strategy_info = strategy_engine.strategies[request.strategy_id]
+        running = strategy_info["instance"]
+        strategy = StrategyFactory.create_strategy(
+            strategy_info["type"], request.strategy_id, running.name, running.description,
+            dict(running.parameters)
+        )
         
-        # 运行回测
-        result = backtest_engine.run_backtest(
+        # 从本地K线存储读取，只下载缺失的时间段
+        candles = await backtest_engine.load_candles(
+            request.symbol, request.bar, request.start_time, request.end_time
+        )
+        
+        # 运行回测（同步客户端在线程中执行，不阻塞事件循环）
+        result = await asyncio.to_thread(
+            backtest_engine.run_backtest,
             strategy=strategy,
             symbol=request.symbol,
             bar=request.bar,
-            initial_capital=request.initial_capital
+            initial_capital=request.initial_capital,
+            candles=candles
         )
         
         return result
@@ -97,12 +178,13 @@ os.makedirs(os.path.dirname(INSTRUMENTS_FILE), exist_ok=True)
 @app.on_event("startup")
 async def startup_event():
     """应用启动时，开始后台数据更新任务和策略引擎"""
+    init_services()
     asyncio.create_task(update_data_periodically())
     
     # 获取并保存所有可交易产品
     try:
         # 获取多种产品类型
-        instruments_data = okx_client.get_instruments(["SPOT", "SWAP", "FUTURES"])
+        instruments_data = await async_okx_client.get_instruments(["SPOT", "SWAP", "FUTURES"])
         if instruments_data["success"]:
             instruments = instruments_data["data"]
             cache["instruments"] = instruments
@@ -164,11 +246,170 @@ async def get_instruments():
 async def get_market_data(symbol: str):
     """获取市场数据"""
     try:
-        market_data = okx_client.get_market_data(symbol)
+        market_data = await async_okx_client.get_market_data(symbol)
         return market_data
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# 添加批量获取行情的API端点
+@app.get("/api/tickers")
+async def get_tickers(inst_type: str = "SWAP", symbols: Optional[str] = None):
+    """
+    一次获取某一产品类型全部产品的行情
+    symbols 为逗号分隔的产品ID，不为空时只返回这些产品
+    """
+    try:
+        result = await async_okx_client.get_tickers_snapshot(inst_type)
+        if not result["success"]:
+            return result
+        table = result["data"]
+        if symbols:
+            tickers = [table.get(symbol) for symbol in symbols.split(",") if symbol in table]
+        else:
+            tickers = table.tickers
+        return {"success": True, "data": tickers, "msg": "success"}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+# 添加获取OKX连接池统计的API端点
+@app.get("/api/okx/transport-stats")
+async def get_transport_stats():
+    """获取OKX HTTP连接池的复用次数和请求耗时"""
+    return {
+        "success": True,
+        "data": {
+            "sync": okx_client.get_transport_stats(),
+            "async": async_okx_client.get_transport_stats()
+        }
+    }
+
+# 添加获取OKX限速调度器统计的API端点
+@app.get("/api/okx/scheduler-stats")
+async def get_scheduler_stats():
+    """获取各接口的限速队列深度和等待时间"""
+    return {"success": True, "data": request_scheduler.get_stats()}
+
+# 添加获取请求合并统计的API端点
+@app.get("/api/okx/coalescing-stats")
+async def get_coalescing_stats():
+    """获取各接口被合并的重复请求数"""
+    return {
+        "success": True,
+        "data": {
+            "sync": okx_client.get_coalescing_stats(),
+            "async": async_okx_client.get_coalescing_stats()
+        }
+    }
+
+# 添加获取OKX客户端缓存统计的API端点
+@app.get("/api/okx/cache-stats")
+async def get_cache_stats():
+    """获取缓存命中、淘汰次数和占用容量"""
+    return {
+        "success": True,
+        "data": {
+            "sync": okx_client.get_cache_stats(),
+            "async": async_okx_client.get_cache_stats()
+        }
+    }
+
+# 添加获取熔断器状态的API端点
+@app.get("/api/okx/resilience-stats")
+async def get_resilience_stats():
+    """获取各接口族的熔断状态、失败和重试次数"""
+    return {"success": True, "data": circuit_breakers.get_stats()}
+
+# 添加获取WebSocket行情推送状态的API端点
+@app.get("/api/okx/ws-stats")
+async def get_ws_stats():
+    """获取WebSocket连接、订阅数和推送消息统计"""
+    if market_feed is None:
+        return {"success": False, "msg": "WebSocket行情推送未启用"}
+    return {
+        "success": True,
+        "data": {
+            "market": market_feed.get_stats(),
+            "account": account_feed.get_stats()
+        }
+    }
+
+def collect_client_metrics():
+    """采集时导出熔断器状态、缓存和WebSocket连接统计"""
+    breakers = circuit_breakers.get_stats()
+    yield ("okx_circuit_open", "gauge", "接口熔断器是否打开",
+           [({"endpoint": family}, 1 if stats["state"] == STATE_OPEN else 0) for family, stats in breakers.items()])
+    cache_stats = async_okx_client.get_cache_stats()
+    yield ("okx_cache_entries", "gauge", "响应缓存的条目数", [({}, cache_stats["entries"])])
+    yield ("okx_cache_bytes", "gauge", "响应缓存占用的字节数", [({}, cache_stats["bytes"])])
+    if market_feed is not None:
+        connections = market_feed.get_stats()["connections"] + [account_feed.get_stats()["connection"]]
+        yield ("okx_ws_connected", "gauge", "WebSocket连接是否已连接",
+               [({"connection": c["name"]}, 1 if c["connected"] else 0) for c in connections])
+
+metrics.register_collector(collect_client_metrics)
+
+@app.get("/api/metrics")
+async def get_metrics():
+    """以 Prometheus 文本格式导出延迟直方图、计数器和状态指标"""
+    return Response(content=metrics.render(), media_type=PROMETHEUS_CONTENT_TYPE)
+
+@app.get("/api/metrics/summary")
+async def get_metrics_summary():
+    """各延迟直方图的分位数（秒）"""
+    return {"success": True, "data": metrics.summary()}
+
+@app.get("/api/strategies/executor-stats")
+async def get_executor_stats():
+    """获取策略执行器的执行方式、超时计数和工作进程状态"""
+    return {"success": True, "data": strategy_engine.executor.get_stats()}
+
+@app.get("/api/strategies/scheduler-stats")
+async def get_strategy_scheduler_stats():
+    """获取策略调度器按触发方式的策略数和触发计数"""
+    return {"success": True, "data": strategy_engine.scheduler.get_stats()}
+
+@app.get("/api/strategies/snapshot-stats")
+async def get_snapshot_stats():
+    """获取策略快照文件的保存统计，未启用快照时返回空"""
+    if strategy_engine.snapshot_store is None:
+        return {"success": True, "data": None}
+    return {"success": True, "data": strategy_engine.snapshot_store.get_stats()}
+
+@app.get("/api/orders")
+async def get_orders(strategy_id: Optional[str] = None, symbol: Optional[str] = None):
+    """获取订单管理中未完成的订单，可按策略和交易对过滤"""
+    return {"success": True, "data": strategy_engine.order_manager.open_orders(strategy_id, symbol)}
+
+@app.get("/api/orders/stats")
+async def get_order_stats():
+    """获取订单管理的队列深度、各状态订单数和累计统计"""
+    return {"success": True, "data": strategy_engine.order_manager.get_stats()}
+
+@app.get("/api/orders/{cl_ord_id}")
+async def get_order(cl_ord_id: str):
+    """按 clOrdId 查询订单（含最近完成的订单）"""
+    order = strategy_engine.order_manager.get_order(cl_ord_id)
+    if order is None:
+        raise HTTPException(status_code=404, detail=f"订单 {cl_ord_id} 不存在")
+    return {"success": True, "data": order}
+
+@app.get("/api/strategies/netting-stats")
+async def get_netting_stats():
+    """获取信号轧差的订单数、内部撮合次数和最近的内部撮合记录"""
+    return {"success": True, "data": strategy_engine.netter.get_stats()}
+
+@app.get("/api/strategies/shard-stats")
+async def get_shard_stats():
+    """获取分片策略引擎各分片的状态，未启用分片时返回空"""
+    if not isinstance(strategy_engine, ShardedStrategyEngine):
+        return {"success": True, "data": None}
+    return {"success": True, "data": strategy_engine.get_shard_stats()}
+
+@app.get("/api/strategies/market-bus-stats")
+async def get_market_bus_stats():
+    """获取策略市场数据总线的订阅和发布统计"""
+    return {"success": True, "data": strategy_engine.market_bus.get_stats()}
+
 # 添加获取资产数据的API端点 (别名)
 @app.get("/api/assets")
 async def get_assets():
@@ -186,13 +427,30 @@ class StrategyConfig(BaseModel):
     parameters: Dict = {}
     enabled: bool = False
 
+def on_account_update(channel, feed):
+    """私有频道推送回调：更新全局缓存"""
+    if channel in ("account", "snapshot"):
+        cache["account"] = feed.account
+    if channel in ("positions", "snapshot"):
+        cache["positions"] = feed.positions
+    cache["last_update"] = int(feed.last_update * 1000)
+
 async def update_data_periodically():
-    """后台任务：定期更新数据"""
+    """后台任务：定期更新数据，私有频道推送可用时不再轮询"""
     while True:
         try:
-            # 获取账户数据
-            account_data = okx_client.get_account_balance()
-            positions_data = okx_client.get_positions()
+            if account_feed is not None and account_feed.connection.is_connected:
+                if not account_feed.is_ready():
+                    # 已连接但快照缺失（启动或重连时获取失败），重新获取
+                    await account_feed.refresh_snapshot()
+                await asyncio.sleep(UPDATE_INTERVAL)
+                continue
+            
+            # 并发获取账户数据和持仓数据
+            account_data, positions_data = await asyncio.gather(
+                async_okx_client.get_account_balance(),
+                async_okx_client.get_positions()
+            )
             
             # 更新缓存
             cache["account"] = account_data.get("data", {})
@@ -263,21 +521,8 @@ async def get_positions():
 # 策略相关API
 @app.get("/api/strategies")
 async def get_strategies():
-    """获取所有策略"""
-    strategies_list = []
-    for strategy_id, strategy_info in strategy_engine.strategies.items():
-        strategy = strategy_info["instance"]
-        strategies_list.append({
-            "id": strategy_id,
-            "type": strategy.__class__.__name__,
-            "name": strategy.name,
-            "description": strategy.description,
-            "parameters": strategy.parameters,
-            "enabled": strategy_info["enabled"],
-            "last_run": strategy_info["last_run"],
-            "stats": strategy_info["stats"]
-        })
-    return {"success": True, "data": strategies_list}
+    """获取所有策略，分片模式下的运行统计已由各分片汇总"""
+    return {"success": True, "data": strategy_engine.get_all_strategies()}
 
 # 添加获取可用策略类型的API端点
 @app.get("/api/strategy-types")
@@ -347,6 +592,7 @@ async def delete_strategy(strategy_id: str):
         strategy_engine.disable_strategy(strategy_id)
         # 删除策略
         del strategy_engine.strategies[strategy_id]
+        strategy_engine.executor.discard(strategy_id)
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
@@ -0,0 +1,89 @@
+from typing import Optional, Dict, Any, List, Set, Tuple, Hashable
+
+# 策略使用的合并市场数据（行情 + K线 + 订单簿），格式与 StrategyEngine.get_market_data 一致
+MARKET_CHANNEL = "market"
+
+
+class MarketDataBus:
+    """
+    按 (symbol, channel) 分发市场数据的发布/订阅总线
+
+    - 订阅者（通常是策略ID）订阅 (symbol, channel)，总线维护 key -> 订阅者 的索引和反向索引
+    - 每个 key 的数据只获取或接收一次，publish 保存最新值并递增版本号
+    - 消费方用 updates_since(version) 取出上次之后有更新的 key，再通过 subscribers() 分发，
+      每轮的开销与有更新的交易对数量成正比，与订阅者数量无关
+    """
+
+    def __init__(self):
+        self._subscribers: Dict[Tuple[str, str], Set[Hashable]] = {}
+        self._subscriptions: Dict[Hashable, Set[Tuple[str, str]]] = {}
+        self._latest: Dict[Tuple[str, str], Any] = {}
+        self._versions: Dict[Tuple[str, str], int] = {}
+        self.version = 0
+        self.stats = {"publishes": 0, "dropped": 0}
+
+    def subscribe(self, subscriber: Hashable, symbol: str, channel: str = MARKET_CHANNEL):
+        key = (symbol, channel)
+        self._subscribers.setdefault(key, set()).add(subscriber)
+        self._subscriptions.setdefault(subscriber, set()).add(key)
+
+    def unsubscribe(self, subscriber: Hashable, symbol: Optional[str] = None, channel: Optional[str] = None):
+        """取消订阅，symbol/channel 为空时取消该订阅者的全部订阅；没有订阅者的 key 同时清除缓存数据"""
+        keys = self._subscriptions.get(subscriber, set())
+        for key in [k for k in keys if (symbol is None or k[0] == symbol) and (channel is None or k[1] == channel)]:
+            keys.discard(key)
+            subscribers = self._subscribers.get(key)
+            if subscribers is not None:
+                subscribers.discard(subscriber)
+                if not subscribers:
+                    del self._subscribers[key]
+                    self._latest.pop(key, None)
+                    self._versions.pop(key, None)
+        if not keys:
+            self._subscriptions.pop(subscriber, None)
+
+    def subscribers(self, symbol: str, channel: str = MARKET_CHANNEL) -> Set[Hashable]:
+        return self._subscribers.get((symbol, channel), set())
+
+    def subscriptions(self, subscriber: Hashable) -> Set[Tuple[str, str]]:
+        return self._subscriptions.get(subscriber, set())
+
+    def symbols(self, channel: str = MARKET_CHANNEL) -> Set[str]:
+        """有订阅者的交易对"""
+        return {symbol for symbol, key_channel in self._subscribers if key_channel == channel}
+
+    def publish(self, symbol: str, channel: str, data: Any) -> bool:
+        """发布最新数据，没有订阅者时丢弃并返回 False"""
+        key = (symbol, channel)
+        if key not in self._subscribers:
+            self.stats["dropped"] += 1
+            return False
+        self.version += 1
+        self._latest[key] = data
+        self._versions[key] = self.version
+        self.stats["publishes"] += 1
+        return True
+
+    def get(self, symbol: str, channel: str = MARKET_CHANNEL) -> Optional[Any]:
+        return self._latest.get((symbol, channel))
+
+    def latest(self, channel: str = MARKET_CHANNEL) -> Dict[str, Any]:
+        """某频道全部交易对的最新数据 {symbol: data}"""
+        return {symbol: data for (symbol, key_channel), data in self._latest.items() if key_channel == channel}
+
+    def updates_since(self, version: int, channel: Optional[str] = None) -> List[Tuple[str, str, Any]]:
+        """返回版本号大于 version 的 [(symbol, channel, data)]，调用方记录 self.version 作为下次的起点"""
+        return [
+            (symbol, key_channel, self._latest[(symbol, key_channel)])
+            for (symbol, key_channel), key_version in self._versions.items()
+            if key_version > version and (channel is None or key_channel == channel)
+        ]
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "keys": len(self._subscribers),
+            "subscribers": len(self._subscriptions),
+            "subscriptions": sum(len(keys) for keys in self._subscriptions.values()),
+            "version": self.version,
+            **self.stats
+        }
@@ -0,0 +1,276 @@
+import math
+import threading
+import time
+from typing import Optional, Dict, Any, List, Tuple, Callable, Iterable
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# 导出为 Prometheus histogram 时使用的桶边界（秒）
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05,
+                   0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# 对数线性分桶：每个2的幂区间分为 2^_SUB_BUCKET_BITS 个子桶，相对误差不超过 1/32
+_SUB_BUCKET_BITS = 5
+_SUB_BUCKETS = 1 << _SUB_BUCKET_BITS
+_MAX_MICROS = (1 << 40) - 1
+
+
+def _bucket_index(micros: int) -> int:
+    """微秒值所在的桶，小于 2*_SUB_BUCKETS 的值每个值一个桶"""
+    if micros < 2 * _SUB_BUCKETS:
+        return micros
+    shift = micros.bit_length() - _SUB_BUCKET_BITS - 1
+    return (shift + 1) * _SUB_BUCKETS + (micros >> shift) - _SUB_BUCKETS
+
+
+def _bucket_upper(index: int) -> int:
+    """桶内最大的微秒值"""
+    if index < 2 * _SUB_BUCKETS:
+        return index
+    shift = index // _SUB_BUCKETS - 1
+    mantissa = index % _SUB_BUCKETS + _SUB_BUCKETS
+    return ((mantissa + 1) << shift) - 1
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n")
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return "+Inf"
+    if isinstance(value, float) and value.is_integer() and abs(value) < 1e15:
+        return str(int(value))
+    return repr(value)
+
+
+class LatencyHistogram:
+    """
+    HDR 风格的延迟直方图
+
+    按微秒记录，对数线性分桶（相对误差约3%），计数存放在稀疏字典中，
+    observe 只做一次位运算和一次字典更新，可以常开。分位数取桶上界。
+    """
+
+    __slots__ = ("_counts", "count", "sum", "max", "_lock")
+
+    def __init__(self):
+        self._counts: Dict[int, int] = {}
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds: float):
+        micros = int(seconds * 1e6)
+        if micros < 2 * _SUB_BUCKETS:
+            index = micros if micros > 0 else 0
+        else:
+            if micros > _MAX_MICROS:
+                micros = _MAX_MICROS
+            # 与 _bucket_index 相同，热路径上内联以省去一次函数调用
+            shift = micros.bit_length() - _SUB_BUCKET_BITS - 1
+            index = (shift + 1) * _SUB_BUCKETS + (micros >> shift) - _SUB_BUCKETS
+        with self._lock:
+            self._counts[index] = self._counts.get(index, 0) + 1
+            self.count += 1
+            self.sum += seconds
+            if seconds > self.max:
+                self.max = seconds
+
+    def _sorted_counts(self) -> List[Tuple[int, int]]:
+        with self._lock:
+            return sorted(self._counts.items())
+
+    def percentile(self, q: float) -> float:
+        """返回分位数（秒），q 取 0~100"""
+        counts = self._sorted_counts()
+        total = sum(n for _, n in counts)
+        if total == 0:
+            return 0.0
+        target = max(1, math.ceil(total * q / 100))
+        seen = 0
+        for index, n in counts:
+            seen += n
+            if seen >= target:
+                return min(_bucket_upper(index) / 1e6, self.max)
+        return self.max
+
+    def cumulative(self, bounds: Iterable[float]) -> List[Tuple[float, int]]:
+        """按给定边界（秒）返回累计计数，桶上界不超过边界的计数计入该边界"""
+        counts = self._sorted_counts()
+        result = []
+        position, seen = 0, 0
+        for bound in bounds:
+            limit = bound * 1e6
+            while position < len(counts) and _bucket_upper(counts[position][0]) <= limit:
+                seen += counts[position][1]
+                position += 1
+            result.append((bound, seen))
+        return result
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            "count": self.count,
+            "mean": round(self.sum / self.count, 6) if self.count else 0,
+            "p50": round(self.percentile(50), 6),
+            "p90": round(self.percentile(90), 6),
+            "p99": round(self.percentile(99), 6),
+            "p999": round(self.percentile(99.9), 6),
+            "max": round(self.max, 6)
+        }
+
+
+class Counter:
+    __slots__ = ("value", "_lock")
+
+    def __init__(self):
+        self.value = 0.0
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1):
+        with self._lock:
+            self.value += amount
+
+
+class Gauge:
+    __slots__ = ("value", "_function")
+
+    def __init__(self):
+        self.value = 0.0
+        self._function: Optional[Callable[[], float]] = None
+
+    def set(self, value: float):
+        self.value = value
+
+    def set_function(self, function: Callable[[], float]):
+        """采集时调用 function 取值"""
+        self._function = function
+
+    def get(self) -> float:
+        return self._function() if self._function is not None else self.value
+
+
+class MetricFamily:
+    """同名指标按标签值区分的一组子指标，labels() 返回（并缓存）对应的子指标"""
+
+    _TYPES = {"histogram": LatencyHistogram, "counter": Counter, "gauge": Gauge}
+
+    def __init__(self, name: str, help_text: str, metric_type: str, labelnames: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.type = metric_type
+        self.labelnames = tuple(labelnames)
+        self.buckets = buckets
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, *values):
+        child = self._children.get(values)
+        if child is None:
+            if len(values) != len(self.labelnames):
+                raise ValueError(f"指标 {self.name} 需要标签 {self.labelnames}")
+            with self._lock:
+                child = self._children.setdefault(values, self._TYPES[self.type]())
+        return child
+
+    def remove(self, *values):
+        """删除某组标签的子指标，例如策略被删除时"""
+        with self._lock:
+            self._children.pop(values, None)
+
+    def children(self) -> List[Tuple[Dict[str, str], Any]]:
+        with self._lock:
+            items = list(self._children.items())
+        return [(dict(zip(self.labelnames, values)), child) for values, child in items]
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.type}"]
+        for labels, child in self.children():
+            if self.type == "histogram":
+                for bound, count in child.cumulative(self.buckets):
+                    lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=_format_value(bound)))} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le='+Inf'))} {child.count}")
+                lines.append(f"{self.name}_sum{_format_labels(labels)} {_format_value(child.sum)}")
+                lines.append(f"{self.name}_count{_format_labels(labels)} {child.count}")
+            elif self.type == "counter":
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.value)}")
+            else:
+                lines.append(f"{self.name}{_format_labels(labels)} {_format_value(child.get())}")
+        return lines
+
+
+# 采集器返回 [(指标名, 类型, 说明, [(标签, 值)])]，用于导出已有的统计字典
+Collector = Callable[[], Iterable[Tuple[str, str, str, List[Tuple[Dict[str, str], float]]]]]
+
+
+class MetricsRegistry:
+    """
+    进程内指标注册表，可在客户端、策略引擎之间共享
+
+    - histogram/counter/gauge 按名称注册，同名重复注册返回已有的指标族
+    - register_collector 注册采集时调用的函数，把已有的统计字典转换为指标，热路径无额外开销
+    - render() 输出 Prometheus 文本格式，summary() 输出各延迟直方图的分位数
+    """
+
+    def __init__(self):
+        self._families: Dict[str, MetricFamily] = {}
+        self._collectors: List[Collector] = []
+        self._lock = threading.Lock()
+        self.created_at = time.time()
+
+    def _register(self, name: str, help_text: str, metric_type: str, labelnames, **kwargs) -> MetricFamily:
+        with self._lock:
+            family = self._families.get(name)
+            if family is None:
+                family = MetricFamily(name, help_text, metric_type, tuple(labelnames), **kwargs)
+                self._families[name] = family
+            elif family.type != metric_type or family.labelnames != tuple(labelnames):
+                raise ValueError(f"指标 {name} 已以不同的类型或标签注册")
+            return family
+
+    def histogram(self, name: str, help_text: str, labelnames=(), buckets=DEFAULT_BUCKETS) -> MetricFamily:
+        return self._register(name, help_text, "histogram", labelnames, buckets=buckets)
+
+    def counter(self, name: str, help_text: str, labelnames=()) -> MetricFamily:
+        return self._register(name, help_text, "counter", labelnames)
+
+    def gauge(self, name: str, help_text: str, labelnames=()) -> MetricFamily:
+        return self._register(name, help_text, "gauge", labelnames)
+
+    def register_collector(self, collector: Collector):
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        """Prometheus 文本格式（0.0.4）"""
+        with self._lock:
+            families = list(self._families.values())
+        lines = []
+        for family in families:
+            lines.extend(family.render())
+        for collector in self._collectors:
+            try:
+                for name, metric_type, help_text, samples in collector():
+                    lines.append(f"# HELP {name} {help_text}")
+                    lines.append(f"# TYPE {name} {metric_type}")
+                    for labels, value in samples:
+                        lines.append(f"{name}{_format_labels(labels)} {_format_value(float(value))}")
+            except Exception as e:
+                lines.append(f"# 采集器出错: {_escape(e)}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self) -> Dict[str, Any]:
+        """各延迟直方图的计数、均值和分位数（秒）"""
+        with self._lock:
+            families = [family for family in self._families.values() if family.type == "histogram"]
+        return {
+            family.name: [dict(labels=labels, **child.summary()) for labels, child in family.children()]
+            for family in families
+        }
@@ -0,0 +1,880 @@
+"""
+本地OKX模拟交易所（REST + WebSocket），用于离线压测和联调，不连接真实交易所
+
+用法:
+    python mock_okx_server.py --rest-port 8780 --ws-port 8765 --latency-ms 20 --jitter-ms 10 --error-rate 0.01
+    OKX_BASE_URL=http://127.0.0.1:8780 \\
+    OKX_WS_PUBLIC_URL=ws://127.0.0.1:8765/ws/v5/public \\
+    OKX_WS_BUSINESS_URL=ws://127.0.0.1:8765/ws/v5/business \\
+    OKX_WS_PRIVATE_URL=ws://127.0.0.1:8765/ws/v5/private python main.py
+
+REST 接口（不校验签名）:
+    /market/ticker、/market/tickers、/market/candles、/market/history-candles、/market/books、
+    /public/instruments、/account/balance、/account/positions、
+    /trade/order（GET 查询、POST 下单）、/trade/batch-orders、/trade/cancel-order、/trade/cancel-batch-orders、
+    /trade/orders-pending
+    /mock/stats 查看统计，POST /mock/faults 在运行中调整延迟和故障注入参数
+
+WebSocket 支持 subscribe/unsubscribe、login、ping/pong，tickers、candle{bar}、books、books5 频道，
+私有频道 account/positions/orders 在模拟账户成交、撤单时推送，也可调用 push() 推送任意数据。
+
+行情按产品和时间确定性地生成，同一时刻的 REST 和 WebSocket 价格一致，重复请求同一段K线结果相同；
+指定 --archive-dir 时K线改为回放 CandleArchive 中录制的数据。
+"""
+import argparse
+import asyncio
+import collections
+import itertools
+import json
+import logging
+import math
+import random
+import time
+import zlib
+from typing import Optional, Dict, Any, List, Set, Tuple, Callable
+
+import websockets
+from aiohttp import web
+
+from bar_utils import bar_open_time, bar_to_ms
+from candle_archive import CandleArchive
+from order_book import OrderBook
+from ticker_table import inst_type_of
+
+logger = logging.getLogger("MockOKXServer")
+
+DEFAULT_SYMBOLS = [
+    "BTC-USDT-SWAP", "ETH-USDT-SWAP", "SOL-USDT-SWAP", "XRP-USDT-SWAP", "DOGE-USDT-SWAP",
+    "BTC-USDT", "ETH-USDT", "SOL-USDT",
+]
+
+# 常见币种的参考价格，其余币种按产品ID生成
+_BASE_PRICES = {"BTC": 60000.0, "ETH": 3000.0, "SOL": 150.0, "XRP": 0.6, "DOGE": 0.15, "OKB": 50.0}
+
+INITIAL_BALANCE = 100000.0
+
+PUBLIC_CHANNELS = ("tickers", "books", "books5")
+PRIVATE_CHANNELS = ("account", "positions", "orders")
+
+
+def _hash_unit(seed: int, n: int) -> float:
+    """由 (seed, n) 确定的 [-0.5, 0.5) 伪随机数"""
+    x = (n * 2654435761 + seed * 40503) & 0xFFFFFFFF
+    x ^= x >> 16
+    x = (x * 0x45D9F3B) & 0xFFFFFFFF
+    x ^= x >> 16
+    return x / 4294967296.0 - 0.5
+
+
+def _ok(data: list) -> Dict[str, Any]:
+    return {"code": "0", "msg": "", "data": data}
+
+
+def _error(code: str, msg: str) -> Dict[str, Any]:
+    return {"code": code, "msg": msg, "data": []}
+
+
+class MockFaults:
+    """
+    延迟和故障注入参数
+
+    - latency_ms / jitter_ms: REST 响应前等待 latency_ms ± jitter_ms 毫秒
+    - error_rate: 按概率返回 HTTP 503
+    - rate_limit_rate: 按概率返回 HTTP 429（OKX 错误码 50011）
+    - ws_drop_rate: WebSocket 每次推送周期断开全部连接的概率
+    """
+
+    FIELDS = ("latency_ms", "jitter_ms", "error_rate", "rate_limit_rate", "ws_drop_rate")
+
+    def __init__(self, latency_ms: float = 0, jitter_ms: float = 0, error_rate: float = 0,
+                 rate_limit_rate: float = 0, ws_drop_rate: float = 0, seed: Optional[int] = None):
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.error_rate = error_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.ws_drop_rate = ws_drop_rate
+        self._random = random.Random(seed)
+
+    def update(self, **kwargs):
+        for name, value in kwargs.items():
+            if name not in self.FIELDS:
+                raise ValueError(f"未知的故障参数: {name}")
+            setattr(self, name, float(value))
+
+    def to_dict(self) -> Dict[str, float]:
+        return {name: getattr(self, name) for name in self.FIELDS}
+
+    async def delay(self):
+        if self.latency_ms <= 0 and self.jitter_ms <= 0:
+            return
+        delay_ms = max(0.0, self.latency_ms + self._random.uniform(-self.jitter_ms, self.jitter_ms))
+        await asyncio.sleep(delay_ms / 1000)
+
+    def rest_fault(self) -> Optional[int]:
+        """返回要注入的HTTP状态码，不注入时返回 None"""
+        roll = self._random.random()
+        if roll < self.rate_limit_rate:
+            return 429
+        if roll < self.rate_limit_rate + self.error_rate:
+            return 503
+        return None
+
+    def should_drop_ws(self) -> bool:
+        return self.ws_drop_rate > 0 and self._random.random() < self.ws_drop_rate
+
+
+class MockMarket:
+    """
+    模拟交易所的行情和账户状态，由 REST 和 WebSocket 服务共享
+
+    价格是产品和时间的确定性函数：日内、小时、5分钟三个周期的正弦波叠加每秒的哈希噪声。
+    账户为单币种（USDT）净持仓模式，合约面值按1处理；市价单立即成交，限价单在价格穿越时成交。
+    """
+
+    def __init__(self, symbols: Optional[List[str]] = None, archive: Optional[CandleArchive] = None):
+        self.symbols = list(symbols or DEFAULT_SYMBOLS)
+        self.archive = archive
+        self.cash = INITIAL_BALANCE
+        self.positions: Dict[str, Dict[str, Any]] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.finished_orders = collections.OrderedDict()  # 最近完成的订单，供订单查询
+        self._ord_ids = itertools.count(int(time.time() * 1000) * 1000)
+        self._books: Dict[str, OrderBook] = {}
+        self._seq_id = 0
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        self.stats = {"orders": 0, "fills": 0, "cancels": 0, "rejects": 0}
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        """注册私有数据变化回调 callback(channel, data)，channel 为 orders/positions/account"""
+        self._listeners.append(callback)
+
+    def _emit(self, channel: str, data: Dict[str, Any]):
+        for callback in self._listeners:
+            try:
+                callback(channel, data)
+            except Exception as e:
+                logger.error(f"模拟账户推送回调出错: {e}")
+
+    # ---------- 行情 ----------
+
+    @staticmethod
+    def _params(inst_id: str) -> Tuple[float, int, int]:
+        """返回 (参考价格, 随机种子, 价格小数位数)"""
+        seed = zlib.crc32(inst_id.encode())
+        base = _BASE_PRICES.get(inst_id.split("-")[0])
+        if base is None:
+            base = 10 ** (1 + (seed % 300) / 100)
+        decimals = 1 if base >= 1000 else 2 if base >= 10 else 4 if base >= 0.1 else 6
+        return base, seed, decimals
+
+    def tick_size(self, inst_id: str) -> float:
+        return 10 ** -self._params(inst_id)[2]
+
+    def format_price(self, inst_id: str, price: float) -> str:
+        return f"{price:.{self._params(inst_id)[2]}f}"
+
+    def price_at(self, inst_id: str, ts_ms: float) -> float:
+        base, seed, _ = self._params(inst_id)
+        t = ts_ms / 1000
+        phase = (seed % 1000) / 1000 * 2 * math.pi
+        drift = (0.03 * math.sin(2 * math.pi * t / 86400 + phase)
+                 + 0.01 * math.sin(2 * math.pi * t / 3600 + 2 * phase)
+                 + 0.003 * math.sin(2 * math.pi * t / 300 + 3 * phase))
+        return base * (1 + drift + 0.0008 * _hash_unit(seed, int(t)))
+
+    def price(self, inst_id: str) -> float:
+        return self.price_at(inst_id, time.time() * 1000)
+
+    def instruments(self, inst_type: str) -> List[Dict[str, Any]]:
+        result = []
+        for inst_id in self.symbols:
+            if inst_type_of(inst_id) != inst_type:
+                continue
+            base_ccy, quote_ccy = inst_id.split("-")[:2]
+            tick = self.format_price(inst_id, self.tick_size(inst_id))
+            instrument = {
+                "instType": inst_type, "instId": inst_id, "uly": f"{base_ccy}-{quote_ccy}",
+                "instFamily": f"{base_ccy}-{quote_ccy}", "baseCcy": base_ccy if inst_type == "SPOT" else "",
+                "quoteCcy": quote_ccy if inst_type == "SPOT" else "", "settleCcy": quote_ccy if inst_type != "SPOT" else "",
+                "ctVal": "1" if inst_type != "SPOT" else "", "ctValCcy": base_ccy if inst_type != "SPOT" else "",
+                "ctType": "linear" if inst_type != "SPOT" else "", "tickSz": tick, "lotSz": "1", "minSz": "1",
+                "lever": "100" if inst_type != "SPOT" else "", "state": "live", "listTime": "1600000000000"
+            }
+            result.append(instrument)
+        return result
+
+    def ticker(self, inst_id: str) -> Dict[str, Any]:
+        now = time.time() * 1000
+        last = self.price_at(inst_id, now)
+        tick = self.tick_size(inst_id)
+        hourly = [self.price_at(inst_id, now - i * 3600000) for i in range(25)]
+        vol = 1000 * (1.5 + _hash_unit(self._params(inst_id)[1], int(now // 60000)))
+        fmt = self.format_price
+        return {
+            "instType": inst_type_of(inst_id), "instId": inst_id, "last": fmt(inst_id, last), "lastSz": "1",
+            "askPx": fmt(inst_id, last + tick), "askSz": "10", "bidPx": fmt(inst_id, last - tick), "bidSz": "10",
+            "open24h": fmt(inst_id, hourly[-1]), "high24h": fmt(inst_id, max(hourly)),
+            "low24h": fmt(inst_id, min(hourly)), "sodUtc0": fmt(inst_id, hourly[-1]), "sodUtc8": fmt(inst_id, hourly[-1]),
+            "vol24h": f"{vol:.0f}", "volCcy24h": f"{vol * last:.2f}", "ts": str(int(now))
+        }
+
+    def candle(self, inst_id: str, bar: str, ts: int, now: Optional[float] = None) -> list:
+        """生成开盘时间为 ts 的一根K线，now 之后的部分不生成（当前未收盘的K线）"""
+        now = time.time() * 1000 if now is None else now
+        bar_ms = bar_to_ms(bar)
+        end = min(ts + bar_ms, now)
+        samples = max(2, min(30, bar_ms // 1000))
+        step = bar_ms / samples
+        prices = [self.price_at(inst_id, ts + i * step) for i in range(samples) if ts + i * step <= end]
+        prices.append(self.price_at(inst_id, end - 1 if end == ts + bar_ms else end))
+        seed = self._params(inst_id)[1]
+        volume = bar_ms / 60000 * 10 * (1.5 + _hash_unit(seed ^ 0x5F3759DF, ts // 1000))
+        volume *= (end - ts) / bar_ms
+        close = prices[-1]
+        fmt = self.format_price
+        return [str(ts), fmt(inst_id, prices[0]), fmt(inst_id, max(prices)), fmt(inst_id, min(prices)),
+                fmt(inst_id, close), f"{volume:.2f}", f"{volume * close:.2f}", f"{volume * close:.2f}",
+                "1" if ts + bar_ms <= now else "0"]
+
+    def candles(self, inst_id: str, bar: str, limit: int = 100, after: Optional[int] = None,
+                before: Optional[int] = None, confirmed_only: bool = False) -> List[list]:
+        """
+        返回K线，最新的在前，与 /market/candles 一致：
+        after 为返回早于该时间戳的K线，before 为返回晚于该时间戳的K线
+        """
+        if self.archive is not None and self.archive.exists(inst_id, bar):
+            return self._archived_candles(inst_id, bar, limit, after, before)
+        now = time.time() * 1000
+        bar_ms = bar_to_ms(bar)
+        latest = after - 1 if after else now
+        ts = int(bar_open_time(bar, latest / 1000) * 1000)
+        if confirmed_only and ts + bar_ms > now:
+            ts -= bar_ms
+        rows = []
+        while len(rows) < limit and (before is None or ts > before):
+            rows.append(self.candle(inst_id, bar, ts, now))
+            ts -= bar_ms
+        return rows
+
+    def _archived_candles(self, inst_id: str, bar: str, limit: int, after: Optional[int],
+                          before: Optional[int]) -> List[list]:
+        columns = self.archive.open(inst_id, bar)
+        selected = columns.slice_time(before + 1 if before is not None else None, after)
+        rows = []
+        for i in range(len(selected) - 1, max(-1, len(selected) - 1 - limit), -1):
+            candle = selected[i]
+            rows.append([str(candle["timestamp"]), str(candle["open"]), str(candle["high"]), str(candle["low"]),
+                         str(candle["close"]), str(candle["volume"]), str(candle["volume_currency"]),
+                         str(candle["volume_currency"]), "1"])
+        return rows
+
+    # ---------- 订单簿 ----------
+
+    def book(self, inst_id: str) -> OrderBook:
+        book = self._books.get(inst_id)
+        if book is None:
+            price = self.price(inst_id)
+            tick = self.tick_size(inst_id)
+            fmt = self.format_price
+            book = OrderBook(inst_id)
+            book.apply_snapshot({
+                "bids": [[fmt(inst_id, price - tick * (i + 1)), str(random.randint(1, 100)), "0", "1"] for i in range(50)],
+                "asks": [[fmt(inst_id, price + tick * (i + 1)), str(random.randint(1, 100)), "0", "1"] for i in range(50)],
+                "seqId": self._seq_id
+            })
+            self._books[inst_id] = book
+        return book
+
+    @staticmethod
+    def book_levels(book: OrderBook, levels: int = 400) -> Dict[str, list]:
+        return {
+            "bids": [[price, size, "0", "1"] for price, size in book.bids.levels[:levels]],
+            "asks": [[price, size, "0", "1"] for price, size in book.asks.levels[:levels]]
+        }
+
+    def book_snapshot(self, inst_id: str, levels: int = 400) -> Dict[str, Any]:
+        book = self.book(inst_id)
+        return {
+            **self.book_levels(book, levels), "ts": str(int(time.time() * 1000)),
+            "checksum": book.checksum(), "prevSeqId": -1, "seqId": book.seq_id
+        }
+
+    def book_update(self, inst_id: str) -> Dict[str, Any]:
+        """订单簿跟随当前价格移动，并随机修改最优价附近的几档，返回增量"""
+        book = self.book(inst_id)
+        price = self.price(inst_id)
+        tick = self.tick_size(inst_id)
+        fmt = self.format_price
+        changes = {"bids": [], "asks": []}
+
+        def update(side_name, side, px, size):
+            side.update(px, size)
+            changes[side_name].append([px, size, "0", "1"])
+
+        # 删除与当前价格交叉的档位，补齐最优价附近的档位
+        for side_name, side, sign in (("bids", book.bids, -1), ("asks", book.asks, 1)):
+            for px, _ in [level for level in side.levels if sign * (float(level[0]) - price) <= 0]:
+                update(side_name, side, px, "0")
+            existing = {float(level[0]) for level in side.levels}
+            for i in range(10):
+                px = fmt(inst_id, price + sign * tick * (i + 1))
+                if float(px) not in existing:
+                    update(side_name, side, px, str(random.randint(1, 100)))
+            for px, _ in side.levels[60:]:
+                update(side_name, side, px, "0")
+            for _ in range(random.randint(1, 3)):
+                px = random.choice(side.levels[:10])[0]
+                update(side_name, side, px, str(random.randint(1, 100)))
+        prev_seq_id = book.seq_id
+        self._seq_id += 1
+        book.seq_id = self._seq_id
+        return {
+            **changes, "ts": str(int(time.time() * 1000)),
+            "checksum": book.checksum(), "prevSeqId": prev_seq_id, "seqId": book.seq_id
+        }
+
+    # ---------- 账户 ----------
+
+    def _position_data(self, inst_id: str) -> Dict[str, Any]:
+        position = self.positions[inst_id]
+        last = self.price(inst_id)
+        upl = (last - position["avgPx"]) * position["pos"] if position["pos"] else 0.0
+        return {
+            "instType": inst_type_of(inst_id), "instId": inst_id, "posId": position["posId"], "posSide": "net",
+            "pos": f"{position['pos']:g}", "avgPx": self.format_price(inst_id, position["avgPx"]) if position["pos"] else "",
+            "last": self.format_price(inst_id, last), "markPx": self.format_price(inst_id, last),
+            "upl": f"{upl:.4f}", "mgnMode": position["mgnMode"], "lever": "10", "ccy": "USDT",
+            "cTime": position["cTime"], "uTime": position["uTime"]
+        }
+
+    def balance(self) -> Dict[str, Any]:
+        upl = sum((self.price(inst_id) - p["avgPx"]) * p["pos"] for inst_id, p in self.positions.items() if p["pos"])
+        eq = self.cash + upl
+        now = str(int(time.time() * 1000))
+        return {
+            "totalEq": f"{eq:.4f}", "adjEq": f"{eq:.4f}", "uTime": now,
+            "details": [{
+                "ccy": "USDT", "eq": f"{eq:.4f}", "cashBal": f"{self.cash:.4f}", "availBal": f"{self.cash:.4f}",
+                "availEq": f"{eq:.4f}", "upl": f"{upl:.4f}", "frozenBal": "0", "eqUsd": f"{eq:.4f}", "uTime": now
+            }]
+        }
+
+    def get_positions(self, inst_type: Optional[str] = None, inst_id: Optional[str] = None) -> List[Dict[str, Any]]:
+        return [
+            self._position_data(symbol) for symbol, position in self.positions.items()
+            if position["pos"] and (not inst_type or inst_type_of(symbol) == inst_type)
+            and (not inst_id or symbol == inst_id)
+        ]
+
+    def pending_orders(self, inst_type: Optional[str] = None, inst_id: Optional[str] = None,
+                       after: Optional[str] = None, limit: int = 100) -> List[Dict[str, Any]]:
+        """未成交订单，ordId 从大到小，after 为返回 ordId 小于该值的订单"""
+        orders = [
+            order for order in self.orders.values()
+            if order["state"] == "live" and (not inst_type or order["instType"] == inst_type)
+            and (not inst_id or order["instId"] == inst_id) and (not after or int(order["ordId"]) < int(after))
+        ]
+        orders.sort(key=lambda order: int(order["ordId"]), reverse=True)
+        return orders[:limit]
+
+    def get_order(self, inst_id: str, ord_id: Optional[str] = None,
+                  cl_ord_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """按 ordId 或 clOrdId 查询挂单或最近完成的订单"""
+        if ord_id:
+            order = self.orders.get(ord_id) or self.finished_orders.get(ord_id)
+        else:
+            order = next((o for orders in (self.orders, self.finished_orders) for o in orders.values()
+                          if cl_ord_id and o["clOrdId"] == cl_ord_id), None)
+        return order if order is not None and order["instId"] == inst_id else None
+
+    def _reject(self, request: Dict[str, Any], code: str, msg: str) -> Dict[str, Any]:
+        self.stats["rejects"] += 1
+        return {"ordId": "", "clOrdId": request.get("clOrdId", ""), "tag": request.get("tag", ""),
+                "sCode": code, "sMsg": msg}
+
+    def place_order(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """下单，返回 /trade/order 的单个结果"""
+        inst_id = request.get("instId", "")
+        side = request.get("side")
+        ord_type = request.get("ordType", "")
+        if inst_id not in self.symbols:
+            return self._reject(request, "51001", "Instrument ID does not exist")
+        if side not in ("buy", "sell"):
+            return self._reject(request, "51000", "Parameter side error")
+        if ord_type not in ("market", "limit", "post_only", "fok", "ioc"):
+            return self._reject(request, "51000", "Parameter ordType error")
+        try:
+            size = float(request.get("sz", 0))
+            px = float(request["px"]) if ord_type != "market" else None
+        except (KeyError, TypeError, ValueError):
+            return self._reject(request, "51000", "Parameter px or sz error")
+        if size <= 0 or (px is not None and px <= 0):
+            return self._reject(request, "51000", "Parameter px or sz error")
+
+        self.stats["orders"] += 1
+        now = str(int(time.time() * 1000))
+        order = {
+            "instType": inst_type_of(inst_id), "instId": inst_id, "ordId": str(next(self._ord_ids)),
+            "clOrdId": request.get("clOrdId", ""), "tag": request.get("tag", ""), "px": request.get("px", ""),
+            "sz": request.get("sz"), "ordType": ord_type, "side": side, "posSide": "net",
+            "tdMode": request.get("tdMode", "cross"), "accFillSz": "0", "fillPx": "", "fillSz": "0",
+            "avgPx": "", "state": "live", "cTime": now, "uTime": now
+        }
+        self.orders[order["ordId"]] = order
+        result = {"ordId": order["ordId"], "clOrdId": order["clOrdId"], "tag": order["tag"], "sCode": "0",
+                  "sMsg": "Order placed"}
+
+        fill_px = self._crossing_price(order)
+        if fill_px is not None and ord_type != "post_only":
+            self._fill(order, fill_px)
+        elif ord_type in ("market", "fok", "ioc") or fill_px is not None:
+            # 立即成交类订单无法成交、只做maker订单会成交时直接撤销
+            self._finish(order, "canceled")
+        else:
+            self._emit("orders", dict(order))
+        return result
+
+    def _crossing_price(self, order: Dict[str, Any]) -> Optional[float]:
+        """订单可成交时返回成交价（对手价），否则返回 None"""
+        inst_id = order["instId"]
+        price = self.price(inst_id)
+        tick = self.tick_size(inst_id)
+        if order["side"] == "buy":
+            fill_px = price + tick
+            return fill_px if order["ordType"] == "market" or float(order["px"]) >= fill_px else None
+        fill_px = price - tick
+        return fill_px if order["ordType"] == "market" or float(order["px"]) <= fill_px else None
+
+    def _fill(self, order: Dict[str, Any], fill_px: float):
+        inst_id = order["instId"]
+        size = float(order["sz"])
+        signed = size if order["side"] == "buy" else -size
+        now = str(int(time.time() * 1000))
+        position = self.positions.setdefault(inst_id, {
+            "posId": str(zlib.crc32(inst_id.encode())), "pos": 0.0, "avgPx": 0.0, "mgnMode": order["tdMode"],
+            "cTime": now, "uTime": now
+        })
+        pos = position["pos"]
+        if pos == 0 or (pos > 0) == (signed > 0):
+            position["avgPx"] = (position["avgPx"] * abs(pos) + fill_px * size) / (abs(pos) + size)
+        else:
+            closed = min(abs(pos), size)
+            self.cash += (fill_px - position["avgPx"]) * closed * (1 if pos > 0 else -1)
+            if size > abs(pos):
+                position["avgPx"] = fill_px
+        position["pos"] = round(pos + signed, 10)
+        position["uTime"] = now
+        order.update({"accFillSz": order["sz"], "fillSz": order["sz"], "fillPx": self.format_price(inst_id, fill_px),
+                      "avgPx": self.format_price(inst_id, fill_px)})
+        self.stats["fills"] += 1
+        self._finish(order, "filled")
+        self._emit("positions", self._position_data(inst_id))
+        self._emit("account", self.balance())
+
+    def _finish(self, order: Dict[str, Any], state: str):
+        order["state"] = state
+        order["uTime"] = str(int(time.time() * 1000))
+        # 已完成的订单移出挂单，只在最近完成的订单中保留一段时间
+        self.orders.pop(order["ordId"], None)
+        self.finished_orders[order["ordId"]] = order
+        while len(self.finished_orders) > 1000:
+            self.finished_orders.popitem(last=False)
+        self._emit("orders", dict(order))
+
+    def cancel_order(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        """撤单，返回 /trade/cancel-order 的单个结果"""
+        ord_id = request.get("ordId")
+        cl_ord_id = request.get("clOrdId")
+        order = self.orders.get(ord_id) if ord_id else next(
+            (o for o in self.orders.values() if cl_ord_id and o["clOrdId"] == cl_ord_id), None)
+        if order is None or order["instId"] != request.get("instId"):
+            return {"ordId": ord_id or "", "clOrdId": cl_ord_id or "", "sCode": "51400",
+                    "sMsg": "Cancellation failed as the order has been filled, canceled or does not exist"}
+        self.stats["cancels"] += 1
+        self._finish(order, "canceled")
+        return {"ordId": order["ordId"], "clOrdId": order["clOrdId"], "sCode": "0", "sMsg": ""}
+
+    def match_orders(self):
+        """价格穿越限价时成交挂单"""
+        for order in list(self.orders.values()):
+            fill_px = self._crossing_price(order)
+            if fill_px is not None:
+                self._fill(order, float(order["px"]))
+
+
+class MockOKXRestServer:
+    """模拟OKX REST API，响应格式与 /api/v5 一致"""
+
+    def __init__(self, market: MockMarket, faults: Optional[MockFaults] = None,
+                 host: str = "127.0.0.1", port: int = 8780):
+        self.market = market
+        self.faults = faults or MockFaults()
+        self.host = host
+        self.port = port
+        self._runner: Optional[web.AppRunner] = None
+        self.stats = {"requests": 0, "injected_errors": 0, "injected_rate_limits": 0}
+        self.app = web.Application(middlewares=[self._fault_middleware])
+        self.app.add_routes([
+            web.get("/api/v5/market/ticker", self._ticker),
+            web.get("/api/v5/market/tickers", self._tickers),
+            web.get("/api/v5/market/candles", self._candles),
+            web.get("/api/v5/market/history-candles", self._history_candles),
+            web.get("/api/v5/market/books", self._books),
+            web.get("/api/v5/public/instruments", self._instruments),
+            web.get("/api/v5/account/balance", self._balance),
+            web.get("/api/v5/account/positions", self._positions),
+            web.get("/api/v5/trade/order", self._get_order),
+            web.post("/api/v5/trade/order", self._place_order),
+            web.post("/api/v5/trade/batch-orders", self._place_orders),
+            web.post("/api/v5/trade/cancel-order", self._cancel_order),
+            web.post("/api/v5/trade/cancel-batch-orders", self._cancel_orders),
+            web.get("/api/v5/trade/orders-pending", self._orders_pending),
+            web.get("/mock/stats", self._stats),
+            web.post("/mock/faults", self._update_faults),
+        ])
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._runner = web.AppRunner(self.app, access_log=None)
+        await self._runner.setup()
+        await web.TCPSite(self._runner, self.host, self.port).start()
+        logger.info(f"模拟REST服务器已启动: {self.url}")
+
+    async def stop(self):
+        if self._runner:
+            await self._runner.cleanup()
+
+    @web.middleware
+    async def _fault_middleware(self, request: web.Request, handler):
+        if request.path.startswith("/mock/"):
+            return await handler(request)
+        self.stats["requests"] += 1
+        await self.faults.delay()
+        status = self.faults.rest_fault()
+        if status == 429:
+            self.stats["injected_rate_limits"] += 1
+            return web.json_response(_error("50011", "Too Many Requests"), status=429)
+        if status is not None:
+            self.stats["injected_errors"] += 1
+            return web.json_response(_error("50001", "Service temporarily unavailable"), status=status)
+        return await handler(request)
+
+    @staticmethod
+    async def _json_body(request: web.Request):
+        text = await request.text()
+        return json.loads(text) if text else {}
+
+    def _require_symbol(self, request: web.Request) -> Optional[str]:
+        inst_id = request.query.get("instId", "")
+        return inst_id if inst_id in self.market.symbols else None
+
+    async def _ticker(self, request: web.Request):
+        inst_id = self._require_symbol(request)
+        if inst_id is None:
+            return web.json_response(_error("51001", "Instrument ID does not exist"))
+        return web.json_response(_ok([self.market.ticker(inst_id)]))
+
+    async def _tickers(self, request: web.Request):
+        inst_type = request.query.get("instType", "SWAP")
+        tickers = [self.market.ticker(inst_id) for inst_id in self.market.symbols if inst_type_of(inst_id) == inst_type]
+        return web.json_response(_ok(tickers))
+
+    async def _candles(self, request: web.Request, max_limit: int = 300, confirmed_only: bool = False):
+        inst_id = self._require_symbol(request)
+        if inst_id is None:
+            return web.json_response(_error("51001", "Instrument ID does not exist"))
+        query = request.query
+        try:
+            bar = query.get("bar", "1m")
+            bar_to_ms(bar)
+            limit = min(int(query.get("limit", 100)), max_limit)
+            after = int(query["after"]) if query.get("after") else None
+            before = int(query["before"]) if query.get("before") else None
+        except ValueError:
+            return web.json_response(_error("51000", "Parameter bar, limit, after or before error"))
+        rows = self.market.candles(inst_id, bar, limit, after, before, confirmed_only)
+        return web.json_response(_ok(rows))
+
+    async def _history_candles(self, request: web.Request):
+        return await self._candles(request, max_limit=100, confirmed_only=True)
+
+    async def _books(self, request: web.Request):
+        inst_id = self._require_symbol(request)
+        if inst_id is None:
+            return web.json_response(_error("51001", "Instrument ID does not exist"))
+        levels = min(int(request.query.get("sz", 1)), 400)
+        snapshot = self.market.book_snapshot(inst_id, levels)
+        return web.json_response(_ok([{"bids": snapshot["bids"], "asks": snapshot["asks"], "ts": snapshot["ts"]}]))
+
+    async def _instruments(self, request: web.Request):
+        return web.json_response(_ok(self.market.instruments(request.query.get("instType", "SWAP"))))
+
+    async def _balance(self, request: web.Request):
+        return web.json_response(_ok([self.market.balance()]))
+
+    async def _positions(self, request: web.Request):
+        self.market.match_orders()
+        query = request.query
+        return web.json_response(_ok(self.market.get_positions(query.get("instType"), query.get("instId"))))
+
+    @staticmethod
+    def _batch_response(results: List[Dict[str, Any]]):
+        """全部成功 code 为 0，全部失败为 1，部分失败为 2"""
+        failed = sum(1 for result in results if result["sCode"] != "0")
+        if failed == 0:
+            return web.json_response(_ok(results))
+        code = "1" if failed == len(results) else "2"
+        return web.json_response({"code": code, "msg": "", "data": results})
+
+    async def _get_order(self, request: web.Request):
+        self.market.match_orders()
+        query = request.query
+        order = self.market.get_order(query.get("instId", ""), query.get("ordId"), query.get("clOrdId"))
+        if order is None:
+            return web.json_response(_error("51603", "Order does not exist"))
+        return web.json_response(_ok([dict(order)]))
+
+    async def _place_order(self, request: web.Request):
+        return self._batch_response([self.market.place_order(await self._json_body(request))])
+
+    async def _place_orders(self, request: web.Request):
+        orders = await self._json_body(request)
+        if not isinstance(orders, list) or not 0 < len(orders) <= 20:
+            return web.json_response(_error("51000", "Parameter error: 1-20 orders per batch"))
+        return self._batch_response([self.market.place_order(order) for order in orders])
+
+    async def _cancel_order(self, request: web.Request):
+        return self._batch_response([self.market.cancel_order(await self._json_body(request))])
+
+    async def _cancel_orders(self, request: web.Request):
+        orders = await self._json_body(request)
+        if not isinstance(orders, list) or not 0 < len(orders) <= 20:
+            return web.json_response(_error("51000", "Parameter error: 1-20 orders per batch"))
+        return self._batch_response([self.market.cancel_order(order) for order in orders])
+
+    async def _orders_pending(self, request: web.Request):
+        self.market.match_orders()
+        query = request.query
+        orders = self.market.pending_orders(query.get("instType"), query.get("instId"), query.get("after"),
+                                            min(int(query.get("limit", 100)), 100))
+        return web.json_response(_ok(orders))
+
+    async def _stats(self, request: web.Request):
+        return web.json_response({"rest": self.stats, "market": self.market.stats, "faults": self.faults.to_dict()})
+
+    async def _update_faults(self, request: web.Request):
+        try:
+            self.faults.update(**(await self._json_body(request)))
+        except (TypeError, ValueError) as e:
+            return web.json_response({"error": str(e)}, status=400)
+        return web.json_response(self.faults.to_dict())
+
+
+class MockOKXWebSocketServer:
+    """模拟OKX WebSocket推送"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 8765, tick_interval: float = 0.2,
+                 market: Optional[MockMarket] = None, faults: Optional[MockFaults] = None):
+        self.host = host
+        self.port = port
+        self.tick_interval = tick_interval
+        self.market = market or MockMarket()
+        self.faults = faults or MockFaults()
+        self._server = None
+        self._task = None
+        self._clients: Dict[Any, Set[Tuple[str, str]]] = {}
+        self._candles: Dict[Tuple[str, str], list] = {}
+        self._private_tasks: Set[asyncio.Task] = set()
+        self.market.add_listener(self._on_private_update)
+        self.stats = {"connections": 0, "subscribes": 0, "pushes": 0, "injected_drops": 0}
+
+    @property
+    def url(self) -> str:
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self._task = asyncio.create_task(self._push_loop())
+        logger.info(f"模拟WebSocket服务器已启动: {self.url}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    async def drop_connections(self):
+        """断开所有客户端连接，用于测试重连"""
+        for ws in list(self._clients):
+            await ws.close()
+
+    async def _handler(self, ws, path=None):
+        self._clients[ws] = set()
+        self.stats["connections"] += 1
+        try:
+            async for raw in ws:
+                if raw == "ping":
+                    await ws.send("pong")
+                    continue
+                message = json.loads(raw)
+                op = message.get("op")
+                if op == "login":
+                    await ws.send(json.dumps({"event": "login", "code": "0", "msg": "", "connId": str(id(ws))}))
+                    continue
+                for arg in message.get("args", []):
+                    key = (arg.get("channel"), arg.get("instId") or arg.get("instType"))
+                    if op == "subscribe":
+                        self._clients[ws].add(key)
+                        self.stats["subscribes"] += 1
+                    elif op == "unsubscribe":
+                        self._clients[ws].discard(key)
+                    await ws.send(json.dumps({"event": op, "arg": arg, "connId": str(id(ws))}))
+                    if op == "subscribe" and key[0] == "books":
+                        # 深度频道订阅后先推送快照
+                        await ws.send(json.dumps({"arg": arg, "action": "snapshot",
+                                                  "data": [self.market.book_snapshot(key[1])]}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self._clients.pop(ws, None)
+
+    async def push(self, arg: Dict[str, str], data: list, action: str = None):
+        """向订阅了该频道的客户端推送指定数据"""
+        key = (arg.get("channel"), arg.get("instId") or arg.get("instType"))
+        message = {"arg": arg, "data": data}
+        if action:
+            message["action"] = action
+        payload = json.dumps(message)
+        for ws, keys in list(self._clients.items()):
+            if key in keys:
+                try:
+                    await ws.send(payload)
+                    self.stats["pushes"] += 1
+                except websockets.ConnectionClosed:
+                    pass
+
+    def _on_private_update(self, channel: str, data: Dict[str, Any]):
+        """模拟账户变化时推送私有频道，orders 频道同时推送给按产品类型和 ANY 订阅的客户端"""
+        if channel == "account":
+            args = [{"channel": "account"}]
+        else:
+            args = [{"channel": channel, "instType": data["instType"]}, {"channel": channel, "instType": "ANY"}]
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return
+        for arg in args:
+            task = loop.create_task(self.push(arg, [data]))
+            self._private_tasks.add(task)
+            task.add_done_callback(self._private_tasks.discard)
+
+    def _candle(self, inst_id: str, bar: str) -> list:
+        """返回当前K线，跨周期时先推送上一根已收盘的K线"""
+        now = time.time() * 1000
+        ts = int(bar_open_time(bar, now / 1000) * 1000)
+        rows = []
+        last_ts = self._candles.get((inst_id, bar))
+        if last_ts is not None and last_ts != ts:
+            rows.append(self.market.candle(inst_id, bar, last_ts, now))
+        self._candles[(inst_id, bar)] = ts
+        rows.append(self.market.candle(inst_id, bar, ts, now))
+        return rows
+
+    async def _push_loop(self):
+        while True:
+            await asyncio.sleep(self.tick_interval)
+            if self._clients and self.faults.should_drop_ws():
+                self.stats["injected_drops"] += 1
+                await self.drop_connections()
+                continue
+            self.market.match_orders()
+            subscribed = set().union(*self._clients.values()) if self._clients else set()
+            subscribed = {key for key in subscribed if key[0] in PUBLIC_CHANNELS or key[0].startswith("candle")}
+            payloads = {}
+            for channel, inst_id in subscribed:
+                if inst_id not in self.market.symbols:
+                    continue
+                message = {"arg": {"channel": channel, "instId": inst_id}}
+                if channel == "tickers":
+                    message["data"] = [self.market.ticker(inst_id)]
+                elif channel.startswith("candle"):
+                    message["data"] = self._candle(inst_id, channel[len("candle"):])
+                elif channel == "books":
+                    message["action"] = "update"
+                    message["data"] = [self.market.book_update(inst_id)]
+                elif channel == "books5":
+                    book = self.market.book(inst_id)
+                    message["data"] = [dict(self.market.book_levels(book, 5), ts=str(int(time.time() * 1000)))]
+                payloads[(channel, inst_id)] = json.dumps(message)
+            for ws, keys in list(self._clients.items()):
+                for key in keys:
+                    if key in payloads:
+                        try:
+                            await ws.send(payloads[key])
+                            self.stats["pushes"] += 1
+                        except websockets.ConnectionClosed:
+                            break
+
+
+class MockOKXExchange:
+    """同时运行 REST 和 WebSocket 服务，两者共享行情和账户状态"""
+
+    def __init__(self, host: str = "127.0.0.1", rest_port: int = 8780, ws_port: int = 8765,
+                 tick_interval: float = 0.2, symbols: Optional[List[str]] = None,
+                 faults: Optional[MockFaults] = None, archive_dir: Optional[str] = None):
+        self.faults = faults or MockFaults()
+        self.market = MockMarket(symbols, CandleArchive(archive_dir) if archive_dir else None)
+        self.rest = MockOKXRestServer(self.market, self.faults, host, rest_port)
+        self.ws = MockOKXWebSocketServer(host, ws_port, tick_interval, self.market, self.faults)
+
+    def env(self) -> Dict[str, str]:
+        """客户端连接本服务所需的环境变量"""
+        return {
+            "OKX_BASE_URL": self.rest.url,
+            "OKX_WS_PUBLIC_URL": f"{self.ws.url}/ws/v5/public",
+            "OKX_WS_BUSINESS_URL": f"{self.ws.url}/ws/v5/business",
+            "OKX_WS_PRIVATE_URL": f"{self.ws.url}/ws/v5/private",
+        }
+
+    async def start(self):
+        await self.rest.start()
+        await self.ws.start()
+
+    async def stop(self):
+        await self.ws.stop()
+        await self.rest.stop()
+
+
+async def _main(args):
+    faults = MockFaults(args.latency_ms, args.jitter_ms, args.error_rate, args.rate_limit_rate,
+                        args.ws_drop_rate, args.seed)
+    symbols = args.symbols.split(",") if args.symbols else None
+    exchange = MockOKXExchange(args.host, args.rest_port, args.ws_port, args.tick_interval, symbols,
+                               faults, args.archive_dir)
+    await exchange.start()
+    for name, value in exchange.env().items():
+        print(f"{name}={value}")
+    await asyncio.Future()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="OKX REST/WebSocket 模拟交易所")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--rest-port", type=int, default=8780)
+    parser.add_argument("--ws-port", "--port", type=int, default=8765)
+    parser.add_argument("--tick-interval", type=float, default=0.2, help="WebSocket推送间隔（秒）")
+    parser.add_argument("--symbols", default="", help="逗号分隔的产品ID，默认为常见的永续合约和现货")
+    parser.add_argument("--archive-dir", default=None, help="回放 CandleArchive 目录中录制的K线")
+    parser.add_argument("--latency-ms", type=float, default=0, help="REST响应延迟（毫秒）")
+    parser.add_argument("--jitter-ms", type=float, default=0, help="REST响应延迟抖动（毫秒）")
+    parser.add_argument("--error-rate", type=float, default=0, help="返回HTTP 503的概率")
+    parser.add_argument("--rate-limit-rate", type=float, default=0, help="返回HTTP 429的概率")
+    parser.add_argument("--ws-drop-rate", type=float, default=0, help="每个推送周期断开WebSocket连接的概率")
+    parser.add_argument("--seed", type=int, default=None, help="故障注入的随机种子")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(_main(args))
@@ -0,0 +1,204 @@
+import sys
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional, Dict, Any, Union
+
+from bar_utils import next_bar_close
+
+# 按缓存键前缀区分的过期策略（秒）
+# "bar_close" 表示在K线收盘时失效，周期从缓存键中解析；
+# 只用于全部K线都已收盘（confirm="1"）的响应，含未收盘K线或无法判断时使用 unconfirmed_ttl
+DEFAULT_CACHE_POLICIES = {
+    "instruments": 4 * 3600,
+    "ticker": 0.5,
+    "tickers": 0.5,
+    "market_data": 0.5,
+    "account_balance": 1,
+    "positions": 1,
+    "kline": "bar_close",
+    "historical_candles": "bar_close",
+}
+
+
+def _all_bars_confirmed(value) -> bool:
+    """响应中的K线是否全部已收盘，OKX K线行的第9列 confirm 为 "1" 表示已收盘"""
+    rows = value.get("data") if isinstance(value, dict) else None
+    if not isinstance(rows, list) or not rows:
+        return False
+    return all(isinstance(row, (list, tuple)) and len(row) > 8 and str(row[8]) == "1" for row in rows)
+
+
+def _estimate_size(obj, _depth: int = 0) -> int:
+    """粗略估算对象占用的字节数"""
+    size = sys.getsizeof(obj)
+    if _depth > 6:
+        return size
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _estimate_size(key, _depth + 1) + _estimate_size(value, _depth + 1)
+    elif isinstance(obj, (list, tuple)):
+        for item in obj:
+            size += _estimate_size(item, _depth + 1)
+    return size
+
+
+class TTLLRUCache:
+    """
+    带过期时间的LRU缓存
+
+    - max_entries / max_bytes 限制条目数和估算字节数，超过时淘汰最久未使用的条目
+    - 每个条目按缓存键前缀匹配过期策略，全部已收盘的K线响应在当前K线收盘时失效，含未收盘K线的使用短TTL
+    - 统计命中、未命中、淘汰和过期次数
+    - 过期的条目移入容量有限的过期区，接口不可用时可通过 get_stale 取回
+    """
+
+    def __init__(self, max_entries: int = 1000, max_bytes: int = 64 * 1024 * 1024,
+                 policies: Optional[Dict[str, Union[float, str]]] = None, default_ttl: float = 5,
+                 max_stale_entries: int = 256, unconfirmed_ttl: float = 5):
+        """
+        :param max_entries: 最大条目数
+        :param max_bytes: 最大估算字节数
+        :param policies: {缓存键前缀: TTL秒数或"bar_close"}，与默认策略合并
+        :param default_ttl: 未匹配任何策略时的TTL
+        :param max_stale_entries: 过期区保留的最大条目数
+        :param unconfirmed_ttl: "bar_close" 策略下响应含未收盘K线时的TTL，避免缓存中的最新K线停止更新
+        """
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.default_ttl = default_ttl
+        self.unconfirmed_ttl = unconfirmed_ttl
+        self.policies = dict(DEFAULT_CACHE_POLICIES)
+        if policies:
+            self.policies.update(policies)
+        # 前缀较长的策略优先匹配，例如 historical_candles 不会被 kline 之类的短前缀截获
+        self._prefixes = sorted(self.policies, key=len, reverse=True)
+
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (value, expires_at, size, policy)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self._stats: Dict[str, Dict[str, int]] = {}
+        self.max_stale_entries = max_stale_entries
+        self._stale: "OrderedDict[str, Any]" = OrderedDict()
+
+    def _match_policy(self, key: str) -> str:
+        for prefix in self._prefixes:
+            if key.startswith(prefix):
+                return prefix
+        return "default"
+
+    def _expires_at(self, key: str, policy: str, now: float, value: Any = None) -> float:
+        ttl = self.policies.get(policy, self.default_ttl)
+        if ttl == "bar_close":
+            # /market/candles 的第一行是未收盘K线，缓存到收盘会让它停在缓存时的价格
+            if not _all_bars_confirmed(value):
+                return now + self.unconfirmed_ttl
+            # 缓存键格式: {prefix}_{symbol}_{bar}_{limit}
+            parts = key.split("_")
+            try:
+                return next_bar_close(parts[-2], now)
+            except (ValueError, IndexError):
+                return now + self.default_ttl
+        return now + float(ttl)
+
+    def _policy_stats(self, policy: str) -> Dict[str, int]:
+        stats = self._stats.get(policy)
+        if stats is None:
+            stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+            self._stats[policy] = stats
+        return stats
+
+    def _remove(self, key: str):
+        _, _, size, _ = self._data.pop(key)
+        self._bytes -= size
+
+    def _expire(self, key: str):
+        """过期条目移入过期区"""
+        value = self._data[key][0]
+        self._remove(key)
+        self._stale[key] = value
+        self._stale.move_to_end(key)
+        while len(self._stale) > self.max_stale_entries:
+            self._stale.popitem(last=False)
+
+    def get(self, key: str) -> Optional[Any]:
+        with self._lock:
+            entry = self._data.get(key)
+            policy = entry[3] if entry else self._match_policy(key)
+            stats = self._policy_stats(policy)
+            if entry is None:
+                stats["misses"] += 1
+                return None
+            if time.time() >= entry[1]:
+                self._expire(key)
+                stats["expirations"] += 1
+                stats["misses"] += 1
+                return None
+            self._data.move_to_end(key)
+            stats["hits"] += 1
+            return entry[0]
+
+    def set(self, key: str, value: Any):
+        now = time.time()
+        policy = self._match_policy(key)
+        size = _estimate_size(value)
+        with self._lock:
+            if key in self._data:
+                self._remove(key)
+            self._stale.pop(key, None)
+            self._data[key] = (value, self._expires_at(key, policy, now, value), size, policy)
+            self._bytes += size
+            self._evict()
+
+    def _evict(self):
+        # 先清理已过期条目，仍超限时再按LRU淘汰
+        if len(self._data) > self.max_entries or self._bytes > self.max_bytes:
+            now = time.time()
+            for key in [k for k, entry in self._data.items() if entry[1] <= now]:
+                self._policy_stats(self._data[key][3])["expirations"] += 1
+                self._expire(key)
+        while self._data and (len(self._data) > self.max_entries or self._bytes > self.max_bytes):
+            key, entry = next(iter(self._data.items()))
+            self._policy_stats(entry[3])["evictions"] += 1
+            self._remove(key)
+
+    def get_stale(self, key: str) -> Optional[Any]:
+        """返回缓存值，已过期的也返回，用于接口不可用时的降级；不计入命中统计"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                return entry[0]
+            return self._stale.get(key)
+
+    def invalidate(self, prefix: str = ""):
+        """删除以 prefix 开头的缓存条目，prefix 为空时清空缓存"""
+        with self._lock:
+            for key in [k for k in self._data if k.startswith(prefix)]:
+                self._remove(key)
+            for key in [k for k in self._stale if k.startswith(prefix)]:
+                del self._stale[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存容量和命中统计"""
+        with self._lock:
+            policies = {}
+            totals = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+            for policy, stats in self._stats.items():
+                lookups = stats["hits"] + stats["misses"]
+                policies[policy] = dict(stats, hit_ratio=round(stats["hits"] / lookups, 4) if lookups else 0)
+                for name in totals:
+                    totals[name] += stats[name]
+            lookups = totals["hits"] + totals["misses"]
+            return {
+                "entries": len(self._data),
+                "max_entries": self.max_entries,
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+                "stale_entries": len(self._stale),
+                **totals,
+                "hit_ratio": round(totals["hits"] / lookups, 4) if lookups else 0,
+                "policies": policies,
+            }
@@ -1,14 +1,26 @@
-import requests
 import json
 import hmac
 import base64
 import datetime
 import time
 import os
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List
+from urllib.parse import urlencode
+from http_transport import PooledHTTPTransport
+from rate_limiter import RequestScheduler
+from single_flight import SingleFlight
+from okx_cache import TTLLRUCache
+from circuit_breaker import CircuitBreakerRegistry
+from metrics import MetricsRegistry
+from ticker_table import TickerTable, inst_type_of
+
+# 批量下单/撤单接口单次最多20个订单
+BATCH_ORDER_LIMIT = 20
 
 class OKXClient:
-    def __init__(self):
+    def __init__(self, scheduler: Optional[RequestScheduler] = None,
+                 breakers: Optional[CircuitBreakerRegistry] = None,
+                 metrics: Optional[MetricsRegistry] = None):
         # 从环境变量获取API凭证，如果环境变量不存在则使用默认值
         self.api_key = os.environ.get("OKX_API_KEY", "a6423b67-7de4-4541-b8b6-0346ce615d29")
         self.secret_key = os.environ.get("OKX_SECRET_KEY", "EB4E6DDF09A42FA30A7BA09362283AD6")
@@ -16,10 +28,42 @@ class OKXClient:
         self.base_url = os.environ.get("OKX_BASE_URL", "https://www.okx.com")
         self.is_test = os.environ.get("OKX_IS_TEST", "True").lower() == "true"
         self.debug = os.environ.get("OKX_DEBUG", "False").lower() == "true"
-        # 添加缓存
-        self._cache = {}
-        self._cache_time = {}
-        self._cache_duration = int(os.environ.get("OKX_CACHE_DURATION", "5"))  # 缓存有效期（秒）
+        # 添加缓存：容量有上限，按接口设置过期时间
+        self._cache = TTLLRUCache(
+            max_entries=int(os.environ.get("OKX_CACHE_MAX_ENTRIES", "1000")),
+            max_bytes=int(os.environ.get("OKX_CACHE_MAX_BYTES", str(64 * 1024 * 1024))),
+            default_ttl=float(os.environ.get("OKX_CACHE_DURATION", "5"))  # 未配置策略的缓存有效期（秒）
+        )
+        # 缓存未命中时合并相同请求
+        self._single_flight = self._create_single_flight()
+        # 长连接连接池，复用与OKX之间的TCP+TLS连接
+        self.transport = self._create_transport()
+        # 按接口限速的请求调度器，可在多个客户端之间共享
+        self.scheduler = scheduler or RequestScheduler(
+            max_concurrency=int(os.environ.get("OKX_POOL_MAXSIZE", "10"))
+        )
+        # 按接口类别的重试策略和按接口族的熔断器，可在多个客户端之间共享
+        self.breakers = breakers or CircuitBreakerRegistry()
+        # 按接口族的往返耗时、限速排队时间和请求数，同步和异步客户端共享同名指标
+        self.metrics = metrics or MetricsRegistry()
+        self._request_latency = self.metrics.histogram(
+            "okx_request_duration_seconds", "OKX REST请求往返耗时（不含限速排队）", ["endpoint"])
+        self._queue_latency = self.metrics.histogram(
+            "okx_request_queue_seconds", "OKX REST请求等待限速令牌的时间", ["endpoint"])
+        self._request_count = self.metrics.counter(
+            "okx_requests_total", "OKX REST请求数，status 为HTTP状态码或 error", ["endpoint", "status"])
+
+    def _create_transport(self):
+        """创建HTTP传输层"""
+        return PooledHTTPTransport(
+            pool_connections=int(os.environ.get("OKX_POOL_CONNECTIONS", "10")),
+            pool_maxsize=int(os.environ.get("OKX_POOL_MAXSIZE", "10")),
+            timeout=30
+        )
+
+    def _create_single_flight(self):
+        """创建请求合并器"""
+        return SingleFlight()
 
     def _get_timestamp(self):
         now = datetime.datetime.utcnow()
@@ -38,76 +82,158 @@ class OKXClient:
         )
         return base64.b64encode(mac.digest()).decode()
 
-    def _send_request(self, method: str, request_path: str, body: Optional[Dict] = None) -> Dict[str, Any]:
-        max_retries = 3
-        retry_delay = 2
+    def _build_request(self, method: str, request_path: str, body: Optional[Dict] = None):
+        """构建带签名的请求，返回 (url, headers, body_str)"""
+        # 确保请求路径格式正确
+        if not request_path.startswith('/'):
+            request_path = '/' + request_path
         
-        for retry in range(max_retries):
-            # 确保请求路径格式正确
-            if not request_path.startswith('/'):
-                request_path = '/' + request_path
+        if not request_path.startswith('/api/v5'):
+            request_path = '/api/v5' + request_path
             
-            if not request_path.startswith('/api/v5'):
-                request_path = '/api/v5' + request_path
-                
-            timestamp = self._get_timestamp()
-            if body:
-                body_str = json.dumps(body)
-            else:
-                body_str = ''
-    
-            sign = self._sign(timestamp, method, request_path, body_str)
-            headers = {
-                "OK-ACCESS-KEY": self.api_key,
-                "OK-ACCESS-SIGN": sign,
-                "OK-ACCESS-TIMESTAMP": timestamp,
-                "OK-ACCESS-PASSPHRASE": self.passphrase,
-                "Content-Type": "application/json",
-                "x-simulated-trading": "1"  # 使用模拟交易
-            }
-    
-            url = f"{self.base_url}{request_path}"
+        timestamp = self._get_timestamp()
+        if body:
+            body_str = json.dumps(body)
+        else:
+            body_str = ''
+
+        sign = self._sign(timestamp, method, request_path, body_str)
+        headers = {
+            "OK-ACCESS-KEY": self.api_key,
+            "OK-ACCESS-SIGN": sign,
+            "OK-ACCESS-TIMESTAMP": timestamp,
+            "OK-ACCESS-PASSPHRASE": self.passphrase,
+            "Content-Type": "application/json",
+            "x-simulated-trading": "1"  # 使用模拟交易
+        }
+
+        url = f"{self.base_url}{request_path}"
+        return url, headers, body_str
+
+    @staticmethod
+    def _parse_response(result: Dict) -> Dict[str, Any]:
+        """将OKX响应转换为统一的返回格式"""
+        return {
+            "success": result.get("code") == "0",
+            "data": result.get("data", []),
+            "msg": result.get("msg", "success")
+        }
+
+    @staticmethod
+    def _circuit_open_response(family: str) -> Dict[str, Any]:
+        return {"success": False, "data": [], "msg": f"接口熔断中: {family}", "circuit_open": True}
+
+    def _record_outcome(self, family: str, status: Optional[int]):
+        """网络异常和5xx计为失败，其余响应说明接口可达"""
+        if status is None or status >= 500:
+            self.breakers.record_failure(family)
+        else:
+            self.breakers.record_success(family)
+
+    def _observe_request(self, family: str, queued_at: float, sent_at: Optional[float], status: Optional[int]):
+        """记录一次请求的排队时间、往返耗时和状态码"""
+        if sent_at is not None:
+            self._queue_latency.labels(family).observe(sent_at - queued_at)
+            self._request_latency.labels(family).observe(time.perf_counter() - sent_at)
+        self._request_count.labels(family, str(status) if status is not None else "error").inc()
+
+    def _send_request(self, method: str, request_path: str, body: Optional[Dict] = None) -> Dict[str, Any]:
+        """
+        发送请求
+        按接口类别的重试策略退避重试；接口熔断时直接返回失败，响应中 circuit_open 为 True
+        """
+        family = self.scheduler.get_family(request_path)
+        policy = self.breakers.retry_policy(family)
+        if not self.breakers.allow(family):
+            return self._circuit_open_response(family)
+
+        attempt = 0
+        while True:
+            # 每次重试重新签名，保证时间戳有效
+            url, headers, body_str = self._build_request(method, request_path, body)
             
             if self.debug:
                 print(f"请求URL: {url}")
                 print(f"请求头: {headers}")
                 print(f"请求体: {body_str}")
-                
+            
+            status = None
+            queued_at, sent_at = time.perf_counter(), None
             try:
-                response = requests.request(method, url, headers=headers, data=body_str, timeout=30)  # 增加请求超时时间
+                # 等待该接口的限速令牌
+                self.scheduler.acquire_blocking(request_path)
+                sent_at = time.perf_counter()
+                try:
+                    response = self.transport.request(method, url, headers=headers, data=body_str, timeout=30)  # 增加请求超时时间
+                    status = response.status_code
+                finally:
+                    self._observe_request(family, queued_at, sent_at, status)
                 
-                if response.status_code == 200:
-                    result = response.json()
-                    return {
-                        "success": result.get("code") == "0",
-                        "data": result.get("data", []),
-                        "msg": result.get("msg", "success")
-                    }
+                if self.debug:
+                    print(f"请求耗时: {self.transport.last_timing}")
                 
-                if retry < max_retries - 1:
-                    print(f"请求失败 (HTTP {response.status_code})，将在 {retry_delay} 秒后重试...")
-                    time.sleep(retry_delay)
-                    continue
-                
-                return {"success": False, "data": [], "msg": f"HTTP Error: {response.status_code}"}
+                if status == 200:
+                    result = self._parse_response(response.json())
+                    self.breakers.record_success(family)
+                    return result
                 
+                if status == 429:
+                    self.scheduler.on_rate_limited(request_path)
+                error = f"HTTP Error: {status}"
             except Exception as e:
-                if retry < max_retries - 1:
-                    print(f"请求异常，将在 {retry_delay} 秒后重试: {str(e)}")
-                    time.sleep(retry_delay)
-                    continue
-                return {"success": False, "data": [], "msg": str(e)}
+                error = str(e)
+            
+            attempt += 1
+            if not policy.should_retry(attempt, status):
+                self._record_outcome(family, status)
+                return {"success": False, "data": [], "msg": error}
+            
+            self.breakers.record_retry(family)
+            delay = policy.delay(attempt - 1)
+            print(f"请求失败 ({error})，将在 {delay:.2f} 秒后重试...")
+            time.sleep(delay)
+
+    def _with_stale_fallback(self, cache_key: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """接口熔断时返回过期的缓存数据，响应中 stale 为 True"""
+        if result.get("circuit_open"):
+            stale_data = self._cache.get_stale(cache_key)
+            if stale_data:
+                return dict(stale_data, stale=True)
+        return result
+
+    def _cached_fetch(self, cache_key: str, endpoint: str, fetch):
+        """合并同一缓存键的并发请求，接口熔断时回退到过期的缓存数据"""
+        return self._with_stale_fallback(cache_key, self._single_flight.do(cache_key, endpoint, fetch))
+
+    def get_resilience_stats(self) -> Dict[str, Any]:
+        """获取各接口族的熔断状态和重试次数"""
+        return self.breakers.get_stats()
+
+    def get_transport_stats(self) -> Dict[str, Any]:
+        """获取HTTP连接池的复用与耗时统计"""
+        return self.transport.get_stats()
+
+    def get_coalescing_stats(self) -> Dict[str, Any]:
+        """获取各接口的请求合并命中统计"""
+        return self._single_flight.get_stats()
+
+    def get_scheduler_stats(self) -> Dict[str, Any]:
+        """获取限速调度器的队列深度和等待时间统计"""
+        return self.scheduler.get_stats()
+
+    def get_cache_stats(self) -> Dict[str, Any]:
+        """获取缓存命中、淘汰和容量统计"""
+        return self._cache.get_stats()
 
     def _get_cached_data(self, key: str) -> Optional[Dict]:
-        if key in self._cache:
-            last_update = self._cache_time.get(key, 0)
-            if time.time() - last_update < self._cache_duration:
-                return self._cache[key]
-        return None
+        return self._cache.get(key)
 
     def _set_cache(self, key: str, data: Dict):
-        self._cache[key] = data
-        self._cache_time[key] = time.time()
+        self._cache.set(key, data)
+
+    def invalidate_cache(self, prefix: str = ""):
+        """删除以 prefix 开头的缓存，下次请求将访问交易所"""
+        self._cache.invalidate(prefix)
 
     def get_account_balance(self):
         cache_key = 'account_balance'
@@ -115,39 +241,47 @@ class OKXClient:
         if cached_data:
             return cached_data
 
-        try:
-            result = self._send_request("GET", "/account/balance")
-            if result["success"] and result["data"]:
-                balance_data = result["data"][0] if isinstance(result["data"], list) and result["data"] else {}
-                response = {
-                    "success": True,
-                    "data": balance_data,
-                    "msg": "success"
-                }
-                self._set_cache(cache_key, response)
-                return response
-            return result
-        except Exception as e:
-            print(f"获取账户余额错误: {e}")
-            return {"success": False, "data": {}, "msg": str(e)}
-    
+        def fetch():
+            try:
+                result = self._send_request("GET", "/account/balance")
+                if result["success"] and result["data"]:
+                    balance_data = result["data"][0] if isinstance(result["data"], list) and result["data"] else {}
+                    response = {
+                        "success": True,
+                        "data": balance_data,
+                        "msg": "success"
+                    }
+                    self._set_cache(cache_key, response)
+                    return response
+                return result
+            except Exception as e:
+                print(f"获取账户余额错误: {e}")
+                return {"success": False, "data": {}, "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return self._cached_fetch(cache_key, "/account/balance", fetch)
+
     def get_positions(self):
         cache_key = 'positions'
         cached_data = self._get_cached_data(cache_key)
         if cached_data:
             return cached_data
 
-        try:
-            params = {
-                "instType": "SWAP",
-            }
-            result = self._send_request("GET", "/account/positions", body=params)
-            if result["success"]:
-                self._set_cache(cache_key, result)
-            return result
-        except Exception as e:
-            print(f"获取持仓信息错误: {e}")
-            return {"success": False, "data": [], "msg": str(e)}
+        def fetch():
+            try:
+                params = {
+                    "instType": "SWAP",
+                }
+                result = self._send_request("GET", "/account/positions", body=params)
+                if result["success"]:
+                    self._set_cache(cache_key, result)
+                return result
+            except Exception as e:
+                print(f"获取持仓信息错误: {e}")
+                return {"success": False, "data": [], "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return self._cached_fetch(cache_key, "/account/positions", fetch)
 
     def get_market_data(self, instId: str):
         """获取市场行情数据"""
@@ -218,6 +352,82 @@ class OKXClient:
             print(f"撤单错误: {e}")
             return {"success": False, "data": {}, "msg": str(e)}
 
+    @staticmethod
+    def _chunk_orders(orders: List[Dict[str, Any]]) -> List[List[Dict[str, Any]]]:
+        """按批量接口的上限切分订单"""
+        return [orders[i:i + BATCH_ORDER_LIMIT] for i in range(0, len(orders), BATCH_ORDER_LIMIT)]
+
+    @staticmethod
+    def _merge_batch_results(chunks: List[List[Dict[str, Any]]], results: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        合并各批次的结果，data 与提交的订单一一对应，每项的 sCode 为 "0" 表示该订单成功
+        整批请求失败（网络错误等）时，该批次的每个订单都记为失败
+        """
+        merged = []
+        for chunk, result in zip(chunks, results):
+            data = result.get("data")
+            if isinstance(data, list) and len(data) == len(chunk):
+                merged.extend(data)
+            else:
+                merged.extend({"sCode": "-1", "sMsg": result.get("msg", ""), "ordId": "",
+                               "clOrdId": order.get("clOrdId", "")} for order in chunk)
+        failed = sum(1 for item in merged if item.get("sCode") != "0")
+        return {
+            "success": failed == 0,
+            "data": merged,
+            "msg": "success" if failed == 0 else f"{failed}/{len(merged)} 个订单失败"
+        }
+
+    def place_orders(self, orders: List[Dict[str, Any]]):
+        """
+        批量下单，每批最多20个订单
+        :param orders: 订单参数列表，字段与 /trade/order 相同
+        """
+        try:
+            chunks = self._chunk_orders(orders)
+            results = [self._send_request("POST", "/trade/batch-orders", chunk) for chunk in chunks]
+            return self._merge_batch_results(chunks, results)
+        except Exception as e:
+            print(f"批量下单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    def cancel_orders(self, orders: List[Dict[str, Any]]):
+        """
+        批量撤单，每批最多20个订单
+        :param orders: [{"instId": ..., "ordId": ...} 或 {"instId": ..., "clOrdId": ...}]
+        """
+        try:
+            chunks = self._chunk_orders(orders)
+            results = [self._send_request("POST", "/trade/cancel-batch-orders", chunk) for chunk in chunks]
+            return self._merge_batch_results(chunks, results)
+        except Exception as e:
+            print(f"批量撤单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
+    def get_pending_orders(self, inst_type: str = None, inst_id: str = None):
+        """获取全部未成交订单，按 ordId 游标翻页"""
+        try:
+            orders = []
+            after = None
+            while True:
+                params = {"limit": "100"}
+                if inst_type:
+                    params["instType"] = inst_type
+                if inst_id:
+                    params["instId"] = inst_id
+                if after:
+                    params["after"] = after
+                result = self._send_request("GET", f"/trade/orders-pending?{urlencode(params)}")
+                if not result["success"]:
+                    return result
+                orders.extend(result["data"])
+                if len(result["data"]) < 100:
+                    return {"success": True, "data": orders, "msg": "success"}
+                after = result["data"][-1]["ordId"]
+        except Exception as e:
+            print(f"获取未成交订单错误: {e}")
+            return {"success": False, "data": [], "msg": str(e)}
+
     def get_ticker(self, symbol):
         """获取当前价格"""
         cache_key = f'ticker_{symbol}'
@@ -242,15 +452,19 @@ class OKXClient:
         if cached_data:
             return cached_data
     
-        try:
-            endpoint = f"/market/candles?instId={symbol}&bar={bar}&limit={limit}"
-            result = self._send_request("GET", endpoint)
-            if result["success"]:
-                self._set_cache(cache_key, result)
-            return result
-        except Exception as e:
-            print(f"获取K线数据错误: {str(e)}")
-            return {"success": False, "data": [], "msg": str(e)}
+        def fetch():
+            try:
+                endpoint = f"/market/candles?instId={symbol}&bar={bar}&limit={limit}"
+                result = self._send_request("GET", endpoint)
+                if result["success"]:
+                    self._set_cache(cache_key, result)
+                return result
+            except Exception as e:
+                print(f"获取K线数据错误: {str(e)}")
+                return {"success": False, "data": [], "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return self._cached_fetch(cache_key, "/market/candles", fetch)
 
     def get_instruments(self, inst_types=None):
         """获取所有可交易品种"""
@@ -260,9 +474,15 @@ class OKXClient:
                 
             all_instruments = []
             for inst_type in inst_types:
-                # 使用正确的API路径
-                endpoint = f"/public/instruments?instType={inst_type}"
-                response = self._send_request("GET", endpoint)
+                # 产品列表变化很少，按类型长时间缓存
+                cache_key = f"instruments_{inst_type}"
+                response = self._get_cached_data(cache_key)
+                if not response:
+                    # 使用正确的API路径
+                    endpoint = f"/public/instruments?instType={inst_type}"
+                    response = self._send_request("GET", endpoint)
+                    if response["success"]:
+                        self._set_cache(cache_key, response)
                 
                 if response["success"]:
                     all_instruments.extend(response["data"])
@@ -319,6 +539,39 @@ class OKXClient:
             print(f"获取K线数据错误: {str(e)}")
             return {"success": False, "data": [], "msg": str(e)}
 
+    def get_tickers_snapshot(self, inst_type: str = "SWAP"):
+        """
+        一次获取某一产品类型全部产品的行情（/market/tickers）
+        :param inst_type: SPOT/SWAP/FUTURES
+        :return: data 为 TickerTable
+        """
+        cache_key = f'tickers_{inst_type}'
+        cached_data = self._get_cached_data(cache_key)
+        if cached_data:
+            return cached_data
+
+        def fetch():
+            try:
+                result = self._send_request("GET", f"/market/tickers?instType={inst_type}")
+                if result["success"]:
+                    response = {"success": True, "data": TickerTable(inst_type, result.get("data", [])), "msg": "success"}
+                    self._set_cache(cache_key, response)
+                    return response
+                return result
+            except Exception as e:
+                print(f"获取行情快照错误: {str(e)}")
+                return {"success": False, "data": None, "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return self._cached_fetch(cache_key, "/market/tickers", fetch)
+
+    def _ticker_from_snapshot(self, symbol):
+        """从已缓存的行情快照中查询单个产品，快照未缓存或不包含该产品时返回 None"""
+        cached_data = self._get_cached_data(f'tickers_{inst_type_of(symbol)}')
+        if cached_data:
+            return cached_data["data"].to_ticker_response(symbol)
+        return None
+
     def get_ticker(self, symbol):
         """获取单个产品的行情数据"""
         cache_key = f'ticker_{symbol}'
@@ -326,15 +579,39 @@ class OKXClient:
         if cached_data:
             return cached_data
         
-        try:
-            endpoint = f"/api/v5/market/ticker?instId={symbol}"
-            result = self._send_request("GET", endpoint)
-            if result["success"]:
-                self._set_cache(cache_key, result)
-            return result
-        except Exception as e:
-            print(f"获取行情数据错误: {str(e)}")
-            return {"success": False, "data": {}, "msg": str(e)}
+        # 行情快照已缓存时直接从快照中查询
+        snapshot_data = self._ticker_from_snapshot(symbol)
+        if snapshot_data:
+            return snapshot_data
+        
+        def fetch():
+            try:
+                endpoint = f"/api/v5/market/ticker?instId={symbol}"
+                result = self._send_request("GET", endpoint)
+                if result["success"]:
+                    self._set_cache(cache_key, result)
+                return result
+            except Exception as e:
+                print(f"获取行情数据错误: {str(e)}")
+                return {"success": False, "data": {}, "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return self._cached_fetch(cache_key, "/market/ticker", fetch)
+
+    @staticmethod
+    def _format_market_data(symbol, ticker_data):
+        """从ticker响应中提取行情摘要"""
+        ticker = ticker_data.get("data", [{}])[0]
+        
+        return {
+            "symbol": symbol,
+            "last": ticker.get("last", "0"),
+            "open24h": ticker.get("open24h", "0"),
+            "high24h": ticker.get("high24h", "0"),
+            "low24h": ticker.get("low24h", "0"),
+            "volCcy24h": ticker.get("volCcy24h", "0"),
+            "change24h": ticker.get("sodUtc0", "0"),  # 根据OKX API文档，这是24小时涨跌幅
+        }
 
     def get_market_data(self, symbol):
         """获取市场数据，包括最新价格、24小时涨跌幅等"""
@@ -346,17 +623,7 @@ class OKXClient:
                 return ticker_data
                 
             # 提取需要的数据
-            ticker = ticker_data.get("data", [{}])[0]
-            
-            market_data = {
-                "symbol": symbol,
-                "last": ticker.get("last", "0"),
-                "open24h": ticker.get("open24h", "0"),
-                "high24h": ticker.get("high24h", "0"),
-                "low24h": ticker.get("low24h", "0"),
-                "volCcy24h": ticker.get("volCcy24h", "0"),
-                "change24h": ticker.get("sodUtc0", "0"),  # 根据OKX API文档，这是24小时涨跌幅
-            }
+            market_data = self._format_market_data(symbol, ticker_data)
             
             return {"success": True, "data": market_data}
         except Exception as e:
@@ -380,6 +647,32 @@ class OKXClient:
             print(f"获取资产数据错误: {str(e)}")
             return {"success": False, "data": {}, "msg": str(e)}
 
+    @staticmethod
+    def _format_candles(candles):
+        """
+        处理K线数据格式，OKX返回的K线数据格式为:
+        [时间戳, 开盘价, 最高价, 最低价, 收盘价, 成交量, 成交额]
+        返回按时间顺序排列的字典列表
+        """
+        formatted_candles = []
+        
+        for candle in candles:
+            if len(candle) >= 7:
+                formatted_candle = {
+                    "timestamp": int(candle[0]),
+                    "open": float(candle[1]),
+                    "high": float(candle[2]),
+                    "low": float(candle[3]),
+                    "close": float(candle[4]),
+                    "volume": float(candle[5]),
+                    "volume_currency": float(candle[6])
+                }
+                formatted_candles.append(formatted_candle)
+        
+        # 按时间戳排序，确保数据是按时间顺序的
+        formatted_candles.sort(key=lambda x: x["timestamp"])
+        return formatted_candles
+
     def get_historical_candles(self, symbol, bar="1m", limit=300):
         """
         获取历史K线数据用于回测
@@ -397,43 +690,28 @@ class OKXClient:
         if cached_data:
             return cached_data
         
-        try:
-            # 使用正确的API路径
-            endpoint = f"/market/candles?instId={symbol}&bar={bar}&limit={limit}"
-            result = self._send_request("GET", endpoint)
+        def fetch():
+            try:
+                # 使用正确的API路径
+                endpoint = f"/market/candles?instId={symbol}&bar={bar}&limit={limit}"
+                result = self._send_request("GET", endpoint)
             
-            if result["success"]:
-                # 处理数据格式，OKX返回的K线数据格式为:
-                # [时间戳, 开盘价, 最高价, 最低价, 收盘价, 成交量, 成交额]
-                candles = result.get("data", [])
-                formatted_candles = []
+                if result["success"]:
+                    formatted_candles = self._format_candles(result.get("data", []))
                 
-                for candle in candles:
-                    if len(candle) >= 7:
-                        formatted_candle = {
-                            "timestamp": int(candle[0]),
-                            "open": float(candle[1]),
-                            "high": float(candle[2]),
-                            "low": float(candle[3]),
-                            "close": float(candle[4]),
-                            "volume": float(candle[5]),
-                            "volume_currency": float(candle[6])
-                        }
-                        formatted_candles.append(formatted_candle)
-                
-                # 按时间戳排序，确保数据是按时间顺序的
-                formatted_candles.sort(key=lambda x: x["timestamp"])
-                
-                response = {
-                    "success": True,
-                    "data": formatted_candles,
-                    "msg": "success"
-                }
+                    response = {
+                        "success": True,
+                        "data": formatted_candles,
+                        "msg": "success"
+                    }
                 
-                self._set_cache(cache_key, response)
-                return response
+                    self._set_cache(cache_key, response)
+                    return response
             
-            return result
-        except Exception as e:
-            print(f"获取历史K线数据错误: {str(e)}")
-            return {"success": False, "data": [], "msg": str(e)}
\ No newline at end of file
+                return result
+            except Exception as e:
+                print(f"获取历史K线数据错误: {str(e)}")
+                return {"success": False, "data": [], "msg": str(e)}
+
+        # 同一缓存键的并发请求合并为一次上游请求
+        return self._cached_fetch(cache_key, "/market/candles", fetch)
\ No newline at end of file
@@ -0,0 +1,664 @@
+import asyncio
+import base64
+import hmac
+import json
+import logging
+import os
+import random
+import time
+from typing import Optional, Dict, Any, List, Callable, Tuple
+
+import websockets
+
+from order_book import OrderBook
+
+logger = logging.getLogger("OKXWebSocket")
+
+# K线频道在 business 地址，行情类频道在 public 地址
+PUBLIC_WS_URL = "wss://ws.okx.com:8443/ws/v5/public"
+BUSINESS_WS_URL = "wss://ws.okx.com:8443/ws/v5/business"
+DEMO_PUBLIC_WS_URL = "wss://wspap.okx.com:8443/ws/v5/public"
+DEMO_BUSINESS_WS_URL = "wss://wspap.okx.com:8443/ws/v5/business"
+PRIVATE_WS_URL = "wss://ws.okx.com:8443/ws/v5/private"
+DEMO_PRIVATE_WS_URL = "wss://wspap.okx.com:8443/ws/v5/private"
+
+# 单次订阅请求包含的频道数，避免超过请求长度限制
+SUBSCRIBE_BATCH_SIZE = 50
+
+
+def _arg_key(arg: Dict[str, str]) -> Tuple[str, str]:
+    return arg["channel"], arg.get("instId") or arg.get("instType", "")
+
+
+class OKXWebSocketClient:
+    """
+    单个OKX WebSocket连接
+
+    - 记录当前订阅的频道，断线后按退避间隔自动重连并重新订阅
+    - 超过 ping_interval 秒没有收到数据时发送 ping，仍无响应则重连
+    - 推送数据通过 on_message(arg, data, action) 回调输出，action 为 snapshot/update（仅深度频道有）
+    """
+
+    def __init__(self, url: str, on_message: Callable[[Dict[str, str], List[Any], Optional[str]], None], name: str = "",
+                 ping_interval: float = 25, reconnect_base_delay: float = 1, reconnect_max_delay: float = 30,
+                 on_reconnected: Optional[Callable[["OKXWebSocketClient"], None]] = None):
+        self.url = url
+        self.name = name or url
+        self.on_message = on_message
+        self.on_reconnected = on_reconnected
+        self.ping_interval = ping_interval
+        self.reconnect_base_delay = reconnect_base_delay
+        self.reconnect_max_delay = reconnect_max_delay
+        self.subscriptions: Dict[Tuple[str, str], Dict[str, str]] = {}
+        self.is_connected = False
+        self._ws = None
+        self._task: Optional[asyncio.Task] = None
+        self._stopping = False
+        self.stats = {"connects": 0, "disconnects": 0, "messages": 0, "last_message": 0}
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._stopping = False
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        self._stopping = True
+        if self._ws is not None:
+            await self._ws.close()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+            self._task = None
+        self.is_connected = False
+
+    async def subscribe(self, args: List[Dict[str, str]]):
+        new_args = [arg for arg in args if _arg_key(arg) not in self.subscriptions]
+        for arg in new_args:
+            self.subscriptions[_arg_key(arg)] = arg
+        if self.is_connected and new_args:
+            await self._send_op("subscribe", new_args)
+
+    async def unsubscribe(self, args: List[Dict[str, str]]):
+        removed = [self.subscriptions.pop(_arg_key(arg)) for arg in args if _arg_key(arg) in self.subscriptions]
+        if self.is_connected and removed:
+            await self._send_op("unsubscribe", removed)
+
+    async def _send_op(self, op: str, args: List[Dict[str, str]]):
+        try:
+            for i in range(0, len(args), SUBSCRIBE_BATCH_SIZE):
+                await self._ws.send(json.dumps({"op": op, "args": args[i:i + SUBSCRIBE_BATCH_SIZE]}))
+        except websockets.ConnectionClosed:
+            # 连接已断开，重连后会按 subscriptions 重新订阅
+            pass
+
+    async def _after_connect(self, ws):
+        """连接建立后、重新订阅之前调用，子类可在此登录"""
+        pass
+
+    def _on_reconnected(self):
+        """断线重连成功后调用，用于补拉断线期间的数据"""
+        if self.on_reconnected is not None:
+            self.on_reconnected(self)
+
+    async def _run(self):
+        retry = 0
+        while not self._stopping:
+            try:
+                async with websockets.connect(self.url, ping_interval=None, close_timeout=1) as ws:
+                    self._ws = ws
+                    await self._after_connect(ws)
+                    self.is_connected = True
+                    self.stats["connects"] += 1
+                    retry = 0
+                    logger.info(f"WebSocket已连接: {self.name}")
+                    if self.subscriptions:
+                        await self._send_op("subscribe", list(self.subscriptions.values()))
+                    if self.stats["connects"] > 1:
+                        self._on_reconnected()
+                    await self._read_loop(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                if not self._stopping:
+                    logger.warning(f"WebSocket连接断开: {self.name}: {str(e)}")
+            finally:
+                if self.is_connected:
+                    self.stats["disconnects"] += 1
+                self.is_connected = False
+                self._ws = None
+
+            if self._stopping:
+                break
+            delay = min(self.reconnect_max_delay, self.reconnect_base_delay * (2 ** retry))
+            retry += 1
+            await asyncio.sleep(random.uniform(delay / 2, delay))
+
+    async def _read_loop(self, ws):
+        waiting_pong = False
+        while True:
+            try:
+                raw = await asyncio.wait_for(ws.recv(), timeout=self.ping_interval)
+            except asyncio.TimeoutError:
+                if waiting_pong:
+                    raise ConnectionError("心跳超时")
+                waiting_pong = True
+                await ws.send("ping")
+                continue
+            waiting_pong = False
+            if raw == "pong":
+                continue
+            self.stats["messages"] += 1
+            self.stats["last_message"] = time.time()
+            self._handle_message(json.loads(raw))
+
+    def _handle_message(self, message: Dict[str, Any]):
+        event = message.get("event")
+        if event == "error":
+            logger.error(f"WebSocket错误: {self.name}: {message.get('code')} {message.get('msg')}")
+            return
+        if event:
+            logger.debug(f"WebSocket事件: {message}")
+            return
+        if "arg" in message and "data" in message:
+            try:
+                self.on_message(message["arg"], message["data"], message.get("action"))
+            except Exception as e:
+                logger.error(f"处理推送数据错误: {str(e)}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "connected": self.is_connected,
+            "subscriptions": len(self.subscriptions),
+            **self.stats
+        }
+
+
+class OKXMarketFeed:
+    """
+    公共行情推送管理器
+
+    - 订阅 tickers 和 candle{bar} 频道，多个交易对复用少量连接，单个连接的订阅数不超过上限
+    - 维护每个交易对的最新行情和最近 max_candles 根K线（OKX原始数组格式，按时间倒序，与REST一致）
+    - 订阅 books/books5 时维护L2订单簿，校验和不一致或序号不连续时重新订阅获取快照
+    - 数据更新后通知监听者 callback(channel, inst_id, data)
+    """
+
+    def __init__(self, public_url: Optional[str] = None, business_url: Optional[str] = None,
+                 max_subscriptions_per_connection: int = 100, max_candles: int = 100):
+        is_test = os.environ.get("OKX_IS_TEST", "True").lower() == "true"
+        self.public_url = public_url or os.environ.get(
+            "OKX_WS_PUBLIC_URL", DEMO_PUBLIC_WS_URL if is_test else PUBLIC_WS_URL
+        )
+        self.business_url = business_url or os.environ.get(
+            "OKX_WS_BUSINESS_URL", DEMO_BUSINESS_WS_URL if is_test else BUSINESS_WS_URL
+        )
+        self.max_subscriptions_per_connection = max_subscriptions_per_connection
+        self.max_candles = max_candles
+
+        self._connections: Dict[str, List[OKXWebSocketClient]] = {"public": [], "business": []}
+        self._listeners: List[Callable[[str, str, Any], None]] = []
+        self._started = False
+
+        self.tickers: Dict[str, Dict[str, Any]] = {}
+        self.candles: Dict[Tuple[str, str], List[List[str]]] = {}
+        self.last_update: Dict[str, float] = {}
+        # 断线期间可能漏掉K线，重连后需要重新用REST初始化的 (symbol, bar)
+        self._stale_candles = set()
+        self.books: Dict[str, OrderBook] = {}
+        self._book_channels: Dict[str, str] = {}
+        self._resyncing = set()
+
+    def add_listener(self, callback: Callable[[str, str, Any], None]):
+        self._listeners.append(callback)
+
+    def _url(self, kind: str) -> str:
+        return self.business_url if kind == "business" else self.public_url
+
+    def _connection_for(self, kind: str) -> OKXWebSocketClient:
+        """选择订阅数最少且未满的连接，全部已满时新建连接"""
+        connections = self._connections[kind]
+        available = [c for c in connections if len(c.subscriptions) < self.max_subscriptions_per_connection]
+        if available:
+            return min(available, key=lambda c: len(c.subscriptions))
+        connection = OKXWebSocketClient(self._url(kind), self._on_message, name=f"{kind}-{len(connections)}",
+                                        on_reconnected=self._on_connection_reconnected)
+        connections.append(connection)
+        if self._started:
+            connection.start()
+        return connection
+
+    def _find_connection(self, kind: str, arg: Dict[str, str]) -> Optional[OKXWebSocketClient]:
+        for connection in self._connections[kind]:
+            if _arg_key(arg) in connection.subscriptions:
+                return connection
+        return None
+
+    async def _subscribe(self, kind: str, arg: Dict[str, str]):
+        if self._find_connection(kind, arg) is None:
+            await self._connection_for(kind).subscribe([arg])
+
+    async def _unsubscribe(self, kind: str, arg: Dict[str, str]):
+        connection = self._find_connection(kind, arg)
+        if connection is not None:
+            await connection.unsubscribe([arg])
+
+    async def subscribe_ticker(self, symbol: str):
+        await self._subscribe("public", {"channel": "tickers", "instId": symbol})
+
+    async def subscribe_candles(self, symbol: str, bar: str = "1m"):
+        await self._subscribe("business", {"channel": f"candle{bar}", "instId": symbol})
+
+    async def subscribe_books(self, symbol: str, channel: str = "books"):
+        """
+        订阅深度频道
+        :param channel: books 为400档快照+增量（带校验和），books5 为每次推送完整的5档
+        """
+        if symbol in self._book_channels and self._book_channels[symbol] != channel:
+            await self._unsubscribe("public", {"channel": self._book_channels[symbol], "instId": symbol})
+        self._book_channels[symbol] = channel
+        self.books.setdefault(symbol, OrderBook(symbol))
+        await self._subscribe("public", {"channel": channel, "instId": symbol})
+
+    async def _resync_book(self, symbol: str):
+        """重新订阅深度频道，交易所会重新推送快照"""
+        channel = self._book_channels.get(symbol)
+        if channel is None or symbol in self._resyncing:
+            return
+        self._resyncing.add(symbol)
+        try:
+            logger.warning(f"订单簿校验失败，重新订阅: {symbol} {channel}")
+            arg = {"channel": channel, "instId": symbol}
+            await self._unsubscribe("public", arg)
+            await self._subscribe("public", arg)
+        finally:
+            self._resyncing.discard(symbol)
+
+    def _apply_books(self, inst_id: str, data: List[Dict[str, Any]], action: Optional[str]) -> bool:
+        book = self.books.get(inst_id)
+        if book is None:
+            return False
+        for item in data:
+            # books5 没有 action，每次推送都是完整快照
+            if action == "update":
+                if not book.valid:
+                    # 已在等待重新订阅后的快照
+                    return False
+                ok = book.apply_update(item)
+            else:
+                ok = book.apply_snapshot(item)
+            if not ok:
+                asyncio.create_task(self._resync_book(inst_id))
+                return False
+        return True
+
+    async def unsubscribe_symbol(self, symbol: str):
+        """取消该交易对的全部订阅并清除缓存的数据"""
+        await self._unsubscribe("public", {"channel": "tickers", "instId": symbol})
+        if symbol in self._book_channels:
+            await self._unsubscribe("public", {"channel": self._book_channels.pop(symbol), "instId": symbol})
+            self.books.pop(symbol, None)
+        for inst_id, bar in [key for key in self.candles if key[0] == symbol]:
+            await self._unsubscribe("business", {"channel": f"candle{bar}", "instId": inst_id})
+            del self.candles[(inst_id, bar)]
+            self._stale_candles.discard((inst_id, bar))
+        self.tickers.pop(symbol, None)
+        self.last_update.pop(symbol, None)
+
+    def _on_connection_reconnected(self, connection: OKXWebSocketClient):
+        for channel, inst_id in connection.subscriptions:
+            if channel.startswith("candle"):
+                self._stale_candles.add((inst_id, channel[len("candle"):]))
+            elif channel in ("books", "books5") and inst_id in self.books:
+                # 重新订阅后交易所会推送新快照，在此之前订单簿不可用
+                self.books[inst_id].valid = False
+
+    def needs_seed(self, symbol: str, bar: str = "1m") -> bool:
+        """K线缓存尚未初始化或重连后可能有缺口"""
+        key = (symbol, bar)
+        return key not in self.candles or key in self._stale_candles
+
+    def seed_candles(self, symbol: str, bar: str, rows: List[List[str]]):
+        """用REST获取的K线初始化缓存，之后由推送增量更新"""
+        key = (symbol, bar)
+        # 保留初始化期间推送到达的更新的K线
+        pushed = [row for row in self.candles.get(key, []) if not rows or int(row[0]) >= int(rows[0][0])]
+        self.candles[key] = list(rows[:self.max_candles])
+        self._stale_candles.discard(key)
+        if pushed:
+            self._merge_candles(symbol, bar, pushed)
+
+    def _merge_candles(self, symbol: str, bar: str, rows: List[List[str]]) -> bool:
+        """合并推送的K线，返回是否出现了新的一根K线"""
+        candles = self.candles.setdefault((symbol, bar), [])
+        new_bar = False
+        for row in sorted(rows, key=lambda r: int(r[0])):
+            ts = int(row[0])
+            if candles and int(candles[0][0]) == ts:
+                candles[0] = row
+            elif not candles or ts > int(candles[0][0]):
+                candles.insert(0, row)
+                new_bar = True
+        del candles[self.max_candles:]
+        return new_bar
+
+    def _on_message(self, arg: Dict[str, str], data: List[Any], action: Optional[str] = None):
+        channel = arg.get("channel", "")
+        inst_id = arg.get("instId", "")
+        if channel == "tickers":
+            if not data:
+                return
+            self.tickers[inst_id] = data[-1]
+        elif channel in ("books", "books5"):
+            if not self._apply_books(inst_id, data, action):
+                return
+            data = self.books[inst_id]
+        elif channel.startswith("candle"):
+            bar = channel[len("candle"):]
+            new_bar = self._merge_candles(inst_id, bar, data)
+            data = {"bar": bar, "new_bar": new_bar, "rows": data}
+        else:
+            return
+        self.last_update[inst_id] = time.time()
+        for callback in self._listeners:
+            try:
+                callback(channel, inst_id, data)
+            except Exception as e:
+                logger.error(f"行情监听回调错误: {str(e)}")
+
+    def get_ticker(self, symbol: str) -> Optional[Dict[str, Any]]:
+        return self.tickers.get(symbol)
+
+    def get_candles(self, symbol: str, bar: str = "1m") -> List[List[str]]:
+        return self.candles.get((symbol, bar), [])
+
+    def get_book(self, symbol: str) -> Optional[OrderBook]:
+        """返回有效的订单簿，未订阅或等待重新同步时返回 None"""
+        book = self.books.get(symbol)
+        return book if book is not None and book.valid else None
+
+    def is_connected(self, symbol: str) -> bool:
+        """该交易对的全部订阅所在连接是否都已连接"""
+        connections = [
+            c for kind in self._connections.values() for c in kind
+            if any(key[1] == symbol for key in c.subscriptions)
+        ]
+        return bool(connections) and all(c.is_connected for c in connections)
+
+    def is_fresh(self, symbol: str, max_age: float = 30) -> bool:
+        """推送数据是否可用：连接正常、已有行情和完整的K线，且最近 max_age 秒内有更新"""
+        return (
+            self.is_connected(symbol)
+            and symbol in self.tickers
+            and any(key[0] == symbol and rows for key, rows in self.candles.items())
+            and not any(key[0] == symbol for key in self._stale_candles)
+            and time.time() - self.last_update.get(symbol, 0) <= max_age
+        )
+
+    async def start(self):
+        self._started = True
+        for connections in self._connections.values():
+            for connection in connections:
+                connection.start()
+
+    async def stop(self):
+        self._started = False
+        for connections in self._connections.values():
+            for connection in connections:
+                await connection.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "public_url": self.public_url,
+            "business_url": self.business_url,
+            "symbols": len(self.tickers),
+            "books": {symbol: dict(book.stats, valid=book.valid) for symbol, book in self.books.items()},
+            "connections": [c.get_stats() for kind in self._connections.values() for c in kind]
+        }
+
+
+class OKXPrivateWebSocketClient(OKXWebSocketClient):
+    """私有频道连接，建立连接后先登录再订阅"""
+
+    def __init__(self, url: str, api_key: str, secret_key: str, passphrase: str, on_message, **kwargs):
+        super().__init__(url, on_message, **kwargs)
+        self.api_key = api_key
+        self.secret_key = secret_key
+        self.passphrase = passphrase
+        self.login_timeout = 10
+
+    def _login_args(self) -> Dict[str, str]:
+        timestamp = str(int(time.time()))
+        message = timestamp + "GET" + "/users/self/verify"
+        mac = hmac.new(bytes(self.secret_key, encoding="utf8"), bytes(message, encoding="utf-8"), digestmod="sha256")
+        return {
+            "apiKey": self.api_key,
+            "passphrase": self.passphrase,
+            "timestamp": timestamp,
+            "sign": base64.b64encode(mac.digest()).decode()
+        }
+
+    async def _after_connect(self, ws):
+        await ws.send(json.dumps({"op": "login", "args": [self._login_args()]}))
+        while True:
+            message = json.loads(await asyncio.wait_for(ws.recv(), timeout=self.login_timeout))
+            if message.get("event") == "login":
+                if message.get("code") != "0":
+                    raise ConnectionError(f"登录失败: {message.get('msg')}")
+                return
+            if message.get("event") == "error":
+                raise ConnectionError(f"登录失败: {message.get('code')} {message.get('msg')}")
+
+
+class OKXAccountFeed:
+    """
+    账户推送管理器
+
+    - 登录私有频道，订阅 account、positions、orders
+    - 启动时和每次断线重连后用REST获取一次快照，之后只按推送的增量更新；
+      快照请求期间收到的推送按频道分别处理，较新的推送优先于快照
+    - account 推送按币种合并 details；positions 按 posId 合并，持仓量为0时移除；
+      orders 只保留未完成的订单
+    - 状态变化后通知监听者 callback(channel, feed)
+    """
+
+    # 终态订单不再保留
+    FINAL_ORDER_STATES = {"filled", "canceled", "mmp_canceled"}
+
+    def __init__(self, okx_client, url: Optional[str] = None, inst_type: str = "SWAP"):
+        """
+        :param okx_client: AsyncOKXClient 实例，提供API凭证和REST快照
+        :param inst_type: 订阅的持仓产品类型，与 get_positions 一致
+        """
+        self.okx_client = okx_client
+        is_test = os.environ.get("OKX_IS_TEST", "True").lower() == "true"
+        self.url = url or os.environ.get("OKX_WS_PRIVATE_URL", DEMO_PRIVATE_WS_URL if is_test else PRIVATE_WS_URL)
+        self.inst_type = inst_type
+        self.connection = OKXPrivateWebSocketClient(
+            self.url, okx_client.api_key, okx_client.secret_key, okx_client.passphrase,
+            self._on_message, name="private", on_reconnected=self._on_reconnected
+        )
+        self._listeners: List[Callable[[str, "OKXAccountFeed"], None]] = []
+
+        self.account: Dict[str, Any] = {}
+        self._positions: Dict[str, Dict[str, Any]] = {}
+        self.orders: Dict[str, Dict[str, Any]] = {}
+        self.last_orders: List[Dict[str, Any]] = []  # 最近一次 orders 推送的订单（含终态订单）
+        self.last_update = 0.0
+        self._snapshot_ready = False
+        self._push_counts = {"account": 0, "positions": 0, "orders": 0}  # 按频道统计的推送次数
+        self._snapshot_pushes: Optional[Dict[str, Dict[str, Any]]] = None  # 快照请求期间推送的持仓
+        self._snapshot_task: Optional[asyncio.Task] = None
+        self.snapshot_retry_interval = 5.0
+        self.stats = {"snapshots": 0, "pushes": 0}
+
+    def add_listener(self, callback: Callable[[str, "OKXAccountFeed"], None]):
+        self._listeners.append(callback)
+
+    @property
+    def positions(self) -> List[Dict[str, Any]]:
+        return list(self._positions.values())
+
+    @staticmethod
+    def _position_key(position: Dict[str, Any]) -> str:
+        return position.get("posId") or f"{position.get('instId')}_{position.get('posSide', 'net')}"
+
+    def is_ready(self) -> bool:
+        """连接正常且已加载快照，此时推送数据可替代REST轮询"""
+        return self.connection.is_connected and self._snapshot_ready
+
+    def _notify(self, channel: str):
+        self.last_update = time.time()
+        for callback in self._listeners:
+            try:
+                callback(channel, self)
+            except Exception as e:
+                logger.error(f"账户监听回调错误: {str(e)}")
+
+    def _apply_account(self, data: Dict[str, Any]):
+        details = {d.get("ccy"): d for d in self.account.get("details", [])}
+        for detail in data.get("details", []):
+            details[detail.get("ccy")] = detail
+        self.account = dict(data, details=list(details.values()))
+
+    @staticmethod
+    def _is_closed(position: Dict[str, Any]) -> bool:
+        return position.get("pos") in (None, "", "0")
+
+    @staticmethod
+    def _update_time(position: Dict[str, Any]) -> int:
+        try:
+            return int(position.get("uTime") or 0)
+        except (TypeError, ValueError):
+            return 0
+
+    def _apply_positions(self, positions: List[Dict[str, Any]]):
+        for position in positions:
+            key = self._position_key(position)
+            if self._snapshot_pushes is not None:
+                self._snapshot_pushes[key] = position
+            if self._is_closed(position):
+                self._positions.pop(key, None)
+            else:
+                self._positions[key] = position
+
+    def _apply_positions_snapshot(self, positions: List[Dict[str, Any]], requested_at_ms: int):
+        """
+        以快照整体替换持仓，断线期间已平仓的持仓随之移除
+
+        快照请求期间推送的持仓比快照中同一持仓更新（uTime 更大）时保留推送；
+        快照中没有的持仓只保留请求发出后才更新的推送
+        """
+        replaced = {}
+        for position in positions:
+            if not self._is_closed(position):
+                replaced[self._position_key(position)] = position
+        for key, pushed in (self._snapshot_pushes or {}).items():
+            current = replaced.get(key)
+            reference = self._update_time(current) if current is not None else requested_at_ms
+            if self._update_time(pushed) <= reference:
+                continue
+            if self._is_closed(pushed):
+                replaced.pop(key, None)
+            else:
+                replaced[key] = pushed
+        self._positions = replaced
+
+    def _apply_orders(self, orders: List[Dict[str, Any]]):
+        self.last_orders = orders
+        for order in orders:
+            if order.get("state") in self.FINAL_ORDER_STATES:
+                self.orders.pop(order.get("ordId"), None)
+            else:
+                self.orders[order.get("ordId")] = order
+
+    def _on_message(self, arg: Dict[str, str], data: List[Any], action: Optional[str] = None):
+        channel = arg.get("channel")
+        self.stats["pushes"] += 1
+        if channel in self._push_counts:
+            self._push_counts[channel] += 1
+        if channel == "account":
+            for item in data:
+                self._apply_account(item)
+        elif channel == "positions":
+            self._apply_positions(data)
+        elif channel == "orders":
+            self._apply_orders(data)
+        else:
+            return
+        self._notify(channel)
+
+    async def refresh_snapshot(self) -> bool:
+        """
+        用REST获取账户和持仓快照，成功应用后才标记为就绪
+
+        账户：请求期间收到 account 推送时以推送为准；持仓：以快照替换，请求期间更新的推送优先。
+        失败时保持未就绪（继续REST轮询），稍后重试。
+        """
+        self._snapshot_ready = False
+        account_pushes = self._push_counts["account"]
+        requested_at_ms = int(time.time() * 1000)
+        self._snapshot_pushes = {}
+        try:
+            self.okx_client.invalidate_cache("account_balance")
+            self.okx_client.invalidate_cache("positions")
+            account_data, positions_data = await asyncio.gather(
+                self.okx_client.get_account_balance(),
+                self.okx_client.get_positions()
+            )
+            if not account_data.get("success", False) or not positions_data.get("success", False):
+                logger.warning(f"获取账户快照失败，将继续使用REST轮询，{self.snapshot_retry_interval} 秒后重试")
+                self._schedule_snapshot(self.snapshot_retry_interval)
+                return False
+            if self._push_counts["account"] == account_pushes:
+                self.account = account_data.get("data", {})
+            self._apply_positions_snapshot(positions_data.get("data", []), requested_at_ms)
+        finally:
+            self._snapshot_pushes = None
+        self._snapshot_ready = True
+        self.stats["snapshots"] += 1
+        self._notify("snapshot")
+        return True
+
+    def _schedule_snapshot(self, delay: float = 0):
+        current = asyncio.current_task()
+        if self._snapshot_task is not None and self._snapshot_task is not current and not self._snapshot_task.done():
+            self._snapshot_task.cancel()
+
+        async def refresh():
+            if delay:
+                await asyncio.sleep(delay)
+            await self.refresh_snapshot()
+        self._snapshot_task = asyncio.create_task(refresh())
+
+    def _on_reconnected(self, connection: OKXWebSocketClient):
+        # 断线期间可能漏掉推送，重新获取快照
+        self._snapshot_ready = False
+        self._schedule_snapshot()
+
+    async def start(self):
+        await self.connection.subscribe([
+            {"channel": "account"},
+            {"channel": "positions", "instType": self.inst_type},
+            {"channel": "orders", "instType": "ANY"},
+        ])
+        self.connection.start()
+        await self.refresh_snapshot()
+
+    async def stop(self):
+        if self._snapshot_task is not None:
+            self._snapshot_task.cancel()
+        await self.connection.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "ready": self.is_ready(),
+            "positions": len(self._positions),
+            "open_orders": len(self.orders),
+            "last_update": self.last_update,
+            **self.stats,
+            "connection": self.connection.get_stats()
+        }
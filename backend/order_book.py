@@ -0,0 +1,163 @@
+import bisect
+import zlib
+from typing import Optional, Dict, Any, List, Tuple
+
+# 校验和使用买卖各前25档
+CHECKSUM_LEVELS = 25
+
+
+class _BookSide:
+    """
+    订单簿的一侧，按价格排序的数组
+
+    keys 为排序键（卖盘为价格，买盘为负价格），两侧都按 keys 升序存放，下标0即最优价。
+    查找用二分，插入删除为数组移动；OKX深度最多400档，数组移动的开销很小。
+    levels 保存原始的价格和数量字符串，校验和需要使用交易所原样的字符串。
+    """
+
+    __slots__ = ("descending", "keys", "levels")
+
+    def __init__(self, descending: bool):
+        self.descending = descending
+        self.keys: List[float] = []
+        self.levels: List[Tuple[str, str]] = []
+
+    def _key(self, price: str) -> float:
+        return -float(price) if self.descending else float(price)
+
+    def clear(self):
+        self.keys = []
+        self.levels = []
+
+    def load(self, levels: List[List[str]]):
+        """加载快照，OKX快照已按最优价在前排序"""
+        self.levels = [(level[0], level[1]) for level in levels if float(level[1]) != 0]
+        self.keys = [self._key(price) for price, _ in self.levels]
+        if any(self.keys[i] > self.keys[i + 1] for i in range(len(self.keys) - 1)):
+            order = sorted(range(len(self.keys)), key=self.keys.__getitem__)
+            self.keys = [self.keys[i] for i in order]
+            self.levels = [self.levels[i] for i in order]
+
+    def update(self, price: str, size: str):
+        """更新一档，数量为0时删除该档"""
+        key = self._key(price)
+        index = bisect.bisect_left(self.keys, key)
+        exists = index < len(self.keys) and self.keys[index] == key
+        if float(size) == 0:
+            if exists:
+                del self.keys[index]
+                del self.levels[index]
+        elif exists:
+            self.levels[index] = (price, size)
+        else:
+            self.keys.insert(index, key)
+            self.levels.insert(index, (price, size))
+
+
+class OrderBook:
+    """
+    单个交易对的L2订单簿
+
+    - apply_snapshot / apply_update 处理OKX books 频道的快照和增量
+    - 每次更新后按交易所规则计算CRC32校验和，与推送中的 checksum 不一致或 seqId 不连续时标记为失效，
+      由调用方重新订阅获取快照
+    - 最优买卖价和前N档深度直接取数组头部
+    """
+
+    def __init__(self, symbol: str):
+        self.symbol = symbol
+        self.bids = _BookSide(descending=True)
+        self.asks = _BookSide(descending=False)
+        self.seq_id: Optional[int] = None
+        self.ts = 0
+        self.valid = False
+        self.stats = {"snapshots": 0, "updates": 0, "checksum_errors": 0, "sequence_errors": 0}
+
+    def checksum(self) -> int:
+        """按OKX规则计算校验和：买卖前25档交替拼接 价格:数量，取CRC32的有符号值"""
+        parts = []
+        bids = self.bids.levels[:CHECKSUM_LEVELS]
+        asks = self.asks.levels[:CHECKSUM_LEVELS]
+        for i in range(max(len(bids), len(asks))):
+            if i < len(bids):
+                parts.extend(bids[i])
+            if i < len(asks):
+                parts.extend(asks[i])
+        crc = zlib.crc32(":".join(parts).encode())
+        return crc - (1 << 32) if crc >= (1 << 31) else crc
+
+    def _verify(self, data: Dict[str, Any]) -> bool:
+        expected = data.get("checksum")
+        if expected is not None and self.checksum() != int(expected):
+            self.stats["checksum_errors"] += 1
+            self.valid = False
+            return False
+        return True
+
+    def apply_snapshot(self, data: Dict[str, Any]) -> bool:
+        """加载快照，返回校验是否通过"""
+        self.bids.load(data.get("bids", []))
+        self.asks.load(data.get("asks", []))
+        self.seq_id = int(data["seqId"]) if data.get("seqId") is not None else None
+        self.ts = int(data.get("ts", 0))
+        self.stats["snapshots"] += 1
+        self.valid = True
+        return self._verify(data)
+
+    def apply_update(self, data: Dict[str, Any]) -> bool:
+        """应用增量，返回订单簿是否仍然有效"""
+        if not self.valid:
+            return False
+        prev_seq_id = data.get("prevSeqId")
+        if self.seq_id is not None and prev_seq_id is not None and int(prev_seq_id) != -1 \
+                and int(prev_seq_id) != self.seq_id:
+            self.stats["sequence_errors"] += 1
+            self.valid = False
+            return False
+        for price, size, *_ in data.get("bids", []):
+            self.bids.update(price, size)
+        for price, size, *_ in data.get("asks", []):
+            self.asks.update(price, size)
+        if data.get("seqId") is not None:
+            self.seq_id = int(data["seqId"])
+        self.ts = int(data.get("ts", self.ts))
+        self.stats["updates"] += 1
+        return self._verify(data)
+
+    @property
+    def best_bid(self) -> Optional[float]:
+        return -self.bids.keys[0] if self.bids.keys else None
+
+    @property
+    def best_ask(self) -> Optional[float]:
+        return self.asks.keys[0] if self.asks.keys else None
+
+    @property
+    def mid(self) -> Optional[float]:
+        if not self.bids.keys or not self.asks.keys:
+            return None
+        return (self.asks.keys[0] - self.bids.keys[0]) / 2
+
+    @property
+    def spread(self) -> Optional[float]:
+        if not self.bids.keys or not self.asks.keys:
+            return None
+        return self.asks.keys[0] + self.bids.keys[0]
+
+    def depth(self, levels: int = 5) -> Dict[str, List[List[float]]]:
+        """返回买卖前 levels 档 [价格, 数量]，最优价在前"""
+        return {
+            "bids": [[float(price), float(size)] for price, size in self.bids.levels[:levels]],
+            "asks": [[float(price), float(size)] for price, size in self.asks.levels[:levels]]
+        }
+
+    def summary(self, levels: int = 5) -> Dict[str, Any]:
+        """供策略使用的订单簿摘要"""
+        return {
+            "best_bid": self.best_bid,
+            "best_ask": self.best_ask,
+            "mid": self.mid,
+            "spread": self.spread,
+            "ts": self.ts,
+            **self.depth(levels)
+        }
@@ -0,0 +1,345 @@
+import asyncio
+import collections
+import itertools
+import logging
+import time
+from typing import Optional, Dict, Any, List, Tuple, Callable, Set
+
+logger = logging.getLogger("OrderManager")
+
+# 订单状态：pending 已入队，submitted 已发送未确认，unknown 请求失败、结果未知（按 clOrdId 查询确认）；
+# 其余为交易所状态，rejected 为交易所拒单
+FINAL_STATES = {"filled", "canceled", "mmp_canceled", "rejected"}
+
+
+class OrderManager:
+    """
+    异步订单管理（OMS）
+
+    - 策略动作经有界队列交给后台任务执行，队列满时 submit 等待（背压），策略循环不等待交易所回报
+    - 后台任务每次取出队列中的全部请求，合并为批量下单/撤单
+    - 每个订单在入队时分配 clOrdId，订单状态按 clOrdId 保存，并按 ordId、策略、交易对建立索引，
+      open_orders(策略ID) 等查询只访问对应索引
+    - 订单状态由私有频道 orders 推送更新；推送不可用时定期轮询 /trade/orders-pending，
+      不在挂单中的未完成订单再按 clOrdId 逐个查询最终状态
+    - 状态变化时通知监听者 callback(event, record)，event 为 ack/reject/fill/final
+    """
+
+    def __init__(self, okx_client, account_feed=None, tag: str = "", queue_size: int = 1000,
+                 poll_interval: float = 2.0, history: int = 1000):
+        """
+        :param okx_client: AsyncOKXClient 实例
+        :param account_feed: OKXAccountFeed，可用时以 orders 推送更新订单状态
+        :param tag: 订单标签，同时作为 clOrdId 前缀
+        :param queue_size: 待执行请求队列的上限
+        :param poll_interval: 推送不可用时轮询未完成订单的间隔（秒）
+        :param history: 保留的已完成订单数
+        """
+        self.okx_client = okx_client
+        self.account_feed = account_feed
+        if account_feed is not None:
+            account_feed.add_listener(self._on_account_update)
+        self.tag = tag
+        self.poll_interval = poll_interval
+        # 请求在 start() 之前也可以入队，启动后执行
+        self._queue = asyncio.Queue(maxsize=queue_size)
+        # clOrdId 只允许字母和数字，最长32位：标签 + 启动时间（36进制）+ 序号
+        self._prefix = f"{tag}{self._base36(int(time.time()))}"
+        self._sequence = itertools.count(1)
+        self._tasks: List[asyncio.Task] = []
+        self._listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+
+        self._orders: Dict[str, Dict[str, Any]] = {}  # {clOrdId: 订单记录}，只包含未完成的订单
+        self._by_ord_id: Dict[str, str] = {}  # {ordId: clOrdId}
+        self._by_strategy: Dict[str, Set[str]] = {}  # {策略ID: {clOrdId}}
+        self._by_symbol: Dict[str, Set[str]] = {}  # {交易对: {clOrdId}}
+        self._finished = collections.OrderedDict()  # 最近完成的订单 {clOrdId: 订单记录}
+        self._history = history
+        self.stats = {"submitted": 0, "acked": 0, "rejected": 0, "filled": 0, "canceled": 0,
+                      "cancel_requests": 0, "batches": 0, "polls": 0, "queue_full": 0}
+
+    @staticmethod
+    def _base36(value: int) -> str:
+        digits = "0123456789abcdefghijklmnopqrstuvwxyz"
+        text = ""
+        while value:
+            value, remainder = divmod(value, 36)
+            text = digits[remainder] + text
+        return text or "0"
+
+    def add_listener(self, callback: Callable[[str, Dict[str, Any]], None]):
+        self._listeners.append(callback)
+
+    def _notify(self, event: str, record: Dict[str, Any]):
+        for callback in self._listeners:
+            try:
+                callback(event, record)
+            except Exception as e:
+                logger.error(f"订单监听回调错误: {str(e)}")
+
+    def next_client_order_id(self) -> str:
+        return f"{self._prefix}{next(self._sequence)}"[:32]
+
+    async def submit(self, order: Dict[str, Any], owners: List[Tuple[str, Dict]],
+                     signaled_at: Optional[Dict[str, float]] = None) -> str:
+        """
+        提交下单请求，返回 clOrdId；队列满时等待
+        :param order: /trade/order 参数
+        :param owners: [(策略ID, 原动作)]，轧差后的一笔订单可能对应多个策略
+        :param signaled_at: {策略ID: 产生信号时的 perf_counter}
+        """
+        order = dict(order)
+        cl_ord_id = order.setdefault("clOrdId", self.next_client_order_id())
+        record = {
+            "clOrdId": cl_ord_id,
+            "ordId": "",
+            "instId": order.get("instId"),
+            "side": order.get("side"),
+            "ordType": order.get("ordType"),
+            "sz": order.get("sz"),
+            "px": order.get("px", ""),
+            "state": "pending",
+            "accFillSz": "0",
+            "avgPx": "",
+            "owners": owners,
+            "strategies": sorted({strategy_id for strategy_id, _ in owners}),
+            "signaled_at": signaled_at or {},
+            "created": time.time(),
+            "updated": time.time(),
+            "msg": ""
+        }
+        self._index(record)
+        await self._put(("place", order, record))
+        self.stats["submitted"] += 1
+        return cl_ord_id
+
+    async def cancel(self, inst_id: str, ord_id: Optional[str] = None, cl_ord_id: Optional[str] = None,
+                     owners: Optional[List[Tuple[str, Dict]]] = None):
+        """提交撤单请求，ordId 和 clOrdId 二选一"""
+        cancel = {"instId": inst_id}
+        if ord_id:
+            cancel["ordId"] = ord_id
+        else:
+            cancel["clOrdId"] = cl_ord_id
+        await self._put(("cancel", cancel, owners or []))
+        self.stats["cancel_requests"] += 1
+
+    async def _put(self, item):
+        if self._queue.full():
+            self.stats["queue_full"] += 1
+        await self._queue.put(item)
+
+    def _index(self, record: Dict[str, Any]):
+        cl_ord_id = record["clOrdId"]
+        self._orders[cl_ord_id] = record
+        for strategy_id in record["strategies"]:
+            self._by_strategy.setdefault(strategy_id, set()).add(cl_ord_id)
+        self._by_symbol.setdefault(record["instId"], set()).add(cl_ord_id)
+
+    def _unindex(self, record: Dict[str, Any]):
+        cl_ord_id = record["clOrdId"]
+        self._orders.pop(cl_ord_id, None)
+        self._by_ord_id.pop(record.get("ordId"), None)
+        for index, key in [(self._by_strategy, strategy_id) for strategy_id in record["strategies"]] \
+                + [(self._by_symbol, record["instId"])]:
+            keys = index.get(key)
+            if keys is not None:
+                keys.discard(cl_ord_id)
+                if not keys:
+                    del index[key]
+        self._finished[cl_ord_id] = record
+        while len(self._finished) > self._history:
+            self._finished.popitem(last=False)
+
+    def get_order(self, cl_ord_id: Optional[str] = None, ord_id: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """按 clOrdId 或 ordId 查询订单（含最近完成的订单）"""
+        if cl_ord_id is None and ord_id is not None:
+            cl_ord_id = self._by_ord_id.get(ord_id)
+            if cl_ord_id is None:
+                return next((r for r in self._finished.values() if r["ordId"] == ord_id), None)
+        return self._orders.get(cl_ord_id) or self._finished.get(cl_ord_id)
+
+    def open_orders(self, strategy_id: Optional[str] = None, symbol: Optional[str] = None) -> List[Dict[str, Any]]:
+        """未完成的订单，可按策略和交易对过滤"""
+        if strategy_id is not None:
+            keys = self._by_strategy.get(strategy_id, ())
+            if symbol is not None:
+                keys = [key for key in keys if key in self._by_symbol.get(symbol, ())]
+        elif symbol is not None:
+            keys = self._by_symbol.get(symbol, ())
+        else:
+            keys = self._orders.keys()
+        return [self._orders[key] for key in keys]
+
+    def start(self):
+        self._tasks = [asyncio.create_task(self._run()), asyncio.create_task(self._poll())]
+
+    async def stop(self):
+        """停止后台任务，尚未发送的请求丢弃"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        dropped = self._queue.qsize()
+        if dropped:
+            logger.warning(f"订单管理停止，丢弃 {dropped} 个未发送的请求")
+
+    async def _run(self):
+        while True:
+            items = [await self._queue.get()]
+            while not self._queue.empty():
+                items.append(self._queue.get_nowait())
+            try:
+                await self._execute(items)
+            except Exception as e:
+                logger.error(f"执行订单请求错误: {str(e)}")
+
+    async def _execute(self, items):
+        """同一批请求合并为批量下单和批量撤单，并发提交"""
+        places = [(order, record) for kind, order, record in items if kind == "place"]
+        cancels = [(cancel, owners) for kind, cancel, owners in items if kind == "cancel"]
+        requests = []
+        if places:
+            for _, record in places:
+                record["state"] = "submitted"
+            requests.append(self.okx_client.place_orders([order for order, _ in places]))
+        if cancels:
+            requests.append(self.okx_client.cancel_orders([cancel for cancel, _ in cancels]))
+        results = list(await asyncio.gather(*requests))
+        self.stats["batches"] += 1
+
+        if places:
+            items = results.pop(0).get("data") or []
+            for index, (_, record) in enumerate(places):
+                item = items[index] if index < len(items) else {"sCode": "-1", "sMsg": "缺少下单结果"}
+                self._apply_ack(record, item)
+        if cancels:
+            items = results.pop(0).get("data") or []
+            for index, (cancel, owners) in enumerate(cancels):
+                item = items[index] if index < len(items) else {"sCode": "-1", "sMsg": "缺少撤单结果"}
+                record = self.get_order(cancel.get("clOrdId"), cancel.get("ordId"))
+                event = {"clOrdId": cancel.get("clOrdId", ""), "ordId": cancel.get("ordId", ""),
+                         "instId": cancel["instId"], "owners": owners, "sCode": item.get("sCode"),
+                         "msg": item.get("sMsg", ""), "order": record}
+                self._notify("cancel", event)
+
+    def _apply_ack(self, record: Dict[str, Any], item: Dict[str, Any]):
+        record["updated"] = time.time()
+        record["msg"] = item.get("sMsg", "")
+        code = item.get("sCode")
+        if code == "0":
+            record["ordId"] = item.get("ordId", "") or record["ordId"]
+            if record["ordId"] and record["clOrdId"] in self._orders:
+                self._by_ord_id[record["ordId"]] = record["clOrdId"]
+            # 推送可能先于下单回报到达，已更新的状态不回退
+            if record["state"] == "submitted":
+                record["state"] = "live"
+            self.stats["acked"] += 1
+            self._notify("ack", record)
+            if record["state"] in FINAL_STATES:
+                self._finish(record)
+        elif code == "-1":
+            # 整批请求失败（网络错误等），订单可能已到达交易所，由轮询按 clOrdId 确认
+            record["state"] = "unknown"
+            logger.warning(f"订单 {record['clOrdId']} 下单结果未知: {record['msg']}")
+        else:
+            record["state"] = "rejected"
+            self.stats["rejected"] += 1
+            self._notify("reject", record)
+            self._finish(record)
+
+    def _finish(self, record: Dict[str, Any]):
+        if record["clOrdId"] not in self._orders:
+            return
+        if record["state"] == "filled":
+            self.stats["filled"] += 1
+        elif record["state"] in ("canceled", "mmp_canceled"):
+            self.stats["canceled"] += 1
+        self._unindex(record)
+        self._notify("final", record)
+
+    def apply_updates(self, orders: List[Dict[str, Any]]):
+        """用推送或查询得到的交易所订单更新状态，不是本管理器提交的订单忽略"""
+        for order in orders:
+            cl_ord_id = order.get("clOrdId") or self._by_ord_id.get(order.get("ordId"))
+            record = self._orders.get(cl_ord_id)
+            if record is None:
+                continue
+            if order.get("ordId") and not record["ordId"]:
+                record["ordId"] = order["ordId"]
+                self._by_ord_id[order["ordId"]] = cl_ord_id
+            if record["state"] == "unknown":
+                # 结果未知的订单查询到后视为下单成功
+                self.stats["acked"] += 1
+                self._notify("ack", record)
+            filled_before = float(record["accFillSz"] or 0)
+            record["state"] = order.get("state", record["state"])
+            record["accFillSz"] = order.get("accFillSz") or record["accFillSz"]
+            record["avgPx"] = order.get("avgPx") or record["avgPx"]
+            record["updated"] = time.time()
+            if float(record["accFillSz"] or 0) > filled_before:
+                self._notify("fill", record)
+            if record["state"] in FINAL_STATES:
+                self._finish(record)
+
+    def _on_account_update(self, channel, feed):
+        if channel == "orders":
+            self.apply_updates(feed.last_orders)
+
+    def _push_ready(self) -> bool:
+        return self.account_feed is not None and self.account_feed.is_ready()
+
+    async def _poll(self):
+        """推送不可用时轮询未完成订单；结果未知的订单无论推送是否可用都需要查询"""
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                await self.reconcile(full=not self._push_ready())
+            except Exception as e:
+                logger.error(f"同步订单状态错误: {str(e)}")
+
+    async def reconcile(self, full: bool = True):
+        """
+        同步订单状态：full 时一次分页请求全部挂单，已发送超过一个轮询间隔、却不在挂单中的订单逐个查询；
+        否则只查询下单结果未知的订单
+        """
+        now = time.time()
+        candidates = [record for record in self._orders.values() if record["state"] == "unknown"]
+        if full and any(record["state"] not in ("pending", "submitted") for record in self._orders.values()):
+            pending = await self.okx_client.get_pending_orders()
+            self.stats["polls"] += 1
+            if not pending.get("success", False):
+                return
+            self.apply_updates(pending.get("data", []))
+            live = {order.get("clOrdId") for order in pending.get("data", [])}
+            candidates += [
+                record for record in self._orders.values()
+                if record["state"] not in ("pending", "submitted", "unknown") and record["clOrdId"] not in live
+                and now - record["updated"] >= self.poll_interval
+            ]
+        if not candidates:
+            return
+        results = await asyncio.gather(*[
+            self.okx_client.get_order(record["instId"], cl_ord_id=record["clOrdId"]) for record in candidates
+        ])
+        for record, result in zip(candidates, results):
+            if result.get("success", False) and result.get("data"):
+                self.apply_updates(result["data"])
+            elif record["state"] == "unknown" and now - record["created"] >= 60:
+                # 长时间查询不到，视为未到达交易所
+                record["state"] = "rejected"
+                record["msg"] = result.get("msg", "")
+                self.stats["rejected"] += 1
+                self._notify("reject", record)
+                self._finish(record)
+
+    def get_stats(self) -> Dict[str, Any]:
+        states = collections.Counter(record["state"] for record in self._orders.values())
+        return {
+            "queued": self._queue.qsize(),
+            "open": len(self._orders),
+            "states": dict(states),
+            "strategies": len(self._by_strategy),
+            "push": self._push_ready(),
+            **self.stats
+        }
@@ -0,0 +1,297 @@
+import asyncio
+import heapq
+import itertools
+import threading
+import time
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, Any, Tuple
+
+# 请求优先级，数值越小越优先
+PRIORITY_HIGH = 0     # 下单、撤单
+PRIORITY_NORMAL = 1   # 行情、账户轮询
+PRIORITY_LOW = 2      # 回测、历史数据
+
+# OKX各接口的限速：(请求数, 时间窗口秒)
+# 参考 https://www.okx.com/docs-v5/ 中各接口的"限速"说明
+DEFAULT_RATE_LIMITS = {
+    "/market/ticker": (20, 2),
+    "/market/tickers": (20, 2),
+    "/market/candles": (40, 2),
+    "/market/history-candles": (20, 2),
+    "/market/books": (40, 2),
+    "/public/instruments": (20, 2),
+    "/account/balance": (10, 2),
+    "/account/positions": (10, 2),
+    "/trade/order": (60, 2),
+    "/trade/cancel-order": (60, 2),
+    # 批量接口按订单数限速（300个/2秒），每个请求最多20个订单，按请求数折算为15次/2秒
+    "/trade/batch-orders": (15, 2),
+    "/trade/cancel-batch-orders": (15, 2),
+    "/trade/orders-pending": (60, 2),
+}
+
+
+class TokenBucket:
+    """
+    令牌桶，按固定速率补充令牌
+
+    线程安全，同步客户端（线程中）和异步客户端（事件循环中）可共享同一个桶。
+    """
+
+    def __init__(self, rate: float, capacity: float):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 桶容量，即允许的最大突发请求数
+        """
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now: float):
+        elapsed = now - self.updated
+        if elapsed > 0:
+            self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+            self.updated = now
+
+    def try_consume(self, tokens: float = 1) -> float:
+        """
+        尝试取出令牌
+
+        :return: 0 表示成功取到令牌，否则为需要等待的秒数
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._refill(now)
+            if self.tokens >= tokens:
+                self.tokens -= tokens
+                return 0
+            return (tokens - self.tokens) / self.rate
+
+    def drain(self):
+        """清空令牌，收到429时使用，让后续请求重新等待一个补充周期"""
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens = 0
+
+
+class _PriorityLane:
+    """按优先级排队的等待队列，同一时刻只有队首请求可以取令牌"""
+
+    def __init__(self):
+        self.waiters = []
+        self.cond = asyncio.Condition()
+
+    def remove(self, entry):
+        try:
+            self.waiters.remove(entry)
+            heapq.heapify(self.waiters)
+        except ValueError:
+            pass
+
+
+class RequestScheduler:
+    """
+    OKX请求调度器
+
+    - 每个接口族（如 /market/candles、/trade/order）一个令牌桶，按OKX的限速配置
+    - 所有请求共享一个并发上限，超过上限时按优先级排队
+    - 下单撤单使用高优先级通道，在队列中排在行情轮询之前
+    - 提供队列深度和限流等待时间统计
+    """
+
+    def __init__(self, rate_limits: Optional[Dict[str, Tuple[float, float]]] = None,
+                 default_limit: Tuple[float, float] = (10, 2), max_concurrency: int = 10):
+        """
+        :param rate_limits: {接口族: (请求数, 时间窗口秒)}，未配置的接口族使用 default_limit
+        :param default_limit: 默认限速
+        :param max_concurrency: 同时进行中的请求上限
+        """
+        self.rate_limits = dict(DEFAULT_RATE_LIMITS)
+        if rate_limits:
+            self.rate_limits.update(rate_limits)
+        self.default_limit = default_limit
+        self.max_concurrency = max_concurrency
+
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._lanes: Dict[str, _PriorityLane] = {}
+        self._buckets_lock = threading.Lock()
+        self._seq = itertools.count()
+
+        self._in_flight = 0
+        self._concurrency_lane: Optional[_PriorityLane] = None
+
+        self._stats: Dict[str, Dict[str, Any]] = {}
+
+    @staticmethod
+    def get_family(request_path: str) -> str:
+        """从请求路径中提取接口族，如 /api/v5/market/candles?instId=... -> /market/candles"""
+        path = request_path.split("?", 1)[0]
+        if path.startswith("/api/v5"):
+            path = path[len("/api/v5"):]
+        if not path.startswith("/"):
+            path = "/" + path
+        return path
+
+    @staticmethod
+    def default_priority(family: str) -> int:
+        """交易类接口默认使用高优先级"""
+        return PRIORITY_HIGH if family.startswith("/trade/") else PRIORITY_NORMAL
+
+    def _get_bucket(self, family: str) -> TokenBucket:
+        bucket = self._buckets.get(family)
+        if bucket is None:
+            with self._buckets_lock:
+                bucket = self._buckets.get(family)
+                if bucket is None:
+                    count, window = self.rate_limits.get(family, self.default_limit)
+                    bucket = TokenBucket(rate=count / window, capacity=count)
+                    self._buckets[family] = bucket
+        return bucket
+
+    def _get_lane(self, family: str) -> _PriorityLane:
+        lane = self._lanes.get(family)
+        if lane is None:
+            lane = _PriorityLane()
+            self._lanes[family] = lane
+        return lane
+
+    def _get_family_stats(self, family: str) -> Dict[str, Any]:
+        stats = self._stats.get(family)
+        if stats is None:
+            stats = {
+                "requests": 0,
+                "throttled": 0,
+                "rate_limited_429": 0,
+                "wait_total": 0.0,
+                "wait_max": 0.0,
+            }
+            self._stats[family] = stats
+        return stats
+
+    def _record_wait(self, family: str, waited: float):
+        stats = self._get_family_stats(family)
+        stats["requests"] += 1
+        if waited > 0.001:
+            stats["throttled"] += 1
+        stats["wait_total"] += waited
+        stats["wait_max"] = max(stats["wait_max"], waited)
+
+    async def _wait_turn(self, lane: _PriorityLane, priority: int, try_take):
+        """
+        在优先级队列中等待，直到排到队首并且 try_take() 返回0
+
+        try_take 返回需要等待的秒数；返回 None 表示需要等待其他请求释放资源
+        """
+        entry = (priority, next(self._seq))
+        async with lane.cond:
+            heapq.heappush(lane.waiters, entry)
+            # 新请求可能比当前队首优先级更高，唤醒所有等待者重新检查
+            lane.cond.notify_all()
+            try:
+                while True:
+                    timeout = None
+                    if lane.waiters[0] == entry:
+                        wait = try_take()
+                        if wait == 0:
+                            heapq.heappop(lane.waiters)
+                            lane.cond.notify_all()
+                            return
+                        timeout = wait
+                    try:
+                        await asyncio.wait_for(lane.cond.wait(), timeout)
+                    except asyncio.TimeoutError:
+                        pass
+            except BaseException:
+                lane.remove(entry)
+                lane.cond.notify_all()
+                raise
+
+    def _take_concurrency_slot(self):
+        if self._in_flight < self.max_concurrency:
+            self._in_flight += 1
+            return 0
+        return None
+
+    async def acquire(self, request_path: str, priority: Optional[int] = None) -> str:
+        """
+        等待令牌和并发名额，返回接口族；请求结束后必须调用 release()
+        """
+        family = self.get_family(request_path)
+        if priority is None:
+            priority = self.default_priority(family)
+        bucket = self._get_bucket(family)
+
+        start = time.monotonic()
+        await self._wait_turn(self._get_lane(family), priority, bucket.try_consume)
+        if self._concurrency_lane is None:
+            self._concurrency_lane = _PriorityLane()
+        await self._wait_turn(self._concurrency_lane, priority, self._take_concurrency_slot)
+        self._record_wait(family, time.monotonic() - start)
+        return family
+
+    async def release(self):
+        """释放并发名额"""
+        self._in_flight = max(0, self._in_flight - 1)
+        if self._concurrency_lane is not None:
+            async with self._concurrency_lane.cond:
+                self._concurrency_lane.cond.notify_all()
+
+    @asynccontextmanager
+    async def slot(self, request_path: str, priority: Optional[int] = None):
+        """async with scheduler.slot(path): 在限速和并发范围内发送一个请求"""
+        family = await self.acquire(request_path, priority)
+        try:
+            yield family
+        finally:
+            await self.release()
+
+    def acquire_blocking(self, request_path: str) -> str:
+        """同步客户端使用：阻塞当前线程直到取到令牌（不参与优先级排队）"""
+        family = self.get_family(request_path)
+        bucket = self._get_bucket(family)
+        start = time.monotonic()
+        while True:
+            wait = bucket.try_consume()
+            if wait == 0:
+                break
+            time.sleep(wait)
+        self._record_wait(family, time.monotonic() - start)
+        return family
+
+    def on_rate_limited(self, request_path: str):
+        """收到HTTP 429时清空对应令牌桶"""
+        family = self.get_family(request_path)
+        self._get_bucket(family).drain()
+        self._get_family_stats(family)["rate_limited_429"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取各接口族的队列深度、限流次数和等待时间"""
+        families = {}
+        for family, stats in list(self._stats.items()):
+            lane = self._lanes.get(family)
+            bucket = self._buckets.get(family)
+            families[family] = {
+                "requests": stats["requests"],
+                "throttled": stats["throttled"],
+                "rate_limited_429": stats["rate_limited_429"],
+                "queue_depth": len(lane.waiters) if lane else 0,
+                "avg_wait_ms": round(stats["wait_total"] / stats["requests"] * 1000, 3) if stats["requests"] else 0,
+                "max_wait_ms": round(stats["wait_max"] * 1000, 3),
+                "tokens": round(bucket.tokens, 2) if bucket else None,
+                "limit": self.rate_limits.get(family, self.default_limit),
+            }
+
+        queued_by_priority = {}
+        for lane in list(self._lanes.values()):
+            for priority, _ in lane.waiters:
+                queued_by_priority[priority] = queued_by_priority.get(priority, 0) + 1
+
+        return {
+            "in_flight": self._in_flight,
+            "max_concurrency": self.max_concurrency,
+            "concurrency_queue_depth": len(self._concurrency_lane.waiters) if self._concurrency_lane else 0,
+            "queued_by_priority": queued_by_priority,
+            "families": families,
+        }
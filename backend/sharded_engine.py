@@ -0,0 +1,346 @@
+import asyncio
+import logging
+import multiprocessing
+import queue
+import signal
+import time
+import zlib
+from typing import Dict, Any, List, Optional
+
+from async_okx_client import AsyncOKXClient
+from kline_buffer import TS
+from market_data_bus import MARKET_CHANNEL
+from shared_market_data import SharedMarketData, SharedMarketDataReader, DEFAULT_CAPACITY
+from strategies.strategy_factory import StrategyFactory
+from strategy_engine import StrategyEngine
+from strategy_scheduler import StrategyScheduler, strategy_trigger
+
+logger = logging.getLogger("ShardedStrategyEngine")
+
+
+def _newest_bar_ms(market_data: Optional[Dict[str, Any]]) -> Optional[int]:
+    if market_data is None or not len(market_data["kline_array"]):
+        return None
+    return int(market_data["kline_array"][0, TS])
+
+
+def _shard_main(index: int, control, results, prefix: str, interval: float):
+    """
+    分片进程主循环
+
+    控制消息: ("add", 策略ID, 类型, 名称, 描述, 参数, 运行时状态) / ("params", 策略ID, 参数) / ("remove", 策略ID)
+              / ("account", 持仓, 账户) / None（退出）
+    回报消息: ("signal", 分片, 策略ID, 策略结果, 产生时间) / ("stats", 分片, {策略ID: (增量统计, 最近运行时间, 运行时状态)})
+    """
+    # Ctrl+C 由主进程处理
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    logging.basicConfig(level=logging.INFO, format=f'%(asctime)s - shard{index} - %(name)s - %(levelname)s - %(message)s')
+    reader = SharedMarketDataReader(prefix)
+    # 与主进程相同的触发方式，策略只在 tick/bar/interval 到期时执行
+    scheduler = StrategyScheduler()
+    latest: Dict[str, Dict[str, Any]] = {}  # {symbol: 最新市场数据}
+    strategies: Dict[str, Dict[str, Any]] = {}
+    positions, account = [], {}
+    last_report = 0.0
+    while True:
+        started = time.time()
+        try:
+            while True:
+                message = control.get_nowait()
+                if message is None:
+                    reader.close()
+                    return
+                kind = message[0]
+                try:
+                    if kind == "add":
+                        _, strategy_id, strategy_type, name, description, parameters, state = message
+                        strategies[strategy_id] = {
+                            "instance": StrategyFactory.create_strategy(
+                                strategy_type=strategy_type,
+                                strategy_id=strategy_id,
+                                name=name,
+                                description=description,
+                                parameters=parameters
+                            ),
+                            "stats": {"runs": 0, "errors": 0},
+                            "last_run": 0
+                        }
+                        strategies[strategy_id]["instance"].set_state(state)
+                        scheduler.add(strategy_id, parameters["symbol"], strategy_trigger(parameters), time.time())
+                    elif kind == "params":
+                        strategy = strategies[message[1]]["instance"]
+                        strategy.update_parameters(message[2])
+                        scheduler.add(message[1], strategy.parameters["symbol"],
+                                      strategy_trigger(strategy.parameters), time.time())
+                    elif kind == "remove":
+                        strategies.pop(message[1], None)
+                        scheduler.remove(message[1])
+                    elif kind == "account":
+                        positions, account = message[1], message[2]
+                except Exception as e:
+                    logger.error(f"处理控制消息 {kind} 错误: {str(e)}")
+        except queue.Empty:
+            pass
+
+        updated = []
+        for symbol in {entry["instance"].parameters.get("symbol") for entry in strategies.values()}:
+            market_data = reader.read(symbol)
+            if market_data is not None:
+                latest[symbol] = market_data
+                updated.append(symbol)
+        for strategy_id in scheduler.collect(time.time(), updated, lambda symbol: _newest_bar_ms(latest.get(symbol))):
+            entry = strategies.get(strategy_id)
+            market_data = latest.get(entry["instance"].parameters.get("symbol")) if entry else None
+            if market_data is not None:
+                try:
+                    result = entry["instance"].execute(market_data=market_data, positions=positions, account=account)
+                    entry["stats"]["runs"] += 1
+                    entry["last_run"] = time.time()
+                    if result and "action" in result:
+                        results.put(("signal", index, strategy_id, result, time.time()))
+                except Exception as e:
+                    entry["stats"]["errors"] += 1
+                    logger.error(f"执行策略 {strategy_id} 错误: {str(e)}")
+
+        if started - last_report >= 1:
+            # 只回报上次之后的增量，分片重启后主进程的累计统计不会归零
+            report = {}
+            for strategy_id, entry in strategies.items():
+                report[strategy_id] = (dict(entry["stats"]), entry["last_run"], entry["instance"].get_state())
+                entry["stats"] = {"runs": 0, "errors": 0}
+            results.put(("stats", index, report))
+            last_report = started
+        # 按轮询间隔检查共享内存，定时触发更早到期时提前醒来
+        wakeup = scheduler.next_wakeup(time.time())
+        delay = interval - (time.time() - started)
+        time.sleep(max(0.0, min(delay, wakeup) if wakeup is not None else delay))
+
+
+class StrategyShard:
+    """一个分片进程及其控制队列"""
+
+    def __init__(self, index: int, context, results, prefix: str, interval: float):
+        self.index = index
+        self._context = context
+        self._results = results
+        self._prefix = prefix
+        self._interval = interval
+        self.process = None
+        self.control = None
+        self.started_at = 0.0
+        self.restarts = 0
+
+    def start(self):
+        # 每次启动使用新的控制队列，避免进程崩溃时留下损坏的队列状态
+        self.control = self._context.Queue()
+        self.process = self._context.Process(
+            target=_shard_main, args=(self.index, self.control, self._results, self._prefix, self._interval),
+            name=f"strategy-shard-{self.index}", daemon=True)
+        self.process.start()
+        self.started_at = time.time()
+
+    def is_alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    def send(self, message):
+        if self.control is not None:
+            self.control.put(message)
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.send(None)
+            self.process.join(timeout=2)
+        if self.process.is_alive():
+            self.process.terminate()
+            self.process.join(timeout=1)
+        self.process = None
+
+
+class ShardedStrategyEngine(StrategyEngine):
+    """
+    多进程分片的策略引擎
+
+    主进程负责行情推送/轮询、账户同步和下单，并把每个交易对的最新行情和K线写入共享内存环形缓冲区；
+    shards 个分片进程按交易对哈希分配已启用的策略，直接从共享内存读取行情执行策略，
+    交易信号经队列送回主进程，仍由 _execute_strategy_actions 合并批量下单。
+    分片进程崩溃后自动重启并重新加载其策略，运行时状态恢复为最近一次回报的状态，运行统计按增量汇总到主进程。
+    """
+
+    def __init__(self, okx_client: AsyncOKXClient, shards: int = 2, kline_capacity: int = DEFAULT_CAPACITY,
+                 poll_interval: float = 0.05, **kwargs):
+        # 主进程的 KlineRingBuffer 与共享内存使用同一容量（KLINE_BUFFER_CAPACITY）
+        super().__init__(okx_client, kline_capacity=kline_capacity, **kwargs)
+        self.poll_interval = poll_interval
+        self.shared_data = SharedMarketData(capacity=kline_capacity)
+        # 使用 spawn 启动，避免 fork 复制事件循环和线程状态
+        self._context = multiprocessing.get_context("spawn")
+        self._results = self._context.Queue()
+        self._shards = [StrategyShard(index, self._context, self._results, self.shared_data.prefix, poll_interval)
+                        for index in range(max(1, shards))]
+        self._assignments: Dict[str, int] = {}  # {策略ID: 分片序号}，只包含已启用的策略
+        self._sent_account = None
+
+    def shard_for(self, symbol: str) -> int:
+        return zlib.crc32(symbol.encode()) % len(self._shards)
+
+    def _add_message(self, strategy_id: str):
+        strategy_info = self.strategies[strategy_id]
+        strategy = strategy_info["instance"]
+        return ("add", strategy_id, strategy_info["type"], strategy.name, strategy.description, dict(strategy.parameters),
+                strategy.get_state())
+
+    def _assign(self, strategy_id: str):
+        index = self.shard_for(self.strategies[strategy_id]["instance"].parameters["symbol"])
+        self._assignments[strategy_id] = index
+        self._shards[index].send(self._add_message(strategy_id))
+
+    def _unassign(self, strategy_id: str):
+        index = self._assignments.pop(strategy_id, None)
+        if index is not None:
+            self._shards[index].send(("remove", strategy_id))
+
+    def _load_shard(self, shard: StrategyShard):
+        """分片启动后发送账户数据和分配给它的全部策略"""
+        shard.send(("account", self.positions, self.account_data))
+        for strategy_id, index in self._assignments.items():
+            if index == shard.index:
+                shard.send(self._add_message(strategy_id))
+
+    def register_strategy(self, strategy_type: str, strategy_id: str, name: str = None,
+                          description: str = None, parameters: Dict = None):
+        self._unassign(strategy_id)
+        return super().register_strategy(strategy_type, strategy_id, name, description, parameters)
+
+    def enable_strategy(self, strategy_id):
+        enabled = super().enable_strategy(strategy_id)
+        if enabled and strategy_id not in self._assignments:
+            self._assign(strategy_id)
+        return enabled
+
+    def disable_strategy(self, strategy_id: str):
+        self._unassign(strategy_id)
+        return super().disable_strategy(strategy_id)
+
+    def update_strategy_parameters(self, strategy_id, parameters):
+        result = super().update_strategy_parameters(strategy_id, parameters)
+        if result and strategy_id in self._assignments:
+            strategy = self.strategies[strategy_id]["instance"]
+            if self.shard_for(strategy.parameters["symbol"]) == self._assignments[strategy_id]:
+                self._shards[self._assignments[strategy_id]].send(("params", strategy_id, dict(strategy.parameters)))
+            else:
+                # 交易对变更后可能属于另一个分片
+                self._unassign(strategy_id)
+                self._assign(strategy_id)
+        return result
+
+    async def start(self):
+        if self.is_running:
+            logger.warning("策略引擎已在运行")
+            return
+        for shard in self._shards:
+            shard.start()
+            self._load_shard(shard)
+        await super().start()
+        asyncio.create_task(self._collect_results())
+        logger.info(f"分片策略引擎启动，{len(self._shards)} 个分片")
+
+    async def stop(self):
+        await super().stop()
+        for shard in self._shards:
+            shard.stop()
+        self.shared_data.close()
+
+    async def run_strategies(self):
+        """把总线上有更新的市场数据写入共享内存，同步账户到各分片，并重启崩溃的分片"""
+        while self.is_running:
+            updates = self.market_bus.updates_since(self._bus_version, MARKET_CHANNEL)
+            self._bus_version = self.market_bus.version
+            for symbol, _, market_data in updates:
+                self.shared_data.write(symbol, market_data)
+
+            # 账户和持仓只在对象被替换（有新数据）时发送
+            account = (self.positions, self.account_data)
+            if self._sent_account is None or account[0] is not self._sent_account[0] \
+                    or account[1] is not self._sent_account[1]:
+                for shard in self._shards:
+                    shard.send(("account",) + account)
+                self._sent_account = account
+
+            for shard in self._shards:
+                if not shard.is_alive() and time.time() - shard.started_at >= 1:
+                    exitcode = shard.process.exitcode if shard.process is not None else None
+                    logger.error(f"分片 {shard.index} 已退出（exitcode={exitcode}），正在重启")
+                    shard.stop()
+                    shard.start()
+                    shard.restarts += 1
+                    self._load_shard(shard)
+
+            await asyncio.sleep(self.poll_interval)
+
+    def _drain_results(self, timeout: float) -> List:
+        """阻塞等待回报队列，取出当前全部消息（在线程中调用）"""
+        messages = []
+        try:
+            messages.append(self._results.get(timeout=timeout))
+            while True:
+                messages.append(self._results.get_nowait())
+        except queue.Empty:
+            pass
+        return messages
+
+    async def _collect_results(self):
+        """汇总分片回报：信号合并后批量下单，运行统计按增量累加"""
+        loop = asyncio.get_running_loop()
+        while self.is_running:
+            messages = await loop.run_in_executor(None, self._drain_results, 0.5)
+            actions = []
+            signaled_at = {}
+            for message in messages:
+                if message[0] == "signal":
+                    _, _, strategy_id, result, created_at = message
+                    strategy_info = self.strategies.get(strategy_id)
+                    if strategy_info is None or not strategy_info["enabled"]:
+                        continue
+                    actions.append((strategy_id, result))
+                    # 换算为本进程的 perf_counter，用于信号到回报的延迟统计
+                    signaled_at[strategy_id] = time.perf_counter() - max(0.0, time.time() - created_at)
+                elif message[0] == "stats":
+                    for strategy_id, (stats, last_run, state) in message[2].items():
+                        strategy_info = self.strategies.get(strategy_id)
+                        if strategy_info is None:
+                            continue
+                        for name, value in stats.items():
+                            strategy_info["stats"][name] = strategy_info["stats"].get(name, 0) + value
+                        if last_run:
+                            strategy_info["last_run"] = last_run
+                        # 主进程中的实例只保存状态，用于快照和分片重启后恢复
+                        strategy_info["instance"].set_state(state)
+            if actions:
+                await self._execute_strategy_actions(actions, signaled_at)
+
+    def get_all_strategies(self):
+        result = super().get_all_strategies()
+        for strategy in result:
+            strategy["shard"] = self._assignments.get(strategy["id"])
+        return result
+
+    def get_shard_stats(self) -> Dict[str, Any]:
+        """各分片的进程状态、重启次数和策略数，以及共享内存写入统计"""
+        counts = {}
+        for index in self._assignments.values():
+            counts[index] = counts.get(index, 0) + 1
+        return {
+            "shards": [
+                {
+                    "index": shard.index,
+                    "alive": shard.is_alive(),
+                    "pid": shard.process.pid if shard.process is not None else None,
+                    "restarts": shard.restarts,
+                    "strategies": counts.get(shard.index, 0)
+                }
+                for shard in self._shards
+            ],
+            "shared_memory": self.shared_data.get_stats()
+        }
@@ -0,0 +1,209 @@
+import math
+import os
+import re
+import time
+from multiprocessing import shared_memory
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from kline_buffer import KLINE_COLUMNS, KlineRows, parse_kline_rows, TS
+
+# 头部字段（float64），写入方每次写入前后各递增一次 seq，奇数表示正在写入
+_SEQ, _CAPACITY, _HEAD, _COUNT, _NEWEST, _LAST, _BID, _ASK, _TIMESTAMP = range(9)
+_HEADER_SLOTS = 16
+
+DEFAULT_CAPACITY = 300
+
+
+def shared_name(prefix: str, symbol: str) -> str:
+    """交易对对应的共享内存名称"""
+    return prefix + re.sub(r"[^A-Za-z0-9]", "_", symbol)
+
+
+def _optional_float(value) -> float:
+    return float(value) if value not in (None, "") else math.nan
+
+
+class SharedKlineRing:
+    """
+    单个交易对的最新行情和K线环形缓冲区，存放在 multiprocessing.shared_memory 中
+
+    单写多读：主进程写入，分片进程按名称挂载后直接从共享内存复制，不经过管道或序列化。
+    写入使用 seqlock（头部 seq 奇数表示写入中），读取方在 seq 前后一致时才采用读到的数据。
+    读取得到的是私有副本（每次读取复制一次K线，300根约20KB）：策略在 seq 校验之后才使用数据，
+    若直接持有共享内存视图，写入方随后的原地更新会让策略读到不一致的行。
+    新的K线追加到环尾，未收盘K线原地更新；无法衔接时整体重写。
+    """
+
+    def __init__(self, name: str, capacity: int = DEFAULT_CAPACITY, create: bool = False):
+        if create:
+            size = (_HEADER_SLOTS + capacity * len(KLINE_COLUMNS)) * 8
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.header = np.ndarray((_HEADER_SLOTS,), dtype=np.float64, buffer=self.shm.buf)
+        if create:
+            self.header[:] = 0
+            self.header[_CAPACITY] = capacity
+        self.capacity = int(self.header[_CAPACITY])
+        self.rows = np.ndarray((self.capacity, len(KLINE_COLUMNS)), dtype=np.float64,
+                               buffer=self.shm.buf, offset=_HEADER_SLOTS * 8)
+
+    @property
+    def seq(self) -> int:
+        return int(self.header[_SEQ])
+
+    def write(self, market_data: Dict[str, Any]):
+        """写入 StrategyEngine 格式的市场数据（K线按时间倒序）"""
+        header, rows, capacity = self.header, self.rows, self.capacity
+        klines = market_data.get("kline_array")
+        if klines is None:
+            klines = parse_kline_rows(market_data.get("kline") or [])
+        header[_SEQ] += 1
+        try:
+            head, count, newest = int(header[_HEAD]), int(header[_COUNT]), header[_NEWEST]
+            if len(klines):
+                # 按时间倒序，比已有最新K线更新的行都在开头
+                new_count = int(np.count_nonzero(klines[:, TS] > newest))
+                if count and klines[-1, TS] <= newest and new_count < capacity:
+                    # 与已有数据衔接：原地更新最新一根，再追加新K线
+                    if new_count < len(klines) and klines[new_count, TS] == newest:
+                        rows[head] = klines[new_count]
+                    for values in klines[:new_count][::-1]:
+                        head = (head + 1) % capacity
+                        rows[head] = values
+                    count = min(capacity, count + new_count)
+                else:
+                    count = min(len(klines), capacity)
+                    rows[:count] = klines[:count][::-1]
+                    head = count - 1
+                header[_HEAD] = head
+                header[_COUNT] = count
+                header[_NEWEST] = klines[0, TS]
+            header[_LAST] = _optional_float(market_data.get("last"))
+            header[_BID] = _optional_float(market_data.get("best_bid"))
+            header[_ASK] = _optional_float(market_data.get("best_ask"))
+            header[_TIMESTAMP] = market_data.get("timestamp") or time.time() * 1000
+        finally:
+            header[_SEQ] += 1
+
+    def read(self, last_seq: Optional[int] = None) -> Optional[Tuple[int, np.ndarray, np.ndarray]]:
+        """
+        读取一致的快照 (seq, 头部, K线数组)，K线数组为按时间倒序的私有副本
+        seq 与 last_seq 相同（没有新数据）或一直读不到一致快照时返回 None
+        """
+        header = self.header
+        for _ in range(1000):
+            seq = int(header[_SEQ])
+            if seq % 2:
+                time.sleep(0)
+                continue
+            if seq == last_seq:
+                return None
+            quote = header.copy()
+            count, head = int(quote[_COUNT]), int(quote[_HEAD])
+            klines = self._copy_newest_first(head, count)
+            if int(header[_SEQ]) == seq:
+                return seq, quote, klines
+        return None
+
+    def _copy_newest_first(self, head: int, count: int) -> np.ndarray:
+        """按时间倒序复制最近 count 根K线：环上至多两段连续内存，各整段复制一次"""
+        klines = np.empty((count, self.rows.shape[1]), dtype=np.float64)
+        first = min(count, head + 1)  # rows[head] 往前直到环首
+        klines[:first] = self.rows[head - first + 1:head + 1][::-1]
+        if count > first:  # 绕回环尾的部分
+            klines[first:] = self.rows[self.capacity - (count - first):][::-1]
+        return klines
+
+    def close(self):
+        # 先释放 numpy 视图，否则共享内存无法关闭
+        self.header = None
+        self.rows = None
+        self.shm.close()
+
+
+def to_market_data(symbol: str, quote: np.ndarray, klines: np.ndarray) -> Dict[str, Any]:
+    """把共享内存中的快照转换为 StrategyEngine.get_market_data 的格式"""
+    klines.flags.writeable = False
+    return {
+        "symbol": symbol,
+        "last": repr(float(quote[_LAST])) if not math.isnan(quote[_LAST]) else None,
+        "kline": KlineRows(klines),
+        "kline_array": klines,  # 同一份K线的 numpy 数组副本（按时间倒序，列见 KLINE_COLUMNS）
+        "timestamp": int(quote[_TIMESTAMP]),
+        "order_book": None,
+        "best_bid": None if math.isnan(quote[_BID]) else float(quote[_BID]),
+        "best_ask": None if math.isnan(quote[_ASK]) else float(quote[_ASK])
+    }
+
+
+class SharedMarketData:
+    """主进程侧：按交易对创建并写入共享内存环形缓冲区"""
+
+    def __init__(self, prefix: Optional[str] = None, capacity: int = DEFAULT_CAPACITY):
+        self.prefix = prefix or f"zzalgo_{os.getpid()}_"
+        self.capacity = capacity
+        self._rings: Dict[str, SharedKlineRing] = {}
+        self.stats = {"writes": 0}
+
+    def write(self, symbol: str, market_data: Dict[str, Any]):
+        ring = self._rings.get(symbol)
+        if ring is None:
+            name = shared_name(self.prefix, symbol)
+            try:
+                ring = SharedKlineRing(name, self.capacity, create=True)
+            except FileExistsError:
+                # 同名的残留共享内存（上次异常退出），删除后重建
+                stale = shared_memory.SharedMemory(name=name)
+                stale.close()
+                stale.unlink()
+                ring = SharedKlineRing(name, self.capacity, create=True)
+            self._rings[symbol] = ring
+        ring.write(market_data)
+        self.stats["writes"] += 1
+
+    def close(self):
+        for ring in self._rings.values():
+            shm = ring.shm
+            ring.close()
+            shm.unlink()
+        self._rings.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "prefix": self.prefix,
+            "symbols": {symbol: {"seq": ring.seq, "count": int(ring.header[_COUNT])} for symbol, ring in self._rings.items()},
+            **self.stats
+        }
+
+
+class SharedMarketDataReader:
+    """分片进程侧：按需挂载交易对的共享内存，只在有新数据时返回市场数据"""
+
+    def __init__(self, prefix: str):
+        self.prefix = prefix
+        self._rings: Dict[str, SharedKlineRing] = {}
+        self._seqs: Dict[str, int] = {}
+
+    def read(self, symbol: str) -> Optional[Dict[str, Any]]:
+        ring = self._rings.get(symbol)
+        if ring is None:
+            try:
+                ring = SharedKlineRing(shared_name(self.prefix, symbol))
+            except FileNotFoundError:
+                # 主进程尚未收到该交易对的数据
+                return None
+            self._rings[symbol] = ring
+        snapshot = ring.read(self._seqs.get(symbol))
+        if snapshot is None:
+            return None
+        seq, quote, klines = snapshot
+        self._seqs[symbol] = seq
+        return to_market_data(symbol, quote, klines)
+
+    def close(self):
+        for ring in self._rings.values():
+            ring.close()
+        self._rings.clear()
@@ -0,0 +1,100 @@
+import collections
+import time
+from typing import Dict, Any, List, Tuple, Optional
+
+# 数量比较和分配时的精度，OKX 下单数量最多8位小数
+_EPSILON = 1e-9
+_SIZE_DIGITS = 8
+
+
+def _size_of(action: Dict) -> float:
+    try:
+        return float(action.get("size") or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+class SignalNetter:
+    """
+    同一轮策略信号的跨策略轧差
+
+    同一交易对（及保证金模式）的市价买卖信号合并为一笔净额订单：
+    - 买卖数量相抵的部分在内部撮合（internal cross），按参考价记为各策略的虚拟成交，不发往交易所
+    - 数量较少一方的信号全部内部成交；较多一方按数量比例分摊内部成交，剩余部分合并为一笔净额订单
+    - 只有一个信号的交易对、限价单等其他动作原样下单
+    最近的内部撮合记录保留在 recent 中，便于核对各策略的虚拟成交。
+    """
+
+    def __init__(self, history: int = 200):
+        self.recent = collections.deque(maxlen=history)
+        self.stats = {"signals": 0, "orders": 0, "crosses": 0, "crossed_volume": 0.0}
+
+    def net(self, actions: List[Tuple[str, Dict]], prices: Optional[Dict[str, float]] = None):
+        """
+        :param actions: [(策略ID, 买卖动作)]
+        :param prices: {symbol: 参考价}，用于记录内部成交价格
+        :return: (orders, fills)
+                 orders: [(下单动作, [(策略ID, 原动作)])]，每个下单动作对应一笔交易所订单
+                 fills: [(策略ID, 原动作, 内部成交数量)]，内部成交数量大于0的信号
+        """
+        prices = prices or {}
+        orders, fills = [], []
+        groups: Dict[Tuple, List[Tuple[str, Dict]]] = {}
+        for strategy_id, action in actions:
+            self.stats["signals"] += 1
+            if action.get("order_type", "market") != "market" or _size_of(action) <= 0:
+                orders.append((action, [(strategy_id, action)]))
+                continue
+            key = (action.get("symbol"), action.get("td_mode", "cross"))
+            groups.setdefault(key, []).append((strategy_id, action))
+
+        for (symbol, td_mode), group in groups.items():
+            if len(group) == 1:
+                orders.append((group[0][1], group))
+                continue
+            buys = [(strategy_id, action) for strategy_id, action in group if action.get("action") == "buy"]
+            sells = [(strategy_id, action) for strategy_id, action in group if action.get("action") == "sell"]
+            buy_total = sum(_size_of(action) for _, action in buys)
+            sell_total = sum(_size_of(action) for _, action in sells)
+            crossed = min(buy_total, sell_total)
+            net_size = round(abs(buy_total - sell_total), _SIZE_DIGITS)
+            major, major_total = (buys, buy_total) if buy_total >= sell_total else (sells, sell_total)
+            minor = sells if major is buys else buys
+
+            if crossed > _EPSILON:
+                for strategy_id, action in minor:
+                    fills.append((strategy_id, action, _size_of(action)))
+                ratio = crossed / major_total
+                for strategy_id, action in major:
+                    fills.append((strategy_id, action, round(_size_of(action) * ratio, _SIZE_DIGITS)))
+                self._record_cross(symbol, crossed, prices.get(symbol), buys, sells)
+
+            if net_size > _EPSILON:
+                side = "buy" if major is buys else "sell"
+                order = {
+                    "action": side,
+                    "symbol": symbol,
+                    "size": net_size,
+                    "td_mode": td_mode,
+                    "order_type": "market",
+                    "reason": f"{len(group)} 个信号轧差后的净额"
+                }
+                orders.append((order, major))
+
+        self.stats["orders"] += len(orders)
+        return orders, fills
+
+    def _record_cross(self, symbol: str, size: float, price: Optional[float], buys, sells):
+        self.stats["crosses"] += 1
+        self.stats["crossed_volume"] += size
+        self.recent.append({
+            "time": time.time(),
+            "symbol": symbol,
+            "size": round(size, _SIZE_DIGITS),
+            "price": price,
+            "buy": [(strategy_id, _size_of(action)) for strategy_id, action in buys],
+            "sell": [(strategy_id, _size_of(action)) for strategy_id, action in sells]
+        })
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {**self.stats, "recent": list(self.recent)[-20:]}
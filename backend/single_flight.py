@@ -0,0 +1,109 @@
+import asyncio
+import threading
+from typing import Dict, Any, Callable, Awaitable
+
+
+class _FlightStats:
+    """按接口统计上游请求数和被合并的请求数"""
+
+    def __init__(self):
+        self._stats: Dict[str, Dict[str, int]] = {}
+
+    def record(self, endpoint: str, coalesced: bool):
+        stats = self._stats.get(endpoint)
+        if stats is None:
+            stats = {"upstream": 0, "coalesced": 0}
+            self._stats[endpoint] = stats
+        stats["coalesced" if coalesced else "upstream"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        result = {}
+        for endpoint, stats in list(self._stats.items()):
+            total = stats["upstream"] + stats["coalesced"]
+            result[endpoint] = {
+                "upstream": stats["upstream"],
+                "coalesced": stats["coalesced"],
+                "saved_ratio": round(stats["coalesced"] / total, 4) if total else 0,
+            }
+        return result
+
+
+class AsyncSingleFlight:
+    """
+    异步请求合并
+
+    同一个 key 在上一次请求完成前再次被请求时，不再发起新的上游请求，
+    而是等待正在进行的请求并共享其结果。
+    """
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self._stats = _FlightStats()
+
+    async def do(self, key: str, endpoint: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        :param key: 合并的键，一般与缓存键相同
+        :param endpoint: 统计用的接口名
+        :param fetch: 发起上游请求的协程函数
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self._stats.record(endpoint, coalesced=True)
+        else:
+            self._stats.record(endpoint, coalesced=False)
+            # 在独立任务中执行，某个调用方被取消时不影响其他等待者
+            task = asyncio.ensure_future(fetch())
+            self._in_flight[key] = task
+            task.add_done_callback(lambda _: self._in_flight.pop(key, None))
+        return await asyncio.shield(task)
+
+    def get_stats(self) -> Dict[str, Any]:
+        stats = self._stats.get_stats()
+        return {"in_flight": len(self._in_flight), "endpoints": stats}
+
+
+class SingleFlight:
+    """同步请求合并，供多线程调用的同步客户端使用"""
+
+    class _Call:
+        def __init__(self):
+            self.done = threading.Event()
+            self.result = None
+            self.error = None
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._in_flight: Dict[str, "SingleFlight._Call"] = {}
+        self._stats = _FlightStats()
+
+    def do(self, key: str, endpoint: str, fetch: Callable[[], Any]) -> Any:
+        with self._lock:
+            call = self._in_flight.get(key)
+            leader = call is None
+            if leader:
+                call = SingleFlight._Call()
+                self._in_flight[key] = call
+            self._stats.record(endpoint, coalesced=not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fetch()
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            call.done.set()
+        return call.result
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            in_flight = len(self._in_flight)
+            stats = self._stats.get_stats()
+        return {"in_flight": in_flight, "endpoints": stats}
@@ -5,12 +5,16 @@ class BaseStrategy(ABC):
     """
     交易策略基类，所有策略都应继承此类
     """
+    # 重启后需要恢复的运行时状态属性（值须可JSON序列化），子类按需扩展
+    STATE_ATTRIBUTES = ("last_signal_time",)
+
     def __init__(self, strategy_id, name, description, parameters=None):
         self.strategy_id = strategy_id
         self.name = name
         self.description = description
         self.parameters = parameters or {}
         self.logger = logging.getLogger(f"strategy.{strategy_id}")
+        self.order_view = None  # 由策略引擎设置：order_view(策略ID, 交易对) 返回未完成订单
         
         # 确保position_size_percent参数存在
         if "position_size_percent" not in self.parameters:
@@ -43,11 +47,101 @@ class BaseStrategy(ABC):
         """
         pass
     
+    def extract_market_fields(self, market_data):
+        """
+        从不同格式的市场数据中提取当前价格、交易品种和K线周期
+
+        :param market_data: 市场数据（回测/实时/K线/嵌套 data 字典，或字典列表）
+        :return: (current_price, symbol, timeframe)，无法提取价格时 current_price 为 None
+        """
+        current_price = None
+        symbol = self.parameters.get("symbol")
+        timeframe = None
+
+        if isinstance(market_data, dict):
+            if "symbol" in market_data:
+                symbol = market_data["symbol"]
+            if "timeframe" in market_data:
+                timeframe = market_data["timeframe"]
+
+            if "close" in market_data:  # 回测数据格式
+                current_price = float(market_data["close"])
+            elif "last" in market_data:  # 实时数据格式
+                current_price = float(market_data["last"])
+            elif market_data.get("kline_array") is not None and len(market_data["kline_array"]):
+                current_price = float(market_data["kline_array"][0, 4])  # 直接读数组，省去逐行转字符串
+            elif "kline" in market_data and market_data["kline"]:  # K线数据格式
+                current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
+            elif "data" in market_data and isinstance(market_data["data"], dict):
+                # 处理嵌套的数据结构
+                data = market_data["data"]
+                if "symbol" in data:
+                    symbol = data["symbol"]
+                if "timeframe" in data:
+                    timeframe = data["timeframe"]
+                if "last" in data:
+                    current_price = float(data["last"])
+                elif "close" in data:
+                    current_price = float(data["close"])
+        elif isinstance(market_data, list) and market_data:
+            # 处理列表格式的数据
+            if isinstance(market_data[0], dict) and "close" in market_data[0]:
+                current_price = float(market_data[0]["close"])
+                if "symbol" in market_data[0]:
+                    symbol = market_data[0]["symbol"]
+                if "timeframe" in market_data[0]:
+                    timeframe = market_data[0]["timeframe"]
+
+        return current_price, symbol, timeframe
+
     def update_parameters(self, parameters):
         """更新策略参数"""
         self.parameters.update(parameters)
         self.logger.info(f"策略参数已更新: {parameters}")
         
+    def get_open_orders(self, symbol=None):
+        """
+        本策略未完成的订单（订单管理按 clOrdId 维护的记录，含 state、accFillSz 等字段）
+        
+        在独立进程（process 执行方式或分片引擎）中执行时无法访问订单管理，返回空列表
+        """
+        if self.order_view is None:
+            return []
+        return self.order_view(self.strategy_id, symbol)
+
+    def get_state(self):
+        """导出运行时状态，列表等可变值复制一份，避免与正在执行的策略共享"""
+        state = {}
+        for name in self.STATE_ATTRIBUTES:
+            if hasattr(self, name):
+                value = getattr(self, name)
+                state[name] = list(value) if isinstance(value, list) else value
+        return state
+
+    def set_state(self, state):
+        """恢复 get_state 导出的运行时状态，忽略未声明的字段"""
+        for name in self.STATE_ATTRIBUTES:
+            if name in state:
+                setattr(self, name, state[name])
+
+    def backfill(self, closes):
+        """
+        用停机期间错过的已收盘K线补齐状态，默认不处理
+
+        只对按K线收盘触发（trigger=bar）的策略调用，closes 的周期与策略的 bar 参数一致
+
+        :param closes: 错过的K线收盘价，按时间升序
+        """
+        pass
+
+    def reset_history(self):
+        """
+        丢弃按执行节奏累积的历史（价格历史、指标等），默认不处理
+
+        非K线触发的策略按秒级节奏采样，停机期间的空缺无法用K线补齐，恢复快照后调用
+        """
+        pass
+
     def get_info(self):
         """获取策略信息"""
         return {
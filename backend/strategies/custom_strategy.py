@@ -5,6 +5,7 @@ import sys
 import os
 import uuid
 import logging
+import re
 
 class CustomStrategy(BaseStrategy):
     """
@@ -44,6 +45,10 @@ class CustomStrategy(BaseStrategy):
             strategy_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), "custom_strategies")
             os.makedirs(strategy_dir, exist_ok=True)
             
+            # 策略ID用于文件名，只允许字母、数字和下划线，防止写到目录之外
+            if not re.fullmatch(r"[A-Za-z0-9_]+", str(self.strategy_id)):
+                self.logger.error(f"无效的策略ID: {self.strategy_id}")
+                return
             module_name = f"custom_strategy_{self.strategy_id}"
             file_path = os.path.join(strategy_dir, f"{module_name}.py")
             
@@ -87,33 +92,7 @@ class CustomStrategy(BaseStrategy):
             
         try:
             # 获取当前价格和交易品种、K线周期
-            current_price = None
-            symbol = self.parameters.get("symbol")
-            timeframe = None
-            
-            if isinstance(market_data, dict):
-                # 尝试获取交易品种和K线周期
-                if "symbol" in market_data:
-                    symbol = market_data["symbol"]
-                if "timeframe" in market_data:
-                    timeframe = market_data["timeframe"]
-                    
-                if "close" in market_data:  # 回测数据格式
-                    current_price = float(market_data["close"])
-                elif "last" in market_data:  # 实时数据格式
-                    current_price = float(market_data["last"])
-                elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                    current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-                elif "data" in market_data and isinstance(market_data["data"], dict):
-                    data = market_data["data"]
-                    if "symbol" in data:
-                        symbol = data["symbol"]
-                    if "timeframe" in data:
-                        timeframe = data["timeframe"]
-                    if "last" in data:
-                        current_price = float(data["last"])
-                    elif "close" in data:
-                        current_price = float(data["close"])
+            current_price, symbol, timeframe = self.extract_market_fields(market_data)
             
             # 计算实际仓位大小
             position_size = self.calculate_position_size(account, current_price) if current_price else 1
@@ -13,6 +13,8 @@ class GridStrategy(BaseStrategy):
     - position_size: 每格仓位大小
     """
     
+    STATE_ATTRIBUTES = ("last_signal_time", "last_price")
+    
     def __init__(self, strategy_id, name="网格交易策略", description="在价格区间内设置网格进行交易", parameters=None):
         default_params = {
             "symbol": "BTC-USDT-SWAP",
@@ -81,6 +83,15 @@ class GridStrategy(BaseStrategy):
         # 重新初始化网格
         self._init_grid()
         
+    def reset_history(self):
+        """首次执行时重新记录价格，不与停机前的价格比较网格穿越"""
+        self.last_price = None
+
+    def backfill(self, closes):
+        """以最新收盘价作为上次价格，停机期间已穿越的网格线不再补发信号"""
+        if closes:
+            self.last_price = float(closes[-1])
+        
     def generate_signal(self, market_data, positions, account):
         """
         生成交易信号
@@ -99,34 +110,8 @@ class GridStrategy(BaseStrategy):
                 self.logger.warning("无法获取市场数据")
                 return None
             
-            # 获取当前价格
-            current_price = None
-            symbol = self.parameters.get("symbol")
-            timeframe = None
-            
-            if isinstance(market_data, dict):
-                # 尝试获取交易品种和K线周期
-                if "symbol" in market_data:
-                    symbol = market_data["symbol"]
-                if "timeframe" in market_data:
-                    timeframe = market_data["timeframe"]
-                    
-                if "close" in market_data:  # 回测数据格式
-                    current_price = float(market_data["close"])
-                elif "last" in market_data:  # 实时数据格式
-                    current_price = float(market_data["last"])
-                elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                    current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-                elif "data" in market_data and isinstance(market_data["data"], dict):
-                    data = market_data["data"]
-                    if "symbol" in data:
-                        symbol = data["symbol"]
-                    if "timeframe" in data:
-                        timeframe = data["timeframe"]
-                    if "last" in data:
-                        current_price = float(data["last"])
-                    elif "close" in data:
-                        current_price = float(data["close"])
+            # 获取当前价格、交易品种和K线周期
+            current_price, symbol, timeframe = self.extract_market_fields(market_data)
             
             if not current_price:
                 self.logger.warning("无法获取当前价格")
@@ -208,45 +193,9 @@ class GridStrategy(BaseStrategy):
             self.logger.warning("无法获取市场数据")
             return None
             
-        # 获取当前价格
-        current_price = None
+        # 获取当前价格、交易品种和K线周期
         current_time = time.time()
-        symbol = self.parameters.get("symbol")
-        timeframe = None
-        
-        # 尝试从不同格式的市场数据中提取价格和交易品种、K线周期
-        if isinstance(market_data, dict):
-            # 尝试获取交易品种和K线周期
-            if "symbol" in market_data:
-                symbol = market_data["symbol"]
-            if "timeframe" in market_data:
-                timeframe = market_data["timeframe"]
-                
-            if "close" in market_data:  # 回测数据格式
-                current_price = float(market_data["close"])
-            elif "last" in market_data:  # 实时数据格式
-                current_price = float(market_data["last"])
-            elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-            elif "data" in market_data and isinstance(market_data["data"], dict):
-                # 处理嵌套的数据结构
-                data = market_data["data"]
-                if "symbol" in data:
-                    symbol = data["symbol"]
-                if "timeframe" in data:
-                    timeframe = data["timeframe"]
-                if "last" in data:
-                    current_price = float(data["last"])
-                elif "close" in data:
-                    current_price = float(data["close"])
-        elif isinstance(market_data, list) and market_data:
-            # 处理列表格式的数据
-            if isinstance(market_data[0], dict) and "close" in market_data[0]:
-                current_price = float(market_data[0]["close"])
-                if "symbol" in market_data[0]:
-                    symbol = market_data[0]["symbol"]
-                if "timeframe" in market_data[0]:
-                    timeframe = market_data[0]["timeframe"]
+        current_price, symbol, timeframe = self.extract_market_fields(market_data)
         
         if not current_price:
             self.logger.warning(f"无法从市场数据中提取价格: {market_data}")
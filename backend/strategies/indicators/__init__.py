@@ -0,0 +1,14 @@
+"""
+策略共用的技术指标
+
+streaming 中的指标逐个值增量更新（update 为 O(1)，窗口数据放在预分配的环形缓冲区中），
+预热期返回 None；batch 中的同名函数对整段数组一次计算，预热期为 NaN，
+两者在浮点误差范围内一致（见 tests/test_indicators.py）。
+"""
+from .streaming import RingBuffer, SMA, EMA, RollingStd, ROC, RSI, ATR, BollingerBands
+from .batch import sma, ema, rolling_std, roc, rsi, atr, bollinger_bands
+
+__all__ = [
+    "RingBuffer", "SMA", "EMA", "RollingStd", "ROC", "RSI", "ATR", "BollingerBands",
+    "sma", "ema", "rolling_std", "roc", "rsi", "atr", "bollinger_bands",
+]
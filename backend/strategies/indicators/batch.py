@@ -0,0 +1,92 @@
+from typing import Tuple
+
+import numpy as np
+
+# 批量版本按时间升序计算整段数组，返回与输入等长的 float64 数组，预热期为 NaN，
+# 数值与逐个调用 streaming 中对应指标的 update() 在浮点误差范围内一致，用于回测和初始化
+
+
+def _as_array(values) -> np.ndarray:
+    return np.asarray(values, dtype=np.float64)
+
+
+def sma(values, period: int) -> np.ndarray:
+    x = _as_array(values)
+    result = np.full(len(x), np.nan)
+    if len(x) >= period:
+        sums = np.cumsum(np.concatenate(([0.0], x)))
+        result[period - 1:] = (sums[period:] - sums[:-period]) / period
+    return result
+
+
+def ema(values, period: int) -> np.ndarray:
+    x = _as_array(values)
+    result = np.full(len(x), np.nan)
+    if len(x) < period:
+        return result
+    alpha = 2.0 / (period + 1)
+    value = x[:period].sum() / period
+    result[period - 1] = value
+    for i in range(period, len(x)):
+        value += alpha * (x[i] - value)
+        result[i] = value
+    return result
+
+
+def rolling_std(values, period: int, ddof: int = 0) -> np.ndarray:
+    x = _as_array(values)
+    result = np.full(len(x), np.nan)
+    if len(x) >= period:
+        windows = np.lib.stride_tricks.sliding_window_view(x, period)
+        result[period - 1:] = windows.std(axis=1, ddof=ddof)
+    return result
+
+
+def roc(values, period: int) -> np.ndarray:
+    x = _as_array(values)
+    result = np.full(len(x), np.nan)
+    if len(x) > period:
+        base = x[:len(x) - period]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            result[period:] = np.where(base != 0, (x[period:] - base) / base, np.nan)
+    return result
+
+
+def rsi(values, period: int = 14) -> np.ndarray:
+    x = _as_array(values)
+    result = np.full(len(x), np.nan)
+    if len(x) <= period:
+        return result
+    changes = np.diff(x)
+    gains, losses = np.maximum(changes, 0.0), np.maximum(-changes, 0.0)
+    gain, loss = gains[:period].sum() / period, losses[:period].sum() / period
+    for i in range(period, len(x)):
+        if i > period:
+            gain += (gains[i - 1] - gain) / period
+            loss += (losses[i - 1] - loss) / period
+        result[i] = 100.0 if loss == 0 else 100.0 - 100.0 / (1.0 + gain / loss)
+    return result
+
+
+def atr(high, low, close, period: int = 14) -> np.ndarray:
+    high, low, close = _as_array(high), _as_array(low), _as_array(close)
+    result = np.full(len(close), np.nan)
+    if len(close) < period:
+        return result
+    true_range = high - low
+    previous_close = close[:-1]
+    true_range[1:] = np.maximum.reduce([true_range[1:], np.abs(high[1:] - previous_close),
+                                        np.abs(low[1:] - previous_close)])
+    value = true_range[:period].sum() / period
+    result[period - 1] = value
+    for i in range(period, len(close)):
+        value += (true_range[i] - value) / period
+        result[i] = value
+    return result
+
+
+def bollinger_bands(values, period: int = 20, k: float = 2.0) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """返回 (中轨, 上轨, 下轨)"""
+    middle = sma(values, period)
+    std = rolling_std(values, period)
+    return middle, middle + k * std, middle - k * std
@@ -0,0 +1,229 @@
+import math
+from typing import Optional, List, Tuple
+
+
+class RingBuffer:
+    """
+    定长环形缓冲区（预分配），append 为 O(1)，满后覆盖最旧的值
+
+    ago(0) 为最新值，ago(n) 为 n 次之前的值；values() 按时间顺序（最旧在前）返回全部值。
+    """
+
+    __slots__ = ("capacity", "_data", "_next", "count")
+
+    def __init__(self, capacity: int):
+        if capacity <= 0:
+            raise ValueError("capacity 必须大于0")
+        self.capacity = capacity
+        self._data = [0.0] * capacity
+        self._next = 0
+        self.count = 0
+
+    def __len__(self):
+        return self.count
+
+    @property
+    def full(self) -> bool:
+        return self.count == self.capacity
+
+    def append(self, value: float) -> Optional[float]:
+        """追加一个值，缓冲区已满时返回被覆盖的最旧值"""
+        evicted = self._data[self._next] if self.count == self.capacity else None
+        self._data[self._next] = value
+        self._next = (self._next + 1) % self.capacity
+        if self.count < self.capacity:
+            self.count += 1
+        return evicted
+
+    def ago(self, n: int) -> float:
+        if not 0 <= n < self.count:
+            raise IndexError(n)
+        return self._data[(self._next - 1 - n) % self.capacity]
+
+    @property
+    def oldest(self) -> float:
+        return self.ago(self.count - 1)
+
+    def values(self) -> List[float]:
+        start = (self._next - self.count) % self.capacity
+        return [self._data[(start + i) % self.capacity] for i in range(self.count)]
+
+    def clear(self):
+        self._next = 0
+        self.count = 0
+
+
+class SMA:
+    """简单移动平均，维护窗口内的累加和；每 period 次更新重新求和一次，避免浮点误差累积"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = RingBuffer(period)
+        self._sum = 0.0
+        self._since_resum = 0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        evicted = self.window.append(x)
+        self._sum += x - (evicted or 0.0)
+        self._since_resum += 1
+        if self._since_resum >= self.period:
+            self._sum = math.fsum(self.window.values())
+            self._since_resum = 0
+        self.value = self._sum / self.period if self.window.full else None
+        return self.value
+
+
+class EMA:
+    """指数移动平均，alpha = 2 / (period + 1)，以前 period 个值的简单平均作为初值"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.alpha = 2.0 / (period + 1)
+        self._seed = 0.0
+        self.count = 0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        self.count += 1
+        if self.value is not None:
+            self.value += self.alpha * (x - self.value)
+        else:
+            self._seed += x
+            if self.count == self.period:
+                self.value = self._seed / self.period
+        return self.value
+
+
+class RollingStd:
+    """
+    滚动标准差（默认总体标准差 ddof=0），用 Welford 方法增量维护窗口均值和离差平方和
+
+    不使用 平方和 - 和²/n：价格远大于波动时（如 60000±0.05）两项几乎相等，相减会丢失全部有效位。
+    每 period 次更新按窗口重新计算一次，避免误差累积。
+    """
+
+    def __init__(self, period: int, ddof: int = 0):
+        if period - ddof <= 0:
+            raise ValueError("period 必须大于 ddof")
+        self.period = period
+        self.ddof = ddof
+        self.window = RingBuffer(period)
+        self._mean = 0.0
+        self._m2 = 0.0  # 离差平方和
+        self._since_resync = 0
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        evicted = self.window.append(x)
+        if evicted is None:
+            delta = x - self._mean
+            self._mean += delta / self.window.count
+            self._m2 += delta * (x - self._mean)
+        else:
+            # 同时移出 evicted、加入 x，窗口大小不变
+            previous_mean = self._mean
+            self._mean += (x - evicted) / self.period
+            self._m2 += (x - evicted) * (x - self._mean + evicted - previous_mean)
+        self._since_resync += 1
+        if self._since_resync >= self.period:
+            values = self.window.values()
+            self._mean = math.fsum(values) / len(values)
+            self._m2 = math.fsum((value - self._mean) ** 2 for value in values)
+            self._since_resync = 0
+        if not self.window.full:
+            self.value = None
+        else:
+            self.value = math.sqrt(max(0.0, self._m2) / (self.period - self.ddof))
+        return self.value
+
+
+class ROC:
+    """变化率 (x - x[period 次之前]) / x[period 次之前]"""
+
+    def __init__(self, period: int):
+        self.period = period
+        self.window = RingBuffer(period + 1)
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        self.window.append(x)
+        if not self.window.full:
+            self.value = None
+        else:
+            base = self.window.oldest
+            self.value = (x - base) / base if base else None
+        return self.value
+
+
+class RSI:
+    """相对强弱指数（Wilder 平滑），前 period 个涨跌幅的简单平均作为初值"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self._previous: Optional[float] = None
+        self._gain = 0.0
+        self._loss = 0.0
+        self.count = 0  # 已累计的涨跌幅个数
+        self.value: Optional[float] = None
+
+    def update(self, x: float) -> Optional[float]:
+        previous, self._previous = self._previous, x
+        if previous is None:
+            return None
+        change = x - previous
+        gain, loss = max(change, 0.0), max(-change, 0.0)
+        self.count += 1
+        if self.count <= self.period:
+            self._gain += gain / self.period
+            self._loss += loss / self.period
+            if self.count < self.period:
+                return None
+        else:
+            self._gain += (gain - self._gain) / self.period
+            self._loss += (loss - self._loss) / self.period
+        self.value = 100.0 if self._loss == 0 else 100.0 - 100.0 / (1.0 + self._gain / self._loss)
+        return self.value
+
+
+class ATR:
+    """平均真实波幅（Wilder 平滑），第一根K线的真实波幅为 最高 - 最低"""
+
+    def __init__(self, period: int = 14):
+        self.period = period
+        self._previous_close: Optional[float] = None
+        self._sum = 0.0
+        self.count = 0
+        self.value: Optional[float] = None
+
+    def update(self, high: float, low: float, close: float) -> Optional[float]:
+        if self._previous_close is None:
+            true_range = high - low
+        else:
+            true_range = max(high - low, abs(high - self._previous_close), abs(low - self._previous_close))
+        self._previous_close = close
+        self.count += 1
+        if self.count < self.period:
+            self._sum += true_range
+        elif self.count == self.period:
+            self.value = (self._sum + true_range) / self.period
+        else:
+            self.value += (true_range - self.value) / self.period
+        return self.value
+
+
+class BollingerBands:
+    """布林带：中轨为 SMA，上下轨为中轨 ± k 倍总体标准差，返回 (中轨, 上轨, 下轨)"""
+
+    def __init__(self, period: int = 20, k: float = 2.0):
+        self.period = period
+        self.k = k
+        self._sma = SMA(period)
+        self._std = RollingStd(period)
+        self.value: Optional[Tuple[float, float, float]] = None
+
+    def update(self, x: float) -> Optional[Tuple[float, float, float]]:
+        middle = self._sma.update(x)
+        std = self._std.update(x)
+        self.value = None if middle is None else (middle, middle + self.k * std, middle - self.k * std)
+        return self.value
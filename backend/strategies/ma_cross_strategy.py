@@ -1,5 +1,5 @@
 from .base_strategy import BaseStrategy
-import numpy as np
+from .indicators import RingBuffer, SMA
 import time
 
 class MACrossStrategy(BaseStrategy):
@@ -13,6 +13,8 @@ class MACrossStrategy(BaseStrategy):
     - position_size: 仓位大小
     """
     
+    STATE_ATTRIBUTES = ("last_signal_time", "price_history", "last_signal")
+    
     def __init__(self, strategy_id, name="均线交叉策略", description="基于快慢均线交叉的交易策略", parameters=None):
         default_params = {
             "symbol": "BTC-USDT-SWAP",
@@ -35,6 +37,45 @@ class MACrossStrategy(BaseStrategy):
         self.last_signal_time = 0
         self.signal_cooldown = 60  # 信号冷却时间（秒）
         
+    @property
+    def price_history(self):
+        """最近 slow_period + 2 个价格（最旧在前），足够判断上一时刻的均线位置"""
+        return self._prices.values()
+
+    @price_history.setter
+    def price_history(self, prices):
+        # 按当前参数重建均线并回放价格，快照恢复和参数变更都经过这里
+        fast_period = int(self.parameters.get("fast_period", 5))
+        slow_period = int(self.parameters.get("slow_period", 20))
+        self._prices = RingBuffer(slow_period + 2)
+        self._fast_ma = SMA(fast_period)
+        self._slow_ma = SMA(slow_period)
+        for price in prices[-self._prices.capacity:]:
+            self._update_averages(float(price))
+
+    def _update_averages(self, current_price):
+        """
+        追加一个价格并增量更新快慢均线，每次为 O(1)，与均线周期长短无关
+
+        :return: (prev_fast_ma, prev_slow_ma, fast_ma, slow_ma)，历史不足的均线为 None
+        """
+        prev_fast_ma, prev_slow_ma = self._fast_ma.value, self._slow_ma.value
+        self._prices.append(current_price)
+        return prev_fast_ma, prev_slow_ma, self._fast_ma.update(current_price), self._slow_ma.update(current_price)
+
+    def update_parameters(self, parameters):
+        """更新策略参数，均线周期变化时按新周期重建均线"""
+        super().update_parameters(parameters)
+        self.price_history = self.price_history
+
+    def reset_history(self):
+        self.price_history = []
+
+    def backfill(self, closes):
+        """错过的收盘价依次更新均线"""
+        for close in closes:
+            self._update_averages(float(close))
+        
     def execute(self, market_data, positions, account):
         """执行策略逻辑"""
         # 检查是否有市场数据
@@ -42,75 +83,26 @@ class MACrossStrategy(BaseStrategy):
             self.logger.warning("无法获取市场数据")
             return None
             
-        # 获取当前价格
-        current_price = None
+        # 获取当前价格、交易品种和K线周期
         current_time = time.time()
-        symbol = self.parameters.get("symbol")
-        timeframe = None
-        
-        # 尝试从不同格式的市场数据中提取价格
-        if isinstance(market_data, dict):
-            # 尝试获取交易品种和K线周期
-            if "symbol" in market_data:
-                symbol = market_data["symbol"]
-            if "timeframe" in market_data:
-                timeframe = market_data["timeframe"]
-                
-            if "close" in market_data:  # 回测数据格式
-                current_price = float(market_data["close"])
-            elif "last" in market_data:  # 实时数据格式
-                current_price = float(market_data["last"])
-            elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-            elif "data" in market_data and isinstance(market_data["data"], dict):
-                # 处理嵌套的数据结构
-                data = market_data["data"]
-                if "symbol" in data:
-                    symbol = data["symbol"]
-                if "timeframe" in data:
-                    timeframe = data["timeframe"]
-                if "last" in data:
-                    current_price = float(data["last"])
-                elif "close" in data:
-                    current_price = float(data["close"])
-        elif isinstance(market_data, list) and market_data:
-            # 处理列表格式的数据
-            if isinstance(market_data[0], dict) and "close" in market_data[0]:
-                current_price = float(market_data[0]["close"])
-                if "symbol" in market_data[0]:
-                    symbol = market_data[0]["symbol"]
-                if "timeframe" in market_data[0]:
-                    timeframe = market_data[0]["timeframe"]
+        current_price, symbol, timeframe = self.extract_market_fields(market_data)
         
         if not current_price:
             self.logger.warning(f"无法从市场数据中提取价格: {market_data}")
             return None
         
-        # 更新价格历史
-        self.price_history.append(current_price)
-        
-        # 保持历史记录长度
-        slow_period = int(self.parameters["slow_period"])
-        if len(self.price_history) > slow_period * 3:  # 保留足够的历史数据
-            self.price_history = self.price_history[-slow_period*3:]
+        # 更新价格历史并增量计算快速均线和慢速均线（含更新前的值）
+        prev_fast_ma, prev_slow_ma, fast_ma, slow_ma = self._update_averages(current_price)
         
         # 如果历史记录不足，无法计算均线
-        if len(self.price_history) < slow_period:
+        if fast_ma is None or slow_ma is None:
             return None
-            
-        # 计算快速均线和慢速均线
-        fast_period = int(self.parameters["fast_period"])
-        fast_ma = np.mean(self.price_history[-fast_period:])
-        slow_ma = np.mean(self.price_history[-slow_period:])
         
         # 计算实际仓位大小
         position_size = self.calculate_position_size(account, current_price)
         
-        # 如果历史记录足够，计算前一个时间点的均线
-        if len(self.price_history) > slow_period + 1:
-            prev_fast_ma = np.mean(self.price_history[-(fast_period+1):-1])
-            prev_slow_ma = np.mean(self.price_history[-(slow_period+1):-1])
-            
+        # 如果历史记录足够，使用前一个时间点的均线
+        if self._prices.full and prev_fast_ma is not None and prev_slow_ma is not None:
             # 检查是否有交叉
             golden_cross = prev_fast_ma <= prev_slow_ma and fast_ma > slow_ma  # 金叉：快线上穿慢线
             death_cross = prev_fast_ma >= prev_slow_ma and fast_ma < slow_ma   # 死叉：快线下穿慢线
@@ -176,63 +168,23 @@ class MACrossStrategy(BaseStrategy):
                 self.logger.warning("无法获取市场数据")
                 return None
             
-            # 获取当前价格
-            current_price = None
-            symbol = self.parameters.get("symbol")
-            timeframe = None
-            
-            if isinstance(market_data, dict):
-                # 尝试获取交易品种和K线周期
-                if "symbol" in market_data:
-                    symbol = market_data["symbol"]
-                if "timeframe" in market_data:
-                    timeframe = market_data["timeframe"]
-                    
-                if "close" in market_data:  # 回测数据格式
-                    current_price = float(market_data["close"])
-                elif "last" in market_data:  # 实时数据格式
-                    current_price = float(market_data["last"])
-                elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                    current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-                elif "data" in market_data and isinstance(market_data["data"], dict):
-                    data = market_data["data"]
-                    if "symbol" in data:
-                        symbol = data["symbol"]
-                    if "timeframe" in data:
-                        timeframe = data["timeframe"]
-                    if "last" in data:
-                        current_price = float(data["last"])
-                    elif "close" in data:
-                        current_price = float(data["close"])
+            # 获取当前价格、交易品种和K线周期
+            current_price, symbol, timeframe = self.extract_market_fields(market_data)
             
             if not current_price:
                 self.logger.warning("无法获取当前价格")
                 return None
             
-            # 获取参数
-            fast_period = int(self.parameters.get("fast_period", 5))
-            slow_period = int(self.parameters.get("slow_period", 20))
-            
             # 计算实际仓位大小
             position_size = self.calculate_position_size(account, current_price)
             
-            # 更新价格历史
-            self.price_history.append(current_price)
-            
-            # 保持价格历史长度不超过慢速均线周期
-            if len(self.price_history) > slow_period:
-                self.price_history = self.price_history[-slow_period:]
+            # 更新价格历史并增量计算快速均线和慢速均线
+            _, _, fast_ma, slow_ma = self._update_averages(current_price)
             
             # 如果价格历史不足以计算均线，则返回
-            if len(self.price_history) < slow_period:
+            if fast_ma is None or slow_ma is None:
                 return None
             
-            # 计算快速均线
-            fast_ma = sum(self.price_history[-fast_period:]) / fast_period
-            
-            # 计算慢速均线
-            slow_ma = sum(self.price_history[-slow_period:]) / slow_period
-            
             # 检查是否已有持仓
             has_position = False
             position_side = None
@@ -1,4 +1,5 @@
 from .base_strategy import BaseStrategy
+from .indicators import ROC
 import time
 
 class MomentumStrategy(BaseStrategy):
@@ -12,6 +13,8 @@ class MomentumStrategy(BaseStrategy):
     - position_size: 仓位大小
     """
     
+    STATE_ATTRIBUTES = ("last_signal_time", "price_history")
+    
     def __init__(self, strategy_id, name="动量策略", description="基于价格动量的交易策略", parameters=None):
         default_params = {
             "symbol": "BTC-USDT-SWAP",
@@ -28,6 +31,32 @@ class MomentumStrategy(BaseStrategy):
         self.signal_cooldown = 30  # 信号冷却时间（秒）
         self.price_history = []  # 初始化价格历史
     
+    @property
+    def price_history(self):
+        """最近 lookback_period 个价格（最旧在前），即变化率指标的窗口"""
+        return self._roc.window.values()
+
+    @price_history.setter
+    def price_history(self, prices):
+        # 按当前参数重建指标并回放价格，快照恢复和参数变更都经过这里
+        lookback_period = max(1, int(self.parameters.get("lookback_period", 5)))
+        self._roc = ROC(lookback_period - 1)
+        for price in prices[-lookback_period:]:
+            self._roc.update(float(price))
+
+    def update_parameters(self, parameters):
+        """更新策略参数，回溯周期变化时按新周期重建指标"""
+        super().update_parameters(parameters)
+        self.price_history = self.price_history
+
+    def reset_history(self):
+        self.price_history = []
+
+    def backfill(self, closes):
+        """错过的收盘价依次更新指标"""
+        for close in closes:
+            self._roc.update(float(close))
+    
     def execute(self, market_data, positions, account):
         """执行策略逻辑"""
         # 检查是否有市场数据
@@ -35,45 +64,9 @@ class MomentumStrategy(BaseStrategy):
             self.logger.warning("无法获取市场数据")
             return None
             
-        # 获取当前价格
-        current_price = None
+        # 获取当前价格、交易品种和K线周期
         current_time = time.time()
-        symbol = self.parameters.get("symbol")
-        timeframe = None
-        
-        # 尝试从不同格式的市场数据中提取价格和交易品种、K线周期
-        if isinstance(market_data, dict):
-            # 尝试获取交易品种和K线周期
-            if "symbol" in market_data:
-                symbol = market_data["symbol"]
-            if "timeframe" in market_data:
-                timeframe = market_data["timeframe"]
-                
-            if "close" in market_data:  # 回测数据格式
-                current_price = float(market_data["close"])
-            elif "last" in market_data:  # 实时数据格式
-                current_price = float(market_data["last"])
-            elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-            elif "data" in market_data and isinstance(market_data["data"], dict):
-                # 处理嵌套的数据结构
-                data = market_data["data"]
-                if "symbol" in data:
-                    symbol = data["symbol"]
-                if "timeframe" in data:
-                    timeframe = data["timeframe"]
-                if "last" in data:
-                    current_price = float(data["last"])
-                elif "close" in data:
-                    current_price = float(data["close"])
-        elif isinstance(market_data, list) and market_data:
-            # 处理列表格式的数据
-            if isinstance(market_data[0], dict) and "close" in market_data[0]:
-                current_price = float(market_data[0]["close"])
-                if "symbol" in market_data[0]:
-                    symbol = market_data[0]["symbol"]
-                if "timeframe" in market_data[0]:
-                    timeframe = market_data[0]["timeframe"]
+        current_price, symbol, timeframe = self.extract_market_fields(market_data)
         
         if not current_price:
             self.logger.warning(f"无法从市场数据中提取价格: {market_data}")
@@ -87,23 +80,13 @@ class MomentumStrategy(BaseStrategy):
             return None
             
         # 获取参数
-        lookback_period = int(self.parameters["lookback_period"])
         threshold = float(self.parameters["threshold"])
         
-        # 更新价格历史
-        if hasattr(self, 'price_history'):
-            self.price_history.append(current_price)
-            if len(self.price_history) > lookback_period * 2:
-                self.price_history = self.price_history[-lookback_period*2:]
-        else:
-            self.price_history = [current_price]
-            
-        # 如果历史记录不足，无法计算动量
-        if len(self.price_history) < lookback_period:
+        # 更新价格窗口并计算价格变化百分比（ROC 指标增量更新，与回溯周期长短无关），
+        # 历史记录不足时无法计算动量
+        price_change = self._roc.update(current_price)
+        if price_change is None:
             return None
-            
-        # 计算价格变化百分比
-        price_change = (current_price - self.price_history[-lookback_period]) / self.price_history[-lookback_period]
         
         # 检查是否有持仓
         has_position = False
@@ -167,61 +150,25 @@ class MomentumStrategy(BaseStrategy):
                 self.logger.warning("无法获取市场数据")
                 return None
             
-            # 获取当前价格
-            current_price = None
-            symbol = self.parameters.get("symbol")
-            timeframe = None
-            
-            if isinstance(market_data, dict):
-                # 尝试获取交易品种和K线周期
-                if "symbol" in market_data:
-                    symbol = market_data["symbol"]
-                if "timeframe" in market_data:
-                    timeframe = market_data["timeframe"]
-                    
-                if "close" in market_data:  # 回测数据格式
-                    current_price = float(market_data["close"])
-                elif "last" in market_data:  # 实时数据格式
-                    current_price = float(market_data["last"])
-                elif "kline" in market_data and market_data["kline"]:  # K线数据格式
-                    current_price = float(market_data["kline"][0][4])  # 最新K线的收盘价
-                elif "data" in market_data and isinstance(market_data["data"], dict):
-                    data = market_data["data"]
-                    if "symbol" in data:
-                        symbol = data["symbol"]
-                    if "timeframe" in data:
-                        timeframe = data["timeframe"]
-                    if "last" in data:
-                        current_price = float(data["last"])
-                    elif "close" in data:
-                        current_price = float(data["close"])
+            # 获取当前价格、交易品种和K线周期
+            current_price, symbol, timeframe = self.extract_market_fields(market_data)
             
             if not current_price:
                 self.logger.warning("无法获取当前价格")
                 return None
             
             # 获取参数
-            lookback_period = int(self.parameters.get("lookback_period", 5))
             threshold = float(self.parameters.get("threshold", 0.01))
             
             # 计算实际仓位大小
             position_size = self.calculate_position_size(account, current_price)
             
-            # 更新价格历史
-            if hasattr(self, 'price_history'):
-                self.price_history.append(current_price)
-                if len(self.price_history) > lookback_period * 2:
-                    self.price_history = self.price_history[-lookback_period*2:]
-            else:
-                self.price_history = [current_price]
-            
-            # 如果历史记录不足，无法计算动量
-            if len(self.price_history) < lookback_period:
+            # 更新价格窗口并计算价格变化百分比（ROC 指标增量更新，与回溯周期长短无关），
+            # 历史记录不足时无法计算动量
+            price_change = self._roc.update(current_price)
+            if price_change is None:
                 return None
             
-            # 计算价格变化百分比
-            price_change = (current_price - self.price_history[-lookback_period]) / self.price_history[-lookback_period]
-            
             # 检查是否已有持仓
             has_position = False
             position_side = None
@@ -42,6 +42,8 @@ class StrategyFactory:
                 description=description or "基于快慢均线交叉的交易策略",
                 parameters=parameters
             )
+        # custom（用户代码）暂不由工厂创建：CustomStrategy 在构造时于当前进程中加载并执行用户代码，
+        # 而创建策略的接口没有鉴权；需要等到代码只在工作进程中写入和导入、且接口有鉴权后再开放
         # 可以在这里添加更多策略类型
         else:
             raise ValueError(f"不支持的策略类型: {strategy_type}")
@@ -3,28 +3,113 @@ import asyncio
 import logging
 import traceback
 from typing import Dict  # 添加这行导入
-from okx_client import OKXClient  # 添加这行导入
+from async_okx_client import AsyncOKXClient
+from okx_client import OKXClient
+from market_data_bus import MarketDataBus, MARKET_CHANNEL
+from metrics import MetricsRegistry
+from kline_buffer import KlineBufferStore, KlineRows, DEFAULT_CAPACITY
+from bar_utils import bar_to_ms
+from strategy_executor import StrategyExecutor, StrategyTimeout, StrategyBusy, StrategyStillRunning
+from strategy_scheduler import StrategyScheduler, strategy_trigger, TRIGGER_BAR
+from strategy_snapshot import StrategySnapshotStore
+from signal_netting import SignalNetter
+from order_manager import OrderManager
 from strategies.strategy_factory import StrategyFactory
 
 # 配置日志
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger("StrategyEngine")
 
+# 引擎提交的订单都带此标签，停止时只撤销这些订单
+ORDER_TAG = "zzalgo"
+
 class StrategyEngine:
-    def __init__(self, okx_client: OKXClient):
+    def __init__(self, okx_client: AsyncOKXClient, candle_store=None, market_feed=None, account_feed=None,
+                 book_channel: str = "books", metrics: MetricsRegistry = None,
+                 executor: StrategyExecutor = None, kline_capacity: int = DEFAULT_CAPACITY,
+                 snapshot_store: StrategySnapshotStore = None, order_manager: OrderManager = None):
         self.okx_client = okx_client
+        self.candle_store = candle_store  # 本地K线存储，已收盘的实时K线写入其中
+        self.market_feed = market_feed  # WebSocket行情推送（OKXMarketFeed），为空时轮询REST
+        self._feed_symbols = set()  # 已订阅推送的交易对
+        self.book_channel = book_channel  # 订单簿深度频道，books 或 books5，为空时不订阅
+        if market_feed is not None:
+            market_feed.add_listener(self._on_feed_update)
+        self.account_feed = account_feed  # 私有频道推送（OKXAccountFeed），为空时轮询账户和持仓
+        if account_feed is not None:
+            account_feed.add_listener(self._on_account_update)
+        self._persisted_until = {}  # {(symbol, bar): 已写入存储的最新K线时间戳}
+        # 每个 (symbol, bar) 的K线环形缓冲区，初始化一次后只合并未收盘和新收盘的K线
+        self.klines = KlineBufferStore(kline_capacity)
         self.strategies = {}  # 存储所有策略
-        self.market_data = {}  # 存储最新市场数据
+        # 按交易对分发市场数据，启用的策略订阅其交易对，每个交易对每轮只获取一次
+        self.market_bus = MarketDataBus()
+        self._bus_version = 0  # 策略执行已处理到的总线版本号
+        # 按策略声明的触发方式（tick/bar/interval）决定何时执行，新数据到达时唤醒策略循环
+        self.scheduler = StrategyScheduler()
+        self._market_updated = asyncio.Event()
         self.positions = []    # 存储当前持仓
         self.account_data = {} # 存储账户数据
         self.is_running = False
         self.update_interval = 0.5  # 数据更新间隔（秒）
+        self.cancel_orders_on_stop = True  # 停止时撤销本引擎提交的未成交订单
+        # 同一轮同一交易对的市价买卖信号先轧差，相抵部分内部撮合，只把净额发往交易所
+        self.net_signals = True
+        self.netter = SignalNetter()
+        # 订单经有界队列异步执行，按 clOrdId/ordId/策略/交易对索引订单状态
+        self.order_manager = order_manager or OrderManager(okx_client, account_feed=account_feed, tag=ORDER_TAG)
+        self.order_manager.add_listener(self._on_order_event)
+        # 策略按类型在事件循环、线程池或进程池中执行，单次执行有超时限制
+        self.executor = executor or StrategyExecutor()
+        # 策略运行时状态快照，定期和停止时保存，启动时恢复；为空时不保存
+        self.snapshot_store = snapshot_store
+        self._init_metrics(metrics or MetricsRegistry())
+    
+    def _init_metrics(self, metrics: MetricsRegistry):
+        """注册热路径的延迟直方图，策略计数和引擎状态在采集时从已有统计中读取"""
+        self.metrics = metrics
+        self._fetch_latency = metrics.histogram(
+            "market_data_fetch_duration_seconds", "单个交易对通过REST获取市场数据的耗时", ["symbol"])
+        self._cycle_latency = metrics.histogram(
+            "market_data_update_cycle_seconds", "一轮市场数据更新（账户、行情、K线）的总耗时")
+        self._data_age = metrics.histogram(
+            "market_data_age_seconds", "市场数据分发给策略时距生成的时间", ["symbol"])
+        self._execute_latency = metrics.histogram(
+            "strategy_execute_duration_seconds", "策略 execute() 的耗时", ["strategy"])
+        self._ack_latency = metrics.histogram(
+            "strategy_signal_to_ack_seconds", "策略产生信号到收到交易所下单/撤单回报的时间", ["strategy"])
+        metrics.register_collector(self._collect_metrics)
+    
+    def _collect_metrics(self):
+        """采集时把策略统计和总线状态转换为指标"""
+        strategies = list(self.strategies.items())
+        for stat in ("runs", "signals", "trades", "internal_fills", "errors", "timeouts", "skipped"):
+            yield (f"strategy_{stat}_total", "counter", f"策略累计 {stat} 次数",
+                   [({"strategy": strategy_id}, info["stats"].get(stat, 0)) for strategy_id, info in strategies])
+        yield ("strategy_enabled", "gauge", "策略是否启用",
+               [({"strategy": strategy_id}, 1 if info["enabled"] else 0) for strategy_id, info in strategies])
+        bus_stats = self.market_bus.get_stats()
+        yield ("market_bus_keys", "gauge", "市场数据总线中有订阅者的交易对数", [({}, bus_stats["keys"])])
+        yield ("market_bus_publishes_total", "counter", "市场数据总线累计发布次数", [({}, bus_stats["publishes"])])
+        scheduler_stats = self.scheduler.get_stats()
+        yield ("strategy_scheduler_fired_total", "counter", "调度器累计触发策略次数", [({}, scheduler_stats["fired"])])
+        yield ("strategy_scheduler_bar_close_timeouts_total", "counter", "等待收盘K线超时后仍触发的次数",
+               [({}, scheduler_stats["bar_close_timeouts"])])
+        order_stats = self.order_manager.get_stats()
+        yield ("order_manager_open_orders", "gauge", "订单管理中未完成的订单数", [({}, order_stats["open"])])
+        yield ("order_manager_queue_depth", "gauge", "订单管理队列中等待执行的请求数", [({}, order_stats["queued"])])
+        netting_stats = self.netter.stats
+        yield ("strategy_internal_crosses_total", "counter", "信号轧差时内部撮合的次数", [({}, netting_stats["crosses"])])
+        yield ("strategy_net_orders_total", "counter", "轧差后实际发往交易所的买卖订单数", [({}, netting_stats["orders"])])
         
     def register_strategy(self, strategy_type: str, strategy_id: str, name: str = None, 
                           description: str = None, parameters: Dict = None):
         """注册一个交易策略"""
         if strategy_id in self.strategies:
             logger.warning(f"策略 {strategy_id} 已存在，将被覆盖")
+            self.market_bus.unsubscribe(strategy_id)
+            self.scheduler.remove(strategy_id)
+            self.executor.discard(strategy_id)
         
         try:
             # 使用策略工厂创建策略实例
@@ -36,14 +121,21 @@ class StrategyEngine:
                 parameters=parameters
             )
             
+            # 策略通过 get_open_orders() 按索引查询自己的未完成订单
+            strategy.order_view = self.order_manager.open_orders
             self.strategies[strategy_id] = {
                 "instance": strategy,
+                "type": strategy_type,
                 "enabled": False,
                 "last_run": 0,
                 "stats": {
                     "runs": 0,
                     "signals": 0,
-                    "trades": 0
+                    "trades": 0,
+                    "internal_fills": 0,  # 信号轧差时在内部撮合（全部或部分）的次数
+                    "errors": 0,
+                    "timeouts": 0,  # 单次执行超时次数
+                    "skipped": 0    # 上一次执行未结束而跳过的次数
                 }
             }
             
@@ -69,7 +161,13 @@ class StrategyEngine:
                 print(f"策略参数无效: {strategy_id}")
                 return False
                 
+            symbol = strategy_instance.parameters["symbol"]
+            self.scheduler.add(strategy_id, symbol, strategy_trigger(strategy_instance.parameters), time.time())
             strategy_info["enabled"] = True
+            # 重新启用时清除超时计数和自动禁用原因
+            strategy_info.pop("disabled_reason", None)
+            self.executor.record_success(strategy_id)
+            self.market_bus.subscribe(strategy_id, symbol, MARKET_CHANNEL)
             logger.info(f"策略 {strategy_id} 已启用")
             return True
         except Exception as e:
@@ -101,6 +199,8 @@ class StrategyEngine:
         """禁用策略"""
         if strategy_id in self.strategies:
             self.strategies[strategy_id]["enabled"] = False
+            self.market_bus.unsubscribe(strategy_id)
+            self.scheduler.remove(strategy_id)
             logger.info(f"策略 {strategy_id} 已禁用")
             return True
         logger.error(f"策略 {strategy_id} 不存在")
@@ -109,30 +209,36 @@ class StrategyEngine:
     async def update_market_data(self):
         """更新市场数据"""
         while self.is_running:
+            cycle_start = time.perf_counter()
             try:
-                # 获取账户数据
-                account_data = self.okx_client.get_account_balance()
-                if account_data.get("success", False):
-                    self.account_data = account_data.get("data", {})
+                # 私有频道推送可用时账户和持仓由推送更新，否则并发获取
+                if self.account_feed is None or not self.account_feed.is_ready():
+                    account_data, positions_data = await asyncio.gather(
+                        self.okx_client.get_account_balance(),
+                        self.okx_client.get_positions()
+                    )
+                    if account_data.get("success", False):
+                        self.account_data = account_data.get("data", {})
+                    
+                    if positions_data.get("success", False):
+                        self.positions = positions_data.get("data", [])
                 
-                # 获取持仓数据
-                positions_data = self.okx_client.get_positions()
-                if positions_data.get("success", False):
-                    self.positions = positions_data.get("data", [])
+                # 只获取有策略订阅的交易对，每个交易对一次
+                symbols = self.market_bus.symbols(MARKET_CHANNEL)
                 
-                # 获取市场数据
-                # 为每个策略获取相应的市场数据
-                symbols = set()
-                for strategy_info in self.strategies.values():
-                    if strategy_info["enabled"]:
-                        symbol = strategy_info["instance"].parameters.get("symbol")
-                        if symbol:
-                            symbols.add(symbol)
+                if self.market_feed is not None:
+                    # 行情由推送更新，这里只维护订阅
+                    await self._sync_feed_subscriptions(symbols)
+                    symbols = [s for s in symbols if not self.market_feed.is_fresh(s)]
                 
-                for symbol in symbols:
-                    market_data = await self.get_market_data(symbol)  # 使用异步方法
+                # 所有交易品种并发获取
+                symbols = list(symbols)
+                # 交易品种较多时先一次获取行情快照，之后逐个品种的行情从快照中查询
+                await self.okx_client.get_tickers(symbols)
+                results = await asyncio.gather(*[self._fetch_market_data(symbol) for symbol in symbols])
+                for symbol, market_data in zip(symbols, results):
                     if market_data:
-                        self.market_data[symbol] = market_data
+                        self._publish_market_data(symbol, market_data)
                     else:
                         logger.warning(f"无法获取 {symbol} 的市场数据")
                 
@@ -140,92 +246,244 @@ class StrategyEngine:
             except Exception as e:
                 logger.error(f"更新市场数据错误: {str(e)}")
                 traceback.print_exc()  # 添加堆栈跟踪以便调试
+            self._cycle_latency.labels().observe(time.perf_counter() - cycle_start)
             
             await asyncio.sleep(self.update_interval)
     
+    async def _fetch_market_data(self, symbol):
+        """获取单个交易对的市场数据并记录耗时"""
+        start = time.perf_counter()
+        market_data = await self.get_market_data(symbol)
+        self._fetch_latency.labels(symbol).observe(time.perf_counter() - start)
+        return market_data
+    
+    def _publish_market_data(self, symbol, market_data):
+        """发布到市场数据总线并唤醒策略循环"""
+        if self.market_bus.publish(symbol, MARKET_CHANNEL, market_data):
+            self._market_updated.set()
+    
+    @property
+    def market_data(self):
+        """各交易对的最新市场数据 {symbol: market_data}"""
+        return self.market_bus.latest(MARKET_CHANNEL)
+    
     async def run_strategies(self):
-        """运行所有启用的策略"""
+        """
+        运行策略，同一轮产生的交易动作合并后批量提交
+        
+        循环在有新市场数据或调度器的下一个定时触发到期时醒来，由调度器按各策略的触发方式
+        （tick：每次数据更新；bar：K线收盘；interval：固定间隔）选出本轮要执行的策略，
+        市场数据取自总线，策略本身不再各自请求。没有到期的策略时不执行任何策略。
+        同一轮的策略由执行器并发执行，单个策略超时不会阻塞其他策略。
+        """
         while self.is_running:
+            # 最多等待1秒，以便及时检查 is_running
+            wakeup = self.scheduler.next_wakeup(time.time())
+            try:
+                await asyncio.wait_for(self._market_updated.wait(), min(wakeup, 1.0) if wakeup is not None else 1.0)
+            except asyncio.TimeoutError:
+                pass
+            self._market_updated.clear()
+            
             current_time = time.time()
+            actions = []
+            signaled_at = {}
             
-            for strategy_id, strategy_info in self.strategies.items():
-                if not strategy_info["enabled"]:
+            updates = self.market_bus.updates_since(self._bus_version, MARKET_CHANNEL)
+            self._bus_version = self.market_bus.version
+            for symbol, _, market_data in updates:
+                if market_data.get("timestamp"):
+                    self._data_age.labels(symbol).observe(max(0.0, current_time - market_data["timestamp"] / 1000))
+            
+            runs = []
+            for strategy_id in self.scheduler.collect(current_time, [update[0] for update in updates], self._newest_bar_ms):
+                strategy_info = self.strategies.get(strategy_id)
+                if strategy_info is None or not strategy_info["enabled"]:
                     continue
-                    
-                try:
-                    strategy = strategy_info["instance"]
-                    symbol = strategy.parameters.get("symbol")
-                    
-                    # 获取该策略需要的市场数据
-                    market_data = await self.get_market_data(symbol)
-                    
-                    if not market_data:
-                        logger.warning(f"策略 {strategy_id} - 无法获取市场数据")
-                        continue
-                    
-                    # 执行策略
-                    result = strategy.execute(
-                        market_data=market_data,  # 直接传递整个market_data对象
-                        positions=self.positions,
-                        account=self.account_data
-                    )
-                    
-                    # 处理策略结果
-                    if result and "action" in result:
-                        await self._execute_strategy_action(strategy_id, result)
-                    
-                    # 更新统计信息
-                    strategy_info["last_run"] = current_time
-                    strategy_info["stats"]["runs"] += 1
-                    
-                except Exception as e:
-                    logger.error(f"执行策略 {strategy_id} 错误: {str(e)}")
-                    traceback.print_exc()  # 添加堆栈跟踪以便调试
+                market_data = self.market_bus.get(strategy_info["instance"].parameters.get("symbol"), MARKET_CHANNEL)
+                if market_data:
+                    runs.append(self._execute_strategy(strategy_id, strategy_info, market_data, current_time))
+            
+            for strategy_id, result, finished_at in await asyncio.gather(*runs):
+                # 处理策略结果，本轮结束后统一提交
+                if result and "action" in result:
+                    actions.append((strategy_id, result))
+                    signaled_at[strategy_id] = finished_at
             
-            await asyncio.sleep(1)  # 策略执行间隔
+            if actions:
+                await self._execute_strategy_actions(actions, signaled_at)
+    
+    def _newest_bar_ms(self, symbol):
+        """总线上该交易对市场数据中最新一根K线的开盘时间（毫秒）"""
+        market_data = self.market_bus.get(symbol, MARKET_CHANNEL)
+        if not market_data or not market_data.get("kline"):
+            return None
+        return int(market_data["kline"][0][0])
+    
+    async def _execute_strategy(self, strategy_id, strategy_info, market_data, current_time):
+        """
+        用总线分发的市场数据执行单个策略，返回 (策略ID, 策略结果, 完成时的 perf_counter)
+        
+        连续超时达到执行器的 max_overruns 次后自动禁用该策略。
+        """
+        start = time.perf_counter()
+        try:
+            # 执行策略，直接传递整个market_data对象
+            result = await self.executor.execute(
+                strategy_id, strategy_info.get("type"), strategy_info["instance"],
+                market_data, self.positions, self.account_data
+            )
+        except StrategyBusy:
+            strategy_info["stats"]["skipped"] += 1
+            return strategy_id, None, time.perf_counter()
+        except StrategyTimeout as e:
+            # 上一次超时的调用仍卡在线程里时本轮不执行，但同样计入连续超限，卡死的策略才会被禁用
+            strategy_info["stats"]["timeouts"] += 1
+            if not isinstance(e, StrategyStillRunning):
+                self._execute_latency.labels(strategy_id).observe(time.perf_counter() - start)
+            logger.warning(str(e))
+            if self.executor.record_overrun(strategy_id):
+                logger.error(f"策略 {strategy_id} 连续 {self.executor.max_overruns} 次执行超时，已自动禁用")
+                self.disable_strategy(strategy_id)
+                strategy_info["disabled_reason"] = "timeout"
+            return strategy_id, None, time.perf_counter()
+        except Exception as e:
+            strategy_info["stats"]["errors"] += 1
+            logger.error(f"执行策略 {strategy_id} 错误: {str(e)}")
+            traceback.print_exc()  # 添加堆栈跟踪以便调试
+            return strategy_id, None, time.perf_counter()
+        finished_at = time.perf_counter()
+        self._execute_latency.labels(strategy_id).observe(finished_at - start)
+        self.executor.record_success(strategy_id)
+        
+        # 更新统计信息
+        strategy_info["last_run"] = current_time
+        strategy_info["stats"]["runs"] += 1
+        return strategy_id, result, finished_at
+    
+    def _build_order(self, action: Dict) -> Dict:
+        """将策略动作转换为下单参数"""
+        order = {
+            "instId": action.get("symbol"),
+            "tdMode": action.get("td_mode", "cross"),
+            "side": action.get("action"),
+            "ordType": action.get("order_type", "market"),
+            "sz": str(action.get("size")),
+            "tag": ORDER_TAG
+        }
+        if order["ordType"] == "limit" and action.get("price") is not None:
+            order["px"] = str(action.get("price"))
+        return order
     
     async def _execute_strategy_action(self, strategy_id: str, action: Dict):
         """执行策略产生的交易动作"""
+        await self._execute_strategy_actions([(strategy_id, action)])
+    
+    async def _execute_strategy_actions(self, actions, signaled_at: Dict[str, float] = None):
+        """
+        提交同一轮产生的全部交易动作
+        
+        买卖动作先按交易对轧差（见 SignalNetter），相抵部分记为各策略的内部成交；
+        净额订单和 cancel 动作交给订单管理（OrderManager）排队，由其后台任务合并为批量请求执行。
+        这里只等待入队（队列满时等待），不等待交易所回报，回报由 _on_order_event 对应回产生订单的全部策略。
+        :param signaled_at: {策略ID: 产生信号时的 perf_counter}，用于统计信号到回报的延迟
+        """
+        submitted_at = time.perf_counter()
+        signaled_at = signaled_at or {}
         try:
-            action_type = action.get("action")
-            
-            if action_type == "buy":
-                # 执行买入操作
-                result = self.okx_client.place_order(
-                    instId=action.get("symbol"),
-                    tdMode="cross",
-                    side="buy",
-                    ordType="market",
-                    sz=action.get("size")
-                )
-                
-                if result.get("success", False):
-                    logger.info(f"策略 {strategy_id} 买入信号执行成功: {action}")
-                    self.strategies[strategy_id]["stats"]["trades"] += 1
-                else:
-                    logger.error(f"策略 {strategy_id} 买入信号执行失败: {result.get('msg', '')}")
-                
-            elif action_type == "sell":
-                # 执行卖出操作
-                result = self.okx_client.place_order(
-                    instId=action.get("symbol"),
-                    tdMode="cross",
-                    side="sell",
-                    ordType="market",
-                    sz=action.get("size")
-                )
-                
-                if result.get("success", False):
-                    logger.info(f"策略 {strategy_id} 卖出信号执行成功: {action}")
-                    self.strategies[strategy_id]["stats"]["trades"] += 1
-                else:
-                    logger.error(f"策略 {strategy_id} 卖出信号执行失败: {result.get('msg', '')}")
-            
-            self.strategies[strategy_id]["stats"]["signals"] += 1
+            trade_actions = []
+            for strategy_id, action in actions:
+                if strategy_id in self.strategies:
+                    self.strategies[strategy_id]["stats"]["signals"] += 1
+                action_type = action.get("action")
+                if action_type in ("buy", "sell"):
+                    trade_actions.append((strategy_id, action))
+                elif action_type == "cancel":
+                    await self.order_manager.cancel(action.get("symbol"), ord_id=action.get("order_id"),
+                                                    cl_ord_id=action.get("client_order_id"),
+                                                    owners=[(strategy_id, action)])
             
+            if self.net_signals:
+                netted, fills = self.netter.net(trade_actions, self._reference_prices(trade_actions))
+                self._apply_internal_fills(fills)
+            else:
+                netted = [(action, [(strategy_id, action)]) for strategy_id, action in trade_actions]
+            for order_action, owners in netted:
+                await self.order_manager.submit(
+                    self._build_order(order_action), owners,
+                    {strategy_id: signaled_at.get(strategy_id, submitted_at) for strategy_id, _ in owners})
         except Exception as e:
             logger.error(f"执行策略动作错误: {str(e)}")
     
+    def _on_order_event(self, event, record):
+        """订单管理回调：下单/撤单回报记入策略统计和延迟，成交和完成只记录日志"""
+        if event in ("ack", "reject"):
+            acked_at = time.perf_counter()
+            for strategy_id, action in record["owners"]:
+                self._ack_latency.labels(strategy_id).observe(
+                    acked_at - record["signaled_at"].get(strategy_id, acked_at))
+                if event == "ack":
+                    logger.info(f"策略 {strategy_id} {action.get('action')} 信号执行成功: {action}, "
+                                f"clOrdId={record['clOrdId']}, ordId={record['ordId']}")
+                    if strategy_id in self.strategies:
+                        self.strategies[strategy_id]["stats"]["trades"] += 1
+                else:
+                    logger.error(f"策略 {strategy_id} {action.get('action')} 信号执行失败: {record['msg']}")
+        elif event == "cancel":
+            for strategy_id, action in record["owners"]:
+                if record["sCode"] == "0":
+                    logger.info(f"策略 {strategy_id} cancel 信号执行成功: {action}")
+                else:
+                    logger.error(f"策略 {strategy_id} cancel 信号执行失败: {record['msg']}")
+        elif event == "final":
+            logger.info(f"订单 {record['clOrdId']} {record['state']}，成交 {record['accFillSz']}，均价 {record['avgPx']}")
+    
+    def _reference_prices(self, actions):
+        """内部撮合记录使用的参考价：总线上各交易对的最新价"""
+        prices = {}
+        for _, action in actions:
+            symbol = action.get("symbol")
+            market_data = self.market_bus.get(symbol, MARKET_CHANNEL)
+            if symbol not in prices and market_data and market_data.get("last"):
+                prices[symbol] = float(market_data["last"])
+        return prices
+    
+    def _apply_internal_fills(self, fills):
+        """内部撮合的虚拟成交记入策略统计，信号全部内部成交时不再下单，直接计为一次成交"""
+        for strategy_id, action, size in fills:
+            strategy_info = self.strategies.get(strategy_id)
+            if strategy_info is None:
+                continue
+            strategy_info["stats"]["internal_fills"] += 1
+            try:
+                complete = size >= float(action.get("size")) - 1e-9
+            except (TypeError, ValueError):
+                complete = False
+            if complete:
+                strategy_info["stats"]["trades"] += 1
+            logger.info(f"策略 {strategy_id} {action.get('action')} 信号内部撮合 {size}: {action}")
+    
+    async def cancel_all_orders(self):
+        """撤销本引擎提交（带 ORDER_TAG 标签）的全部未成交订单"""
+        pending = await self.okx_client.get_pending_orders()
+        if not pending.get("success", False):
+            logger.error(f"获取未成交订单失败: {pending.get('msg', '')}")
+            return pending
+        cancels = [
+            {"instId": order["instId"], "ordId": order["ordId"]}
+            for order in pending.get("data", []) if order.get("tag") == ORDER_TAG
+        ]
+        if not cancels:
+            return {"success": True, "data": [], "msg": "success"}
+        result = await self.okx_client.cancel_orders(cancels)
+        # 推送可能已停止，撤单成功的订单直接在订单管理中标记为已撤销
+        self.order_manager.apply_updates([
+            {"ordId": item.get("ordId"), "clOrdId": item.get("clOrdId"), "state": "canceled"}
+            for item in result.get("data") or [] if item.get("sCode") == "0"
+        ])
+        logger.info(f"已撤销 {len(cancels)} 个未成交订单: {result.get('msg')}")
+        return result
+    
     async def start(self):
         """启动策略引擎"""
         if self.is_running:
@@ -235,6 +493,21 @@ class StrategyEngine:
         self.is_running = True
         logger.info("策略引擎启动")
         
+        if self.market_feed is not None:
+            await self.market_feed.start()
+        if self.account_feed is not None:
+            await self.account_feed.start()
+        
+        if self.snapshot_store is not None:
+            try:
+                await self.restore_snapshot()
+            except Exception as e:
+                logger.error(f"恢复策略快照失败: {str(e)}")
+                traceback.print_exc()
+            asyncio.create_task(self._snapshot_loop())
+        
+        self.order_manager.start()
+        
         # 启动数据更新任务
         asyncio.create_task(self.update_market_data())
         
@@ -244,8 +517,123 @@ class StrategyEngine:
     async def stop(self):
         """停止策略引擎"""
         self.is_running = False
+        await self.order_manager.stop()
+        if self.cancel_orders_on_stop:
+            try:
+                await self.cancel_all_orders()
+            except Exception as e:
+                logger.error(f"停止时撤单失败: {str(e)}")
+        if self.market_feed is not None:
+            await self.market_feed.stop()
+        if self.account_feed is not None:
+            await self.account_feed.stop()
+        await self.okx_client.close()
+        self.save_snapshot()
+        self.executor.shutdown()
         logger.info("策略引擎停止")
         
+    def get_snapshot(self):
+        """导出所有策略的定义和运行时状态，供 StrategySnapshotStore 保存"""
+        return {
+            "saved_at": time.time(),
+            "strategies": {
+                strategy_id: {
+                    "type": strategy_info.get("type"),
+                    "name": strategy_info["instance"].name,
+                    "description": strategy_info["instance"].description,
+                    "parameters": dict(strategy_info["instance"].parameters),
+                    "enabled": strategy_info["enabled"],
+                    "state": strategy_info["instance"].get_state()
+                }
+                for strategy_id, strategy_info in self.strategies.items()
+            }
+        }
+    
+    def save_snapshot(self):
+        """立即保存快照，返回是否成功"""
+        if self.snapshot_store is None:
+            return False
+        try:
+            self.snapshot_store.save(self.get_snapshot())
+            return True
+        except Exception as e:
+            logger.error(f"保存策略快照失败: {str(e)}")
+            return False
+    
+    async def _snapshot_loop(self):
+        """按快照间隔定期保存，文件写入在线程中进行"""
+        while self.is_running:
+            await asyncio.sleep(self.snapshot_store.interval)
+            if not self.is_running:
+                break
+            try:
+                await asyncio.to_thread(self.snapshot_store.save, self.get_snapshot())
+            except Exception as e:
+                logger.error(f"保存策略快照失败: {str(e)}")
+    
+    async def restore_snapshot(self):
+        """
+        从快照恢复策略，返回恢复的策略数
+        
+        快照中有而当前未注册的策略按快照重新注册，已注册的策略改用快照中的参数；
+        恢复运行时状态（价格历史、信号冷却等）后，按K线收盘触发的策略用停机期间收盘的同周期K线补齐，
+        其他触发方式的策略按秒级节奏采样，丢弃恢复的历史，最后按快照启用。
+        """
+        snapshot = self.snapshot_store.load()
+        if not snapshot:
+            return 0
+        saved_at = snapshot["saved_at"]
+        restored = {}
+        for strategy_id, item in snapshot.get("strategies", {}).items():
+            try:
+                if strategy_id not in self.strategies:
+                    self.register_strategy(item["type"], strategy_id, item.get("name"),
+                                           item.get("description"), item.get("parameters"))
+                elif item.get("parameters"):
+                    self.update_strategy_parameters(strategy_id, item["parameters"])
+                self.strategies[strategy_id]["instance"].set_state(item.get("state") or {})
+                restored[strategy_id] = item
+            except Exception as e:
+                logger.error(f"恢复策略 {strategy_id} 失败: {str(e)}")
+        
+        by_bar = {}
+        for strategy_id in restored:
+            instance = self.strategies[strategy_id]["instance"]
+            spec = strategy_trigger(instance.parameters)
+            if spec["trigger"] != TRIGGER_BAR:
+                instance.reset_history()
+                continue
+            by_bar.setdefault((instance.parameters.get("symbol"), spec["bar"]), []).append(strategy_id)
+        for (symbol, bar), strategy_ids in by_bar.items():
+            closes = await self._missed_closes(symbol, bar, saved_at)
+            for strategy_id in strategy_ids:
+                if closes:
+                    self.strategies[strategy_id]["instance"].backfill(closes)
+        
+        for strategy_id, item in restored.items():
+            if item.get("enabled"):
+                self.enable_strategy(strategy_id)
+        logger.info(f"已从快照恢复 {len(restored)} 个策略，快照保存于 {time.time() - saved_at:.0f} 秒前")
+        return len(restored)
+    
+    async def _missed_closes(self, symbol, bar, since):
+        """快照保存（since，秒）之后收盘的K线收盘价，按时间升序；优先请求交易所，失败时读取本地存储"""
+        bar_ms = bar_to_ms(bar)
+        since_ms = int(since * 1000)
+        now_ms = int(time.time() * 1000)
+        if now_ms - since_ms < bar_ms:
+            return []
+        rows = []
+        limit = min(self._kline_seed_limit(), (now_ms - since_ms) // bar_ms + 2)
+        kline_data = await self.okx_client.get_kline_data(symbol, bar, limit)
+        if kline_data.get("success", False) and kline_data.get("data"):
+            rows = [(int(row[0]), float(row[4])) for row in kline_data["data"]]
+        elif self.candle_store is not None:
+            candles = await asyncio.to_thread(self.candle_store.get_candles, symbol, bar, since_ms - bar_ms, now_ms)
+            rows = [(candle["timestamp"], candle["close"]) for candle in candles]
+        # 收盘时间在快照之后、且已经收盘的K线
+        return [close for ts, close in sorted(rows) if since_ms < ts + bar_ms <= now_ms]
+    
     def get_strategy_info(self, strategy_id):
         """获取策略信息"""
         if strategy_id not in self.strategies:
@@ -261,6 +649,9 @@ class StrategyEngine:
             "description": strategy.description,
             "parameters": strategy.parameters,
             "enabled": strategy_info["enabled"],
+            "disabled_reason": strategy_info.get("disabled_reason"),
+            "execution_mode": self.executor.mode_for(strategy_info.get("type")),
+            "trigger": self.scheduler.trigger_of(strategy_id),
             "last_run": strategy_info["last_run"],
             "stats": strategy_info["stats"]
         }
@@ -277,6 +668,9 @@ class StrategyEngine:
                 "description": strategy.description,
                 "parameters": strategy.parameters,
                 "enabled": strategy_info["enabled"],
+                "disabled_reason": strategy_info.get("disabled_reason"),
+                "execution_mode": self.executor.mode_for(strategy_info.get("type")),
+                "trigger": self.scheduler.trigger_of(strategy_id),
                 "last_run": strategy_info["last_run"],
                 "stats": strategy_info["stats"]
             })
@@ -289,8 +683,15 @@ class StrategyEngine:
             return False
             
         try:
-            strategy = self.strategies[strategy_id]["instance"]
+            strategy_info = self.strategies[strategy_id]
+            strategy = strategy_info["instance"]
             strategy.update_parameters(parameters)
+            if strategy_info["enabled"]:
+                # 交易对和触发方式可能已改变，重新订阅
+                self.market_bus.unsubscribe(strategy_id)
+                self.market_bus.subscribe(strategy_id, strategy.parameters.get("symbol"), MARKET_CHANNEL)
+                self.scheduler.add(strategy_id, strategy.parameters.get("symbol"),
+                                   strategy_trigger(strategy.parameters), time.time())
             logger.info(f"策略 {strategy_id} 参数已更新")
             return True
         except Exception as e:
@@ -310,7 +711,7 @@ class StrategyEngine:
         try:
             # 获取市场数据
             symbol = strategy_info["instance"].parameters.get("symbol", "BTC-USDT-SWAP")
-            market_data = await self.get_market_data(symbol)
+            market_data = self.market_bus.get(symbol, MARKET_CHANNEL) or await self.get_market_data(symbol)
             
             if not market_data:
                 logger.warning(f"策略 {strategy_id} - 无法获取市场数据")
@@ -336,18 +737,91 @@ class StrategyEngine:
             logger.error(f"执行策略 {strategy_id} 错误: {str(e)}")
             traceback.print_exc()
 
+    async def _sync_feed_subscriptions(self, symbols):
+        """订阅新启用的交易对，取消已不再使用的交易对；K线缓存先用REST初始化"""
+        for symbol in symbols:
+            if symbol not in self._feed_symbols:
+                await self.market_feed.subscribe_ticker(symbol)
+                await self.market_feed.subscribe_candles(symbol, "1m")
+                if self.book_channel:
+                    await self.market_feed.subscribe_books(symbol, self.book_channel)
+                self._feed_symbols.add(symbol)
+            if self.market_feed.needs_seed(symbol, "1m") or self.klines.needs_seed(symbol, "1m"):
+                kline_data = await self.okx_client.get_kline_data(symbol, "1m", self._kline_seed_limit())
+                if kline_data.get("success", False) and kline_data.get("data"):
+                    self.market_feed.seed_candles(symbol, "1m", kline_data["data"])
+                    self.klines.seed(symbol, "1m", kline_data["data"])
+        
+        for symbol in self._feed_symbols - set(symbols):
+            await self.market_feed.unsubscribe_symbol(symbol)
+            self._feed_symbols.discard(symbol)
+            self.klines.remove(symbol)
+    
+    def _feed_market_data(self, symbol):
+        """由推送缓存构建与 get_market_data 相同格式的市场数据"""
+        ticker = self.market_feed.get_ticker(symbol)
+        buffer = self.klines.get(symbol, "1m")
+        if not ticker or buffer is None or not buffer.count:
+            return None
+        market_data = {
+            "symbol": symbol,
+            "last": ticker["last"],
+            **self._kline_fields(buffer),
+            "timestamp": int(time.time() * 1000)
+        }
+        book = self.market_feed.get_book(symbol)
+        if book is not None:
+            # 订单簿可用时使用订单簿的最优价和前5档深度
+            market_data["order_book"] = book.summary(5)
+            market_data["best_bid"] = book.best_bid
+            market_data["best_ask"] = book.best_ask
+        else:
+            market_data.update(self._ticker_quotes(ticker))
+        return market_data
+    
+    @staticmethod
+    def _ticker_quotes(ticker):
+        """从行情数据中取最优买卖价，没有订单簿时使用"""
+        return {
+            "order_book": None,
+            "best_bid": float(ticker["bidPx"]) if ticker.get("bidPx") else None,
+            "best_ask": float(ticker["askPx"]) if ticker.get("askPx") else None
+        }
+    
+    def _on_feed_update(self, channel, symbol, data):
+        """推送回调：更新市场数据，新K线开始时将上一根已收盘K线写入存储"""
+        if symbol not in self._feed_symbols:
+            return
+        if channel.startswith("candle") and not self.klines.needs_seed(symbol, data["bar"]):
+            self.klines.update(symbol, data["bar"], data["rows"])
+        market_data = self._feed_market_data(symbol)
+        if market_data:
+            self._publish_market_data(symbol, market_data)
+        if channel.startswith("candle") and data.get("new_bar") and not self.market_feed.needs_seed(symbol, data["bar"]):
+            asyncio.create_task(self._persist_klines(symbol, data["bar"], self.market_feed.get_candles(symbol, data["bar"])))
+    
+    def _on_account_update(self, channel, feed):
+        """私有频道推送回调：同步账户和持仓"""
+        if channel in ("account", "snapshot"):
+            self.account_data = feed.account
+        if channel in ("positions", "snapshot"):
+            self.positions = feed.positions
+    
     async def get_market_data(self, symbol):
-        """获取市场数据"""
+        """获取市场数据，推送数据可用时直接使用，否则请求REST接口"""
+        if self.market_feed is not None and self.market_feed.is_fresh(symbol):
+            return self._feed_market_data(symbol)
         try:
-            # 获取K线数据
-            kline_data = self.okx_client.get_kline_data(symbol, "1m", 100)
+            # 并发获取K线数据和当前价格，K线缓冲区初始化后只获取最近几根
+            kline_limit, seed = self._kline_fetch_limit(symbol, "1m")
+            kline_data, ticker_data = await asyncio.gather(
+                self.okx_client.get_kline_data(symbol, "1m", kline_limit),
+                self.okx_client.get_ticker(symbol)
+            )
             
             # 记录K线数据响应
             logger.debug(f"K线数据响应: {kline_data}")
             
-            # 获取当前价格
-            ticker_data = self.okx_client.get_ticker(symbol)
-            
             # 记录Ticker数据响应
             logger.debug(f"Ticker数据响应: {ticker_data}")
             
@@ -366,12 +840,22 @@ class StrategyEngine:
                 logger.warning(f"市场数据长度为0: ticker_length={len(ticker_data['data'])}, kline_length={len(kline_data['data'])}")
                 return None
                 
+            # 已收盘的K线写入本地存储
+            await self._persist_klines(symbol, "1m", kline_data["data"])
+            
+            buffer = self.klines.buffer(symbol, "1m")
+            if seed:
+                buffer.seed(kline_data["data"])
+            else:
+                buffer.update(kline_data["data"])
+                
             # 构建市场数据对象
             market_data = {
                 "symbol": symbol,
                 "last": ticker_data["data"][0]["last"],
-                "kline": kline_data["data"],
-                "timestamp": int(time.time() * 1000)
+                **self._kline_fields(buffer),
+                "timestamp": int(time.time() * 1000),
+                **self._ticker_quotes(ticker_data["data"][0])
             }
             
             return market_data
@@ -379,4 +863,56 @@ class StrategyEngine:
             logger.error(f"获取市场数据时出错: {str(e)}")
             # 打印详细的异常堆栈
             traceback.print_exc()
-            return None
\ No newline at end of file
+            return None
+
+    def _kline_seed_limit(self):
+        """初始化K线缓冲区时获取的根数，受 /market/candles 单次300条的限制"""
+        return min(self.klines.capacity, 300)
+    
+    def _kline_fetch_limit(self, symbol, bar):
+        """
+        REST轮询时需要获取的K线根数，返回 (根数, 是否重新初始化缓冲区)
+        
+        缓冲区已初始化时只取未收盘K线和上一根（其收盘后的最终值），距上次更新跨过多根K线时相应多取；
+        缺口超过一次请求的上限时重新初始化。
+        """
+        buffer = self.klines.get(symbol, bar)
+        if buffer is None or buffer.needs_seed or not buffer.count:
+            return self._kline_seed_limit(), True
+        missed = int((time.time() * 1000 - buffer.newest_ts) // bar_to_ms(bar))
+        if missed + 2 >= self._kline_seed_limit():
+            return self._kline_seed_limit(), True
+        return max(2, missed + 2), False
+    
+    @staticmethod
+    def _kline_fields(buffer):
+        """
+        市场数据中的K线字段
+        
+        kline_array 为发布时缓冲区的只读副本（按时间倒序，列见 kline_buffer.KLINE_COLUMNS）；
+        kline 为同一数据的OKX原始格式视图，兼容按行取值的旧策略，访问时才转换。
+        
+        每次发布复制一次（300根约20KB），由该交易对的所有策略共享：策略在线程池或向工作进程序列化时，
+        事件循环仍会原地更新未收盘K线、回绕后覆盖最旧的行，直接传缓冲区视图会读到不一致的行。
+        """
+        snapshot = buffer.view().copy()
+        snapshot.flags.writeable = False
+        return {"kline": KlineRows(snapshot), "kline_array": snapshot}
+    
+    async def _persist_klines(self, symbol, bar, raw_klines):
+        """将新收盘的K线写入本地存储，每根K线收盘后只写一次"""
+        if self.candle_store is None or not raw_klines:
+            return
+        try:
+            # OKX返回的K线按时间倒序，第一根为未收盘K线，第二根为最新已收盘K线
+            if len(raw_klines) < 2:
+                return
+            latest_closed = int(raw_klines[1][0])
+            key = (symbol, bar)
+            if self._persisted_until.get(key, 0) >= latest_closed:
+                return
+            candles = OKXClient._format_candles(raw_klines)
+            await asyncio.to_thread(self.candle_store.upsert_candles, symbol, bar, candles, True)
+            self._persisted_until[key] = latest_closed
+        except Exception as e:
+            logger.error(f"写入K线存储错误: {str(e)}")
@@ -0,0 +1,438 @@
+import asyncio
+import functools
+import logging
+import multiprocessing
+import os
+import signal
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, Tuple
+
+import numpy as np
+
+from kline_buffer import KlineRingBuffer, KlineRows, parse_kline_rows, TS
+from strategies.strategy_factory import StrategyFactory
+
+logger = logging.getLogger("StrategyExecutor")
+
+# 执行方式
+MODE_INLINE = "inline"    # 直接在事件循环中执行，只适合很快的策略
+MODE_THREAD = "thread"    # 线程池执行，超时后不再等待，但线程无法被终止
+MODE_PROCESS = "process"  # 常驻工作进程执行，超时后终止并重启该进程
+
+# 各策略类型默认的执行方式，未列出的类型使用 default_mode；
+# 自定义策略运行用户代码，可能死循环，放到可终止的进程中
+DEFAULT_EXECUTION_MODES = {
+    "custom": MODE_PROCESS,
+}
+
+
+class StrategyTimeout(Exception):
+    """策略单次执行超过超时时间"""
+
+
+class StrategyBusy(Exception):
+    """策略上一次执行仍未结束（尚未超时），本轮跳过"""
+
+
+class StrategyStillRunning(StrategyTimeout):
+    """线程模式下上一次超时的调用仍未结束，本轮不执行，仍记为一次超限"""
+
+
+def parse_execution_modes(value: str) -> Dict[str, str]:
+    """解析 "custom=process,ma_cross=thread" 格式的配置"""
+    modes = {}
+    for item in (value or "").split(","):
+        if "=" not in item:
+            continue
+        strategy_type, mode = (part.strip() for part in item.split("=", 1))
+        if mode not in (MODE_INLINE, MODE_THREAD, MODE_PROCESS):
+            raise ValueError(f"不支持的执行方式: {mode}")
+        modes[strategy_type] = mode
+    return modes
+
+
+class KlineDeltaEncoder:
+    """
+    主进程侧：记录已发送给某个工作进程的K线，之后只发送变化的部分
+
+    K线按时间倒序，相邻两轮之间通常只有最新一根（未收盘K线）变化或新增一根，
+    增量为时间戳不早于上次最新K线的那几行；长度变化或无法衔接时发送全量。
+    """
+
+    def __init__(self):
+        self._sent: Dict[str, Tuple[int, int]] = {}  # {symbol: (已发送的最新K线时间戳, 条数)}
+        self.stats = {"full": 0, "delta": 0, "rows": 0}
+
+    def reset(self):
+        self._sent.clear()
+
+    def encode(self, symbol: str, klines: np.ndarray) -> Tuple[str, np.ndarray, int]:
+        """klines 为按时间倒序的K线数组，返回 (类型, 行, 总条数)，类型为 full 或 delta"""
+        state = self._sent.get(symbol)
+        rows = None
+        if len(klines) and state is not None and state[1] == len(klines):
+            # 按时间倒序，不早于上次最新K线的行都在开头
+            count = int(np.count_nonzero(klines[:, TS] >= state[0]))
+            if count < len(klines):
+                rows = klines[:count]
+        self._sent[symbol] = (int(klines[0, TS]), len(klines)) if len(klines) else None
+        if rows is None:
+            rows, kind = klines, "full"
+        else:
+            kind = "delta"
+        self.stats[kind] += 1
+        self.stats["rows"] += len(rows)
+        # 复制为普通数组，避免序列化只读视图背后的整个缓冲区
+        return kind, np.array(rows), len(klines)
+
+
+def _apply_kline_delta(buffers: Dict[str, KlineRingBuffer], symbol: str, delta: Tuple[str, np.ndarray, int]) -> np.ndarray:
+    """工作进程侧：把增量合并到该交易对的K线缓冲区，返回按时间倒序的只读视图"""
+    kind, rows, length = delta
+    buffer = buffers.get(symbol)
+    if kind == "full" or buffer is None or buffer.capacity != length:
+        buffer = KlineRingBuffer(capacity=max(1, length))
+        buffer.seed_array(rows)
+        buffers[symbol] = buffer
+    else:
+        buffer.update_array(rows)
+    return buffer.view()
+
+
+def _worker_main(conn):
+    """
+    工作进程主循环，策略实例常驻在进程中，状态（价格历史等）跨轮保留
+
+    消息: {"id", "create": (类型, 名称, 描述, 参数, 运行时状态) 或 None, "params": 新参数或 None,
+           "symbol", "market": 不含K线的市场数据, "klines": K线增量, "positions", "account"}
+    回复: ("ok", (策略结果, 运行时状态)) 或 ("error", 错误信息)
+    """
+    # Ctrl+C 由主进程处理，工作进程随主进程退出
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    strategies = {}
+    klines = {}
+    # 导入完成后通知主进程，进程启动时间不计入策略的执行超时
+    conn.send(("ready", None))
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message is None:
+            return
+        try:
+            strategy_id = message["id"]
+            # 先合并K线增量，保证进程内缓存与主进程记录的已发送状态一致
+            market_data = message["market"]
+            if message.get("klines") is not None:
+                view = _apply_kline_delta(klines, message["symbol"], message["klines"])
+                market_data["kline"] = KlineRows(view)
+                market_data["kline_array"] = view
+            if message.get("create"):
+                strategy_type, name, description, parameters, state = message["create"]
+                strategies[strategy_id] = StrategyFactory.create_strategy(
+                    strategy_type=strategy_type,
+                    strategy_id=strategy_id,
+                    name=name,
+                    description=description,
+                    parameters=parameters
+                )
+                strategies[strategy_id].set_state(state)
+            elif message.get("params") is not None:
+                strategies[strategy_id].update_parameters(message["params"])
+            result = strategies[strategy_id].execute(
+                market_data=market_data,
+                positions=message["positions"],
+                account=message["account"]
+            )
+            conn.send(("ok", (result, strategies[strategy_id].get_state())))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ProcessStrategyWorker:
+    """
+    一个常驻的策略工作进程及其通信管道
+
+    同一时刻只处理一个调用；超时后终止进程并在下次调用时重启，
+    进程内的策略实例随之重建，运行时状态恢复为最近一次成功调用后同步回主进程的状态。
+    """
+
+    START_TIMEOUT = 30
+
+    def __init__(self, index: int, context):
+        self.index = index
+        self._context = context
+        self.process = None
+        self._conn = None
+        self._lock = asyncio.Lock()
+        self._sent_params: Dict[str, Dict] = {}  # {策略ID: 已发送给进程的参数}
+        self.klines = KlineDeltaEncoder()
+        self.stats = {"calls": 0, "restarts": 0}
+
+    async def _start(self):
+        parent_conn, child_conn = self._context.Pipe()
+        self.process = self._context.Process(target=_worker_main, args=(child_conn,),
+                                             name=f"strategy-worker-{self.index}", daemon=True)
+        self.process.start()
+        child_conn.close()
+        self._conn = parent_conn
+        self._sent_params.clear()
+        self.klines.reset()
+        loop = asyncio.get_running_loop()
+        try:
+            await asyncio.wait_for(loop.run_in_executor(None, parent_conn.recv), self.START_TIMEOUT)
+        except (asyncio.TimeoutError, EOFError, OSError) as e:
+            self.stop()
+            raise RuntimeError(f"策略工作进程启动失败: {e!r}")
+
+    def stop(self):
+        if self.process is None:
+            return
+        if self.process.is_alive():
+            self.process.terminate()
+        self.process.join(timeout=1)
+        self._conn.close()
+        self.process = None
+        self._conn = None
+
+    def discard(self, strategy_id: str):
+        """策略被替换后，下次调用时在进程中重新创建"""
+        self._sent_params.pop(strategy_id, None)
+
+    def _roundtrip(self, conn, message):
+        conn.send(message)
+        return conn.recv()
+
+    async def execute(self, strategy_id: str, strategy_type: str, strategy, market_data: Dict,
+                      positions, account, timeout: float):
+        async with self._lock:
+            if self.process is None or not self.process.is_alive():
+                if self.process is not None:
+                    self.stop()
+                    self.stats["restarts"] += 1
+                await self._start()
+            message = {
+                "id": strategy_id,
+                "create": None,
+                "params": None,
+                "symbol": market_data.get("symbol"),
+                "market": {key: value for key, value in market_data.items() if key not in ("kline", "kline_array")},
+                "klines": None,
+                "positions": positions,
+                "account": account
+            }
+            sent = self._sent_params.get(strategy_id)
+            if sent is None:
+                message["create"] = (strategy_type, strategy.name, strategy.description, dict(strategy.parameters),
+                                     strategy.get_state())
+            elif sent != strategy.parameters:
+                message["params"] = dict(strategy.parameters)
+            if market_data.get("kline_array") is not None:
+                message["klines"] = self.klines.encode(message["symbol"], market_data["kline_array"])
+            elif "kline" in market_data:
+                message["klines"] = self.klines.encode(message["symbol"], parse_kline_rows(market_data["kline"]))
+
+            loop = asyncio.get_running_loop()
+            self.stats["calls"] += 1
+            try:
+                status, payload = await asyncio.wait_for(
+                    loop.run_in_executor(None, self._roundtrip, self._conn, message), timeout)
+            except asyncio.TimeoutError:
+                # 终止卡住的进程，阻塞在 recv 的线程随之收到 EOF 退出
+                self.stop()
+                self.stats["restarts"] += 1
+                raise StrategyTimeout(f"策略 {strategy_id} 执行超过 {timeout} 秒，工作进程已重启")
+            except (EOFError, OSError) as e:
+                self.stop()
+                self.stats["restarts"] += 1
+                raise RuntimeError(f"策略工作进程异常退出: {e}")
+            if status == "error":
+                # 创建失败时进程内没有该策略，下次重新发送创建消息
+                self._sent_params.pop(strategy_id, None)
+                raise RuntimeError(payload)
+            self._sent_params[strategy_id] = dict(strategy.parameters)
+            # 同步进程内的运行时状态，用于快照和工作进程重启后恢复
+            result, state = payload
+            strategy.set_state(state)
+            return result
+
+
+class StrategyExecutor:
+    """
+    按策略类型选择执行方式（事件循环内、线程池、进程池），并限制单次执行时间
+
+    - 超时的调用记为一次超限（overrun），连续 max_overruns 次后 record_overrun 返回 True，由引擎禁用该策略
+    - 线程模式下超时的调用仍在后台运行，结束前该策略的后续调用不执行，但每轮都记为一次超限，
+      卡死的策略因此仍会被禁用；超时时更换线程池，卡住的线程不再占用后续调用的工作线程
+    - 线程模式的超时从工作线程开始执行时计算，在线程池中排队的时间不计入
+    - 进程模式下策略实例常驻工作进程，K线只发送增量；策略按ID固定分配到某个进程
+    - 单个策略可用参数 execution_timeout 覆盖默认超时
+    """
+
+    def __init__(self, modes: Optional[Dict[str, str]] = None, default_mode: str = MODE_THREAD,
+                 timeout: float = 2.0, max_overruns: int = 3, thread_workers: int = 4, process_workers: int = 2):
+        self.modes = dict(DEFAULT_EXECUTION_MODES)
+        if modes:
+            self.modes.update(modes)
+        self.default_mode = default_mode
+        self.timeout = timeout
+        self.max_overruns = max_overruns
+        self.thread_workers = thread_workers
+        self._threads: Optional[ThreadPoolExecutor] = None
+        # 使用 spawn 启动，避免 fork 复制事件循环和线程状态；
+        # 工作进程会以 __mp_main__ 重新导入启动脚本，但不执行其 __main__ 块
+        self._context = multiprocessing.get_context("spawn")
+        self._workers = [ProcessStrategyWorker(index, self._context) for index in range(max(1, process_workers))]
+        self._in_flight = set()  # 线程模式下仍在运行的策略ID
+        self._timed_out = set()  # 其中已超时、仍在后台运行的策略ID
+        self._abandoned_threads = 0  # 因调用超时而被放弃的线程池工作线程数
+        self._pool_abandoned: Optional[asyncio.Future] = None  # 当前线程池被更换时完成
+        self._overruns: Dict[str, int] = {}  # {策略ID: 连续超限次数}
+
+    def mode_for(self, strategy_type: str) -> str:
+        return self.modes.get(strategy_type, self.default_mode)
+
+    def timeout_for(self, strategy) -> float:
+        return float(strategy.parameters.get("execution_timeout", self.timeout))
+
+    def _worker_for(self, strategy_id: str) -> ProcessStrategyWorker:
+        return self._workers[zlib.crc32(strategy_id.encode()) % len(self._workers)]
+
+    async def execute(self, strategy_id: str, strategy_type: str, strategy, market_data: Dict, positions, account):
+        """
+        按策略类型对应的方式执行 strategy.execute，返回策略结果
+
+        超时抛出 StrategyTimeout，上一次调用未结束时抛出 StrategyBusy，策略自身的异常原样抛出
+        """
+        mode = self.mode_for(strategy_type)
+        if mode == MODE_INLINE:
+            return strategy.execute(market_data=market_data, positions=positions, account=account)
+        if mode == MODE_PROCESS:
+            return await self._worker_for(strategy_id).execute(
+                strategy_id, strategy_type, strategy, market_data, positions, account, self.timeout_for(strategy))
+
+        if strategy_id in self._timed_out:
+            raise StrategyStillRunning(f"策略 {strategy_id} 上一次超时的执行仍未结束")
+        if strategy_id in self._in_flight:
+            raise StrategyBusy(f"策略 {strategy_id} 上一次执行尚未结束")
+        loop = asyncio.get_running_loop()
+        self._in_flight.add(strategy_id)
+        try:
+            future = await self._start_in_thread(loop, functools.partial(
+                strategy.execute, market_data=market_data, positions=positions, account=account))
+        except BaseException:
+            self._in_flight.discard(strategy_id)
+            raise
+
+        def finished(_):
+            self._in_flight.discard(strategy_id)
+            self._timed_out.discard(strategy_id)
+
+        future.add_done_callback(finished)
+        timeout = self.timeout_for(strategy)
+        try:
+            # shield：超时只是不再等待，线程结束时才清除运行标记
+            return await asyncio.wait_for(asyncio.shield(future), timeout)
+        except asyncio.TimeoutError:
+            self._timed_out.add(strategy_id)
+            self._abandon_pool()
+            raise StrategyTimeout(f"策略 {strategy_id} 执行超过 {timeout} 秒")
+
+    async def _start_in_thread(self, loop, call):
+        """
+        提交到线程池并等到工作线程开始执行（或已结束）后返回其 future，排队时间不计入超时
+
+        排队期间线程池因其他调用超时被更换时，撤回排队中的调用并提交到新的线程池
+        """
+        while True:
+            if self._threads is None:
+                self._threads = ThreadPoolExecutor(max_workers=self.thread_workers, thread_name_prefix="strategy")
+                self._pool_abandoned = loop.create_future()
+            abandoned = self._pool_abandoned
+            started = loop.create_future()
+
+            def mark_started():
+                if not started.done():
+                    started.set_result(None)
+
+            def run():
+                loop.call_soon_threadsafe(mark_started)
+                return call()
+
+            submitted = self._threads.submit(run)
+            future = asyncio.wrap_future(submitted, loop=loop)
+            await asyncio.wait([started, future, abandoned], return_when=asyncio.FIRST_COMPLETED)
+            # 只有仍在排队的调用能撤回，已开始执行的 cancel() 返回 False
+            if started.done() or future.done() or not submitted.cancel():
+                return future
+
+    def _abandon_pool(self):
+        """
+        卡住的线程会一直占用它所在的工作线程，后续调用改用新的线程池；
+        旧线程池中仍在排队的调用会撤回并提交到新线程池，旧线程池的线程执行完手头的调用后退出
+        """
+        if self._threads is not None:
+            self._threads.shutdown(wait=False)
+            self._threads = None
+            self._abandoned_threads += 1
+            if not self._pool_abandoned.done():
+                self._pool_abandoned.set_result(None)
+
+    def record_success(self, strategy_id: str):
+        self._overruns.pop(strategy_id, None)
+
+    def record_overrun(self, strategy_id: str) -> bool:
+        """记录一次超限，连续超限达到 max_overruns 次时返回 True"""
+        self._overruns[strategy_id] = self._overruns.get(strategy_id, 0) + 1
+        return self._overruns[strategy_id] >= self.max_overruns
+
+    def discard(self, strategy_id: str):
+        """策略被删除或替换时清除其执行状态"""
+        self._overruns.pop(strategy_id, None)
+        self._worker_for(strategy_id).discard(strategy_id)
+
+    def shutdown(self):
+        if self._threads is not None:
+            self._threads.shutdown(wait=False, cancel_futures=True)
+            self._threads = None
+        for worker in self._workers:
+            worker.stop()
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "default_mode": self.default_mode,
+            "modes": self.modes,
+            "timeout": self.timeout,
+            "max_overruns": self.max_overruns,
+            "in_flight": sorted(self._in_flight),
+            "timed_out": sorted(self._timed_out),
+            "abandoned_threads": self._abandoned_threads,
+            "overruns": dict(self._overruns),
+            "workers": [
+                {
+                    "index": worker.index,
+                    "alive": worker.process is not None and worker.process.is_alive(),
+                    **worker.stats,
+                    "klines": dict(worker.klines.stats)
+                }
+                for worker in self._workers
+            ]
+        }
+
+
+def executor_from_env() -> StrategyExecutor:
+    """
+    由环境变量创建执行器
+    STRATEGY_EXECUTION_MODE: 默认执行方式；STRATEGY_EXECUTION_MODES: 按类型覆盖，如 custom=process,grid=inline
+    STRATEGY_TIMEOUT: 单次执行超时（秒）；STRATEGY_MAX_OVERRUNS: 连续超限多少次后禁用
+    """
+    return StrategyExecutor(
+        modes=parse_execution_modes(os.environ.get("STRATEGY_EXECUTION_MODES", "")),
+        default_mode=os.environ.get("STRATEGY_EXECUTION_MODE", MODE_THREAD),
+        timeout=float(os.environ.get("STRATEGY_TIMEOUT", "2")),
+        max_overruns=int(os.environ.get("STRATEGY_MAX_OVERRUNS", "3")),
+        thread_workers=int(os.environ.get("STRATEGY_THREAD_WORKERS", "4")),
+        process_workers=int(os.environ.get("STRATEGY_PROCESS_WORKERS", "2"))
+    )
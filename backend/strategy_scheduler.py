@@ -0,0 +1,160 @@
+import heapq
+import itertools
+import math
+from typing import Optional, Dict, Any, List, Set, Callable, Iterable
+
+from bar_utils import bar_to_seconds, next_bar_close
+
+# 策略触发方式
+TRIGGER_TICK = "tick"          # 每次该交易对的市场数据更新
+TRIGGER_BAR = "bar"            # 每根 bar 周期的K线收盘
+TRIGGER_INTERVAL = "interval"  # 每 interval 秒一次（按整倍数对齐），期间没有新数据时跳过
+
+# 未声明触发方式的策略每秒最多执行一次，与原先固定1秒的循环一致
+DEFAULT_TRIGGER = TRIGGER_INTERVAL
+DEFAULT_INTERVAL = 1.0
+
+
+def strategy_trigger(parameters: Dict[str, Any]) -> Dict[str, Any]:
+    """从策略参数中读取触发方式：trigger（tick/bar/interval）、bar（默认1m）、interval（秒）"""
+    trigger = parameters.get("trigger", DEFAULT_TRIGGER)
+    if trigger not in (TRIGGER_TICK, TRIGGER_BAR, TRIGGER_INTERVAL):
+        raise ValueError(f"不支持的触发方式: {trigger}")
+    spec = {"trigger": trigger}
+    if trigger == TRIGGER_BAR:
+        spec["bar"] = parameters.get("bar", "1m")
+        bar_to_seconds(spec["bar"])  # 校验周期
+    elif trigger == TRIGGER_INTERVAL:
+        spec["interval"] = float(parameters.get("interval", DEFAULT_INTERVAL))
+        if spec["interval"] <= 0:
+            raise ValueError("interval 必须大于0")
+    return spec
+
+
+class _Entry:
+    __slots__ = ("strategy_id", "symbol", "spec", "dirty", "pending_close")
+
+    def __init__(self, strategy_id: str, symbol: str, spec: Dict[str, Any]):
+        self.strategy_id = strategy_id
+        self.symbol = symbol
+        self.spec = spec
+        self.dirty = False          # interval：上次执行后该交易对是否有新数据
+        self.pending_close = None   # bar：已到收盘时间、等待收盘后K线的收盘时间（秒）
+
+
+class StrategyScheduler:
+    """
+    按策略声明的触发方式决定每一轮执行哪些策略
+
+    - tick 策略按 交易对 -> 策略 索引，只在该交易对有更新时执行
+    - bar/interval 策略的下一次触发时间放在最小堆中，bar 按交易所K线边界（bar_utils.next_bar_close）对齐；
+      到达收盘时间后等到市场数据中出现收盘后的新K线再执行（最多等待 bar_close_grace 秒），
+      保证策略看到的是已收盘K线的最终值
+    - next_wakeup() 返回距最近一个定时触发的秒数，调用方据此等待，没有到期的策略时不做任何工作
+    """
+
+    def __init__(self, bar_close_grace: float = 2.0):
+        self.bar_close_grace = bar_close_grace
+        self._entries: Dict[str, _Entry] = {}
+        self._tick: Dict[str, Set[str]] = {}      # {symbol: tick 策略}
+        self._interval: Dict[str, Set[str]] = {}  # {symbol: interval 策略}
+        self._heap = []  # [(触发时间, 序号, 条目)]，条目被替换或删除后堆中的旧项在弹出时丢弃
+        self._pending: Set[str] = set()
+        self._sequence = itertools.count()
+        self.stats = {"fired": 0, "bar_closes": 0, "bar_close_timeouts": 0, "interval_skipped": 0}
+
+    def _next_due(self, entry: _Entry, now: float) -> float:
+        if entry.spec["trigger"] == TRIGGER_BAR:
+            return next_bar_close(entry.spec["bar"], now)
+        interval = entry.spec["interval"]
+        return (math.floor(now / interval) + 1) * interval
+
+    def _push(self, entry: _Entry, now: float):
+        heapq.heappush(self._heap, (self._next_due(entry, now), next(self._sequence), entry))
+
+    def add(self, strategy_id: str, symbol: str, spec: Dict[str, Any], now: float):
+        """添加或替换策略的触发方式"""
+        self.remove(strategy_id)
+        entry = _Entry(strategy_id, symbol, spec)
+        self._entries[strategy_id] = entry
+        trigger = spec["trigger"]
+        if trigger == TRIGGER_TICK:
+            self._tick.setdefault(symbol, set()).add(strategy_id)
+            return
+        if trigger == TRIGGER_INTERVAL:
+            self._interval.setdefault(symbol, set()).add(strategy_id)
+        self._push(entry, now)
+
+    def remove(self, strategy_id: str):
+        entry = self._entries.pop(strategy_id, None)
+        if entry is None:
+            return
+        for index in (self._tick, self._interval):
+            strategies = index.get(entry.symbol)
+            if strategies is not None:
+                strategies.discard(strategy_id)
+                if not strategies:
+                    del index[entry.symbol]
+        self._pending.discard(strategy_id)
+
+    def trigger_of(self, strategy_id: str) -> Optional[Dict[str, Any]]:
+        entry = self._entries.get(strategy_id)
+        return entry.spec if entry is not None else None
+
+    def next_wakeup(self, now: float) -> Optional[float]:
+        """距下一个定时触发或收盘等待超时的秒数，没有定时任务时返回 None"""
+        while self._heap and self._entries.get(self._heap[0][2].strategy_id) is not self._heap[0][2]:
+            heapq.heappop(self._heap)
+        deadlines = [self._heap[0][0]] if self._heap else []
+        deadlines.extend(self._entries[strategy_id].pending_close + self.bar_close_grace
+                         for strategy_id in self._pending)
+        return max(0.0, min(deadlines) - now) if deadlines else None
+
+    def collect(self, now: float, updated_symbols: Iterable[str],
+                newest_bar_ms: Callable[[str], Optional[int]]) -> List[str]:
+        """
+        返回本轮应执行的策略ID
+        :param updated_symbols: 上一轮之后有新市场数据的交易对
+        :param newest_bar_ms: symbol -> 市场数据中最新一根K线的开盘时间（毫秒）
+        """
+        due = []
+        for symbol in updated_symbols:
+            due.extend(self._tick.get(symbol, ()))
+            for strategy_id in self._interval.get(symbol, ()):
+                self._entries[strategy_id].dirty = True
+
+        while self._heap and self._heap[0][0] <= now:
+            due_time, _, entry = heapq.heappop(self._heap)
+            if self._entries.get(entry.strategy_id) is not entry:
+                continue
+            if entry.spec["trigger"] == TRIGGER_BAR:
+                entry.pending_close = due_time
+                self._pending.add(entry.strategy_id)
+            elif entry.dirty:
+                entry.dirty = False
+                due.append(entry.strategy_id)
+            else:
+                self.stats["interval_skipped"] += 1
+            self._push(entry, now)
+
+        for strategy_id in list(self._pending):
+            entry = self._entries[strategy_id]
+            newest = newest_bar_ms(entry.symbol)
+            if newest is not None and newest >= entry.pending_close * 1000:
+                self.stats["bar_closes"] += 1
+            elif now >= entry.pending_close + self.bar_close_grace:
+                self.stats["bar_close_timeouts"] += 1
+            else:
+                continue
+            entry.pending_close = None
+            self._pending.discard(strategy_id)
+            due.append(strategy_id)
+
+        self.stats["fired"] += len(due)
+        return due
+
+    def get_stats(self) -> Dict[str, Any]:
+        counts = {TRIGGER_TICK: 0, TRIGGER_BAR: 0, TRIGGER_INTERVAL: 0}
+        for entry in self._entries.values():
+            counts[entry.spec["trigger"]] += 1
+        return {"strategies": counts, "pending_bar_closes": len(self._pending), **self.stats}
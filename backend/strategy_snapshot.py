@@ -0,0 +1,89 @@
+import json
+import logging
+import os
+import struct
+import tempfile
+import threading
+import time
+import zlib
+from typing import Optional, Dict, Any
+
+logger = logging.getLogger("StrategySnapshot")
+
+# 文件头：魔数、格式版本、保存时间（秒），之后为 zlib 压缩的 JSON
+_MAGIC = b"ZZSS"
+_VERSION = 1
+_HEADER = struct.Struct("<4sHd")
+
+DEFAULT_SNAPSHOT_PATH = os.path.join(os.path.dirname(__file__), "data", "strategy_snapshot.bin")
+
+
+class StrategySnapshotStore:
+    """
+    策略运行时状态快照文件
+
+    内容为 {"saved_at": 保存时间, "strategies": {策略ID: {类型, 名称, 描述, 参数, 是否启用, 运行时状态}}}，
+    使用 JSON 而不是 pickle，读取损坏或被替换的文件不会执行任意代码。
+    写入先写临时文件并 fsync，再原子替换，进程在写入中途退出也不会留下半个快照。
+    """
+
+    def __init__(self, path: str = DEFAULT_SNAPSHOT_PATH, interval: float = 30.0):
+        """
+        :param path: 快照文件路径
+        :param interval: 运行期间定期保存的间隔（秒）
+        """
+        self.path = path
+        self.interval = interval
+        self.stats = {"saves": 0, "save_errors": 0, "bytes": 0, "last_saved": None}
+        self._lock = threading.Lock()
+
+    def save(self, snapshot: Dict[str, Any]):
+        payload = zlib.compress(json.dumps(snapshot, ensure_ascii=False, separators=(",", ":")).encode("utf-8"))
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        saved_at = snapshot.get("saved_at", time.time())
+        # 定时保存（线程中）与停止时的保存可能同时进行：各自写入唯一的临时文件，替换时加锁，
+        # 并且不让较早的快照覆盖较新的快照
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{os.path.basename(self.path)}.", suffix=".tmp",
+                                        dir=directory or None)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(_HEADER.pack(_MAGIC, _VERSION, saved_at))
+                f.write(payload)
+                f.flush()
+                os.fsync(f.fileno())
+            with self._lock:
+                if self.stats["last_saved"] is not None and saved_at < self.stats["last_saved"]:
+                    os.unlink(tmp_path)
+                    return
+                os.replace(tmp_path, self.path)
+                self.stats["saves"] += 1
+                self.stats["bytes"] = _HEADER.size + len(payload)
+                self.stats["last_saved"] = saved_at
+        except OSError:
+            self.stats["save_errors"] += 1
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+            raise
+
+    def load(self) -> Optional[Dict[str, Any]]:
+        """读取快照，文件不存在或格式无效时返回 None"""
+        if not os.path.exists(self.path):
+            return None
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+            magic, version, saved_at = _HEADER.unpack_from(data)
+            if magic != _MAGIC or version != _VERSION:
+                logger.warning(f"快照文件格式不匹配，忽略: {self.path}")
+                return None
+            snapshot = json.loads(zlib.decompress(data[_HEADER.size:]).decode("utf-8"))
+            snapshot.setdefault("saved_at", saved_at)
+            return snapshot
+        except Exception as e:
+            logger.warning(f"读取快照文件失败，忽略: {str(e)}")
+            return None
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {"path": self.path, "interval": self.interval, **self.stats}
@@ -0,0 +1,105 @@
+"""
+流式指标与批量指标的一致性检查：逐个值调用 streaming 中指标的 update()，结果应与 batch 中同名函数一致
+
+运行: cd backend && python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from strategies.indicators import (  # noqa: E402
+    SMA, EMA, RollingStd, ROC, RSI, ATR, BollingerBands,
+    sma, ema, rolling_std, roc, rsi, atr, bollinger_bands,
+)
+
+PERIODS = (1, 2, 5, 20, 50)
+
+
+def _series():
+    """不同价位和波动的价格序列：普通随机游走、高价小波动（易出现抵消误差）、常数"""
+    rng = np.random.default_rng(7)
+    return {
+        "random_walk": 100 * np.exp(np.cumsum(rng.normal(0, 0.01, 3000))),
+        "btc_tight": 60000 + rng.uniform(-0.05, 0.05, 3000),
+        "large_small_noise": 1e6 + rng.normal(0, 0.01, 3000),
+        "constant": np.full(500, 42.0),
+    }
+
+
+def _stream(indicator, values):
+    return np.array([np.nan if v is None else v for v in (indicator.update(x) for x in values)], dtype=float)
+
+
+class IndicatorParityTest(unittest.TestCase):
+
+    def assert_parity(self, streamed, batched, name, rtol=1e-9, atol=0.0):
+        np.testing.assert_array_equal(np.isnan(streamed), np.isnan(batched), err_msg=f"{name} 预热期不一致")
+        mask = ~np.isnan(batched)
+        np.testing.assert_allclose(streamed[mask], batched[mask], rtol=rtol, atol=atol, err_msg=name)
+
+    def test_sma(self):
+        for label, x in _series().items():
+            for period in PERIODS:
+                self.assert_parity(_stream(SMA(period), x), sma(x, period), f"sma {label} {period}")
+
+    def test_ema(self):
+        for label, x in _series().items():
+            for period in PERIODS:
+                self.assert_parity(_stream(EMA(period), x), ema(x, period), f"ema {label} {period}")
+
+    def test_rolling_std(self):
+        for label, x in _series().items():
+            for period in PERIODS:
+                for ddof in (0, 1):
+                    if period <= ddof:
+                        continue
+                    streamed = _stream(RollingStd(period, ddof), x)
+                    # 与价位相关的绝对误差上限：double 精度下相当于价格的约 1e-12
+                    self.assert_parity(streamed, rolling_std(x, period, ddof), f"std {label} {period} ddof={ddof}",
+                                       rtol=1e-7, atol=float(np.max(np.abs(x))) * 1e-12)
+                    np.testing.assert_allclose(streamed[period - 1:],
+                                               [np.std(x[i - period + 1:i + 1], ddof=ddof) for i in
+                                                range(period - 1, len(x))],
+                                               rtol=1e-7, atol=float(np.max(np.abs(x))) * 1e-12,
+                                               err_msg=f"std vs np.std {label} {period}")
+
+    def test_roc(self):
+        for label, x in _series().items():
+            for period in PERIODS:
+                self.assert_parity(_stream(ROC(period), x), roc(x, period), f"roc {label} {period}",
+                                   atol=1e-15)
+
+    def test_rsi(self):
+        for label, x in _series().items():
+            for period in PERIODS:
+                self.assert_parity(_stream(RSI(period), x), rsi(x, period), f"rsi {label} {period}")
+
+    def test_atr(self):
+        rng = np.random.default_rng(11)
+        for label, close in _series().items():
+            high = close + rng.uniform(0, 0.01, len(close)) * close
+            low = close - rng.uniform(0, 0.01, len(close)) * close
+            for period in PERIODS:
+                indicator = ATR(period)
+                streamed = np.array([np.nan if v is None else v for v in
+                                     (indicator.update(h, l, c) for h, l, c in zip(high, low, close))])
+                self.assert_parity(streamed, atr(high, low, close, period), f"atr {label} {period}")
+
+    def test_bollinger_bands(self):
+        for label, x in _series().items():
+            for period in PERIODS:
+                indicator = BollingerBands(period, k=2.0)
+                streamed = [indicator.update(value) for value in x]
+                batched = bollinger_bands(x, period, k=2.0)
+                for index, band in enumerate(("middle", "upper", "lower")):
+                    values = np.array([np.nan if v is None else v[index] for v in streamed])
+                    self.assert_parity(values, batched[index], f"bollinger {band} {label} {period}",
+                                       atol=float(np.max(np.abs(x))) * 1e-11)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,98 @@
+import re
+import time
+from typing import Optional, Dict, Any, List
+
+import numpy as np
+
+# 列名 -> OKX ticker 字段
+TICKER_COLUMNS = {
+    "last": "last",
+    "bid": "bidPx",
+    "ask": "askPx",
+    "bid_sz": "bidSz",
+    "ask_sz": "askSz",
+    "open24h": "open24h",
+    "high24h": "high24h",
+    "low24h": "low24h",
+    "vol24h": "vol24h",
+    "vol_ccy24h": "volCcy24h",
+}
+
+_FUTURES_PATTERN = re.compile(r"-\d{6}$")
+
+
+def inst_type_of(symbol: str) -> str:
+    """根据产品ID推断产品类型：BTC-USDT-SWAP 为 SWAP，BTC-USD-250328 为 FUTURES，其余为 SPOT"""
+    if symbol.endswith("-SWAP"):
+        return "SWAP"
+    if _FUTURES_PATTERN.search(symbol):
+        return "FUTURES"
+    if symbol.endswith("-C") or symbol.endswith("-P"):
+        return "OPTION"
+    return "SPOT"
+
+
+def _to_float(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return np.nan
+
+
+class TickerTable:
+    """
+    某一产品类型全部产品的行情快照（/market/tickers）
+
+    数值字段按列存为 numpy 数组，index 为 {instId: 行号}。
+    单个产品的查询返回原始的ticker字典，格式与 /market/ticker 一致；
+    多个产品的价格可通过 column() 一次取出。
+    """
+
+    def __init__(self, inst_type: str, tickers: List[Dict[str, Any]]):
+        self.inst_type = inst_type
+        self.fetched_at = time.time()
+        self.tickers = tickers
+        self.inst_ids = [ticker.get("instId", "") for ticker in tickers]
+        self.index: Dict[str, int] = {inst_id: row for row, inst_id in enumerate(self.inst_ids)}
+        self.columns: Dict[str, np.ndarray] = {
+            name: np.fromiter((_to_float(ticker.get(field)) for ticker in tickers), dtype=np.float64,
+                              count=len(tickers))
+            for name, field in TICKER_COLUMNS.items()
+        }
+        self.columns["ts"] = np.fromiter((int(ticker.get("ts") or 0) for ticker in tickers), dtype=np.int64,
+                                         count=len(tickers))
+
+    def __len__(self):
+        return len(self.inst_ids)
+
+    def __contains__(self, symbol: str) -> bool:
+        return symbol in self.index
+
+    def __sizeof__(self):
+        # 原始ticker字典每个约1KB
+        return sum(array.nbytes for array in self.columns.values()) + len(self.tickers) * 1024
+
+    def get(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """返回单个产品的原始ticker，不存在时返回 None"""
+        row = self.index.get(symbol)
+        return self.tickers[row] if row is not None else None
+
+    def column(self, name: str, symbols: Optional[List[str]] = None) -> np.ndarray:
+        """
+        返回某一列，symbols 不为空时按其顺序取出对应行，不存在的产品为 NaN
+        :param name: last/bid/ask/bid_sz/ask_sz/open24h/high24h/low24h/vol24h/vol_ccy24h/ts
+        """
+        array = self.columns[name]
+        if symbols is None:
+            return array
+        rows = np.fromiter((self.index.get(symbol, -1) for symbol in symbols), dtype=np.int64, count=len(symbols))
+        result = array[np.maximum(rows, 0)].astype(np.float64)
+        result[rows < 0] = np.nan
+        return result
+
+    def to_ticker_response(self, symbol: str) -> Optional[Dict[str, Any]]:
+        """返回与 get_ticker 相同格式的响应"""
+        ticker = self.get(symbol)
+        if ticker is None:
+            return None
+        return {"success": True, "data": [ticker], "msg": "success"}